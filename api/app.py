@@ -1,129 +1,811 @@
-from flask import Flask, request, jsonify
-import joblib
-import pandas as pd
+from flask import Flask, Response, request, jsonify, stream_with_context, g
 import os
+import sys
+import json
+import time
+import atexit
+import threading
 from flask_cors import CORS
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+from features import USER_FEATURES, BOOKING_FEATURES, encode_user_records, encode_booking_records
+import model_store
+from model_store import (MODELS_DIR, FLAT_MODELS_SUBDIR, COMPILED_MODELS_FILE, missing_model_files, has_flat_models,
+                         has_compiled_models)
+from forest import FlatForest
+from batching import MicroBatcher, QueueFullError
+from registry import ModelRegistry, ModelSet
+from feature_store import FeatureStore
+from ip_index import IPIndex
+from prediction_cache import PredictionCache
+from whatif import DEFAULT_GRID, count_scenarios, counterfactuals
+from metrics import MetricsRegistry, BATCH_ROW_BUCKETS
+from prediction_stats import PredictionStats
+from model_stats import RECENT_PREDICTIONS
+
+# Batches up to this size are scored with the packed forests; larger ones go
+# through sklearn, whose compiled traversal catches up at around a thousand rows
+FLAT_FOREST_MAX_ROWS = 512
+
+# Optional request coalescing: concurrent requests wait up to FRAUD_BATCH_MAX_WAIT_MS
+# for each other and are scored in one call (enable with FRAUD_BATCHING=1)
+BATCHING_ENABLED = os.environ.get('FRAUD_BATCHING', '0') == '1'
+BATCH_MAX_WAIT_MS = float(os.environ.get('FRAUD_BATCH_MAX_WAIT_MS', '2'))
+BATCH_MAX_SIZE = int(os.environ.get('FRAUD_BATCH_MAX_SIZE', '64'))
+BATCH_MAX_QUEUE = int(os.environ.get('FRAUD_BATCH_MAX_QUEUE', '1024'))
+
+# ?explain=true builds per-node attribution tables (nodes x features x classes) on first use;
+# FRAUD_EXPLAIN_WARMUP=1 builds them while each model set warms up instead, at that memory cost
+EXPLAIN_WARMUP_ENABLED = os.environ.get('FRAUD_EXPLAIN_WARMUP', '0') == '1'
+
+# /predict_booking/stream parses, scores and writes back this many NDJSON lines at a time
+STREAM_CHUNK_ROWS = int(os.environ.get('FRAUD_STREAM_CHUNK_ROWS', '1000'))
+
+# Cache per-row predictions for repeated identical requests, up to FRAUD_PREDICTION_CACHE_MB
+# (0 disables); entries expire after FRAUD_PREDICTION_CACHE_TTL seconds (0 = never)
+PREDICTION_CACHE_MB = float(os.environ.get('FRAUD_PREDICTION_CACHE_MB', '0'))
+PREDICTION_CACHE_TTL = float(os.environ.get('FRAUD_PREDICTION_CACHE_TTL', '300'))
+
+# 'pickle' loads the sklearn models; 'mmap' maps the live generation's packed forests
+# (models/serving/<generation>/flat) read-only, so pre-fork workers share one copy and
+# never import sklearn; 'compiled' reads them from its compact fraud_models.bin, also
+# without sklearn
+MODEL_STORE = os.environ.get('FRAUD_MODEL_STORE', 'pickle')
+
+# 'local' scores in the web process; 'process' hands batches to FRAUD_INFERENCE_PROCESSES
+# pinned worker processes through shared memory (defaults to one per available core)
+INFERENCE_BACKEND = os.environ.get('FRAUD_INFERENCE_BACKEND', 'local')
+INFERENCE_PROCESSES = int(os.environ.get('FRAUD_INFERENCE_PROCESSES', '0')) or (
+    len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count())
+
+DATA_DIR = os.path.join(os.path.dirname(MODELS_DIR), 'data')
+BOOKINGS_CSV = os.path.join(DATA_DIR, 'bookings.csv')
+
+# Per-user aggregates served from memory so prediction requests only need a user_id:
+# restored from FRAUD_FEATURE_SNAPSHOT if present, otherwise replayed from bookings.csv
+FEATURE_STORE_ENABLED = os.environ.get('FRAUD_FEATURE_STORE', '1') == '1'
+FEATURE_SNAPSHOT = os.environ.get('FRAUD_FEATURE_SNAPSHOT', os.path.join(DATA_DIR, 'feature_store.snapshot'))
+
+# Booking counts per known IP address and /24 subnet, indexed from bookings.csv at startup
+# and returned by /predict_booking?ip_history=true (FRAUD_IP_INDEX=0 disables)
+IP_INDEX_ENABLED = os.environ.get('FRAUD_IP_INDEX', '1') == '1'
+
+# Lazy startup: bind right away and load (or train) the models in a background
+# thread; prediction endpoints answer 503 and /ready fails until they are live
+LAZY_STARTUP = os.environ.get('FRAUD_LAZY_STARTUP', '0') == '1'
+
+# Poll the models directory every N seconds and hot-swap changed models (0 disables)
+MODEL_WATCH_INTERVAL = float(os.environ.get('FRAUD_MODEL_WATCH_INTERVAL', '0'))
+
+# When set, POST /admin/reload requires this value in the X-Admin-Token header
+ADMIN_TOKEN = os.environ.get('FRAUD_ADMIN_TOKEN')
+
+# Request, stage and batch metrics served on GET /metrics (FRAUD_METRICS=0 stops recording them)
+METRICS_ENABLED = os.environ.get('FRAUD_METRICS', '1') == '1'
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Served predictions are added to this file's counters and recent_predictions
+# every N seconds by a background thread (an interval of 0 disables recording)
+STATS_FILE = os.environ.get('FRAUD_STATS_FILE', os.path.join(DATA_DIR, 'model_stats.json'))
+STATS_FLUSH_INTERVAL = float(os.environ.get('FRAUD_STATS_FLUSH_INTERVAL', '10'))
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+metrics = MetricsRegistry(enabled=METRICS_ENABLED)
+request_count = metrics.counter('fraud_api_requests_total', 'HTTP requests by endpoint, status code and model version',
+                                ['endpoint', 'status', 'model_version'])
+request_seconds = metrics.histogram('fraud_api_request_duration_seconds',
+                                    'Time to handle a request (until the response starts, for streams)',
+                                    ['endpoint', 'model_version'])
+stage_seconds = metrics.histogram('fraud_api_stage_duration_seconds',
+                                  'Time per stage: parse, complete (feature store), encode, score (cache, batching '
+                                  'and model), scale, predict, serialize',
+                                  ['model', 'stage', 'model_version'])
+batch_rows = metrics.histogram('fraud_api_batch_rows', 'Rows per model call, by engine (flat, sklearn or pool)',
+                               ['model', 'engine'], buckets=BATCH_ROW_BUCKETS)
+rows_scored = metrics.counter('fraud_api_rows_scored_total', 'Rows scored by model calls', ['model', 'model_version'])
+error_count = metrics.counter('fraud_api_errors_total', 'Errors by endpoint and type (each bad stream line counts)',
+                              ['endpoint', 'type'])
+model_info = metrics.gauge('fraud_api_model_info', 'Active model version (always 1)', ['model_version', 'loaded_at'])
+
 # Check if models exist, if not, create them
 def ensure_models_exist():
-    models_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+    os.makedirs(MODELS_DIR, exist_ok=True)
     
-    if not os.path.exists(models_dir):
-        os.makedirs(models_dir, exist_ok=True)
-        
-    model_files = [
-        'user_fraud_model.pkl',
-        'user_scaler.pkl',
-        'booking_fraud_model.pkl',
-        'booking_scaler.pkl'
-    ]
-    
-    missing_models = [f for f in model_files if not os.path.exists(os.path.join(models_dir, f))]
+    if MODEL_STORE == 'mmap':
+        missing_models = [] if has_flat_models(MODELS_DIR) else [FLAT_MODELS_SUBDIR]
+    elif MODEL_STORE == 'compiled':
+        missing_models = [] if has_compiled_models(MODELS_DIR) else [COMPILED_MODELS_FILE]
+    else:
+        missing_models = missing_model_files(MODELS_DIR)
     
     if missing_models:
         print(f"Missing model files: {missing_models}")
         print("Training models...")
         
         # Import and run the training script
-        import sys
-        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        from scripts.train_models_from_csv import train_models
+        from train_models_from_csv import train_models
         train_models()
 
-# Load the models and scalers
+# Load the models and scalers (scalers are None when serving the fused artifact)
 def load_models():
-    models_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+    return model_store.load_models(MODELS_DIR)
+
+def load_model_set():
+    """Load one generation of models from the configured store"""
+    if MODEL_STORE == 'mmap':
+        user_engine, booking_engine = model_store.load_flat_models(MODELS_DIR)
+        return ModelSet(None, None, None, None, user_engine, booking_engine)
+    if MODEL_STORE == 'compiled':
+        user_engine, booking_engine = model_store.load_compiled_models(MODELS_DIR)
+        return ModelSet(None, None, None, None, user_engine, booking_engine)
+
+    user_model, user_scaler, booking_model, booking_scaler = load_models()
+
+    # Packed copies of the forests for low-latency scoring
+    return ModelSet(user_model, user_scaler, booking_model, booking_scaler,
+                    FlatForest.from_sklearn(user_model), FlatForest.from_sklearn(booking_model))
+
+def predict_fraud(model, engine, X):
+    """Predict with the packed forest for small batches, sklearn for large ones"""
+    if model is None or len(X) <= FLAT_FOREST_MAX_ROWS:
+        return engine.predict(X)
+    return model.predict(X)
+
+def active_version():
+    models = registry.active
+    return models.version if models is not None else 'none'
+
+def score_rows(name, model, engine, pipeline, X, version):
+    """Scale a copy of X and score it with one model, recording the scale and predict stages"""
+    # Callers keep the unscaled X (record_predictions scales it again at flush), so never scale it in place
+    if version is None:
+        # Warm-up of a set that is not live yet: nothing to report
+        return predict_fraud(model, engine, pipeline.scale(name, X.copy()))
     
-    user_model = joblib.load(os.path.join(models_dir, 'user_fraud_model.pkl'))
-    user_scaler = joblib.load(os.path.join(models_dir, 'user_scaler.pkl'))
-    booking_model = joblib.load(os.path.join(models_dir, 'booking_fraud_model.pkl'))
-    booking_scaler = joblib.load(os.path.join(models_dir, 'booking_scaler.pkl'))
+    with stage_seconds.time(name, 'scale', version):
+        X = pipeline.scale(name, X.copy())
+    batch_rows.observe(name, 'flat' if model is None or len(X) <= FLAT_FOREST_MAX_ROWS else 'sklearn', value=len(X))
+    rows_scored.inc(name, version, amount=len(X))
+    with stage_seconds.time(name, 'predict', version):
+        return predict_fraud(model, engine, X)
+
+def score_in_pool(name, X):
+    """Score X on the inference pool (scaling happens in the workers)"""
+    version = active_version()
+    batch_rows.observe(name, 'pool', value=len(X))
+    rows_scored.inc(name, version, amount=len(X))
+    with stage_seconds.time(name, 'predict', version):
+        return inference_pool.predict(name, X)
+
+def predict_user_rows(X, models=None):
+    """Scale and score encoded user rows with one consistent model set"""
+    if models is None and inference_pool is not None:
+        return score_in_pool('user', X)
+    models = models or registry.active
+    return score_rows('user', models.user_model, models.user_engine, models.pipeline, X, models.version)
+
+def predict_booking_rows(X, models=None):
+    """Scale and score encoded booking rows with one consistent model set"""
+    if models is None and inference_pool is not None:
+        return score_in_pool('booking', X)
+    models = models or registry.active
+    return score_rows('booking', models.booking_model, models.booking_engine, models.pipeline, X, models.version)
+
+# Synthetic requests used to warm a freshly loaded model set before it goes live
+WARMUP_USERS = [
+    {'total_tickets': 12, 'booking_count': 4, 'distinct_payment_methods': 1, 'distinct_ip_addresses': 1,
+     'payment_method': 'credit_card', 'ip_address': '192.168.1.10'},
+    {'total_tickets': 60, 'booking_count': 5, 'distinct_payment_methods': 3, 'distinct_ip_addresses': 5,
+     'payment_method': 'paypal', 'ip_address': '10.0.0.7'}
+]
+WARMUP_BOOKINGS = [
+    {'num_tickets': 2, 'payment_method': 'credit_card', 'ip_address': '192.168.1.10',
+     'user_booking_count': 4, 'user_avg_tickets': 3.0},
+    {'num_tickets': 18, 'payment_method': 'paypal', 'ip_address': '10.0.0.7',
+     'user_booking_count': 0, 'user_avg_tickets': 0}
+]
+
+def warm_up(models):
+    """Score the synthetic requests through both the packed and the sklearn paths"""
+    for rows in (1, FLAT_FOREST_MAX_ROWS + 1):
+        users = (WARMUP_USERS * rows)[:rows]
+        bookings = (WARMUP_BOOKINGS * rows)[:rows]
+        predict_user_rows(encode_user_records(users), models)
+        predict_booking_rows(encode_booking_records(bookings), models)
     
-    return user_model, user_scaler, booking_model, booking_scaler
+    if EXPLAIN_WARMUP_ENABLED:
+        # Build the per-node attribution tables before the set goes live
+        models.user_engine.prepare_explanations()
+        models.booking_engine.prepare_explanations()
 
-# Ensure models exist before loading
-ensure_models_exist()
+def explain_rows(engine, pipeline, name, X, feature_names):
+    """
+    Predict with the packed forest and break each fraud probability down by feature
 
-# Load models
-user_model, user_scaler, booking_model, booking_scaler = load_models()
+    X is left unscaled for record_predictions.
 
-# --- User Fraud Detection Endpoint ---
-@app.route('/predict_user', methods=['POST'])
-def predict_user():
+    Returns:
+        tuple: (predictions, list of per-row explanation dicts)
+    """
+    proba, base, contributions = engine.explain(pipeline.scale(name, X.copy()))
+    fraud = list(engine.classes_).index(1)
+    predictions = engine.classes_.take(proba.argmax(axis=1))
+    
+    explanations = [{
+        'fraud_probability': float(probability),
+        'base_value': float(base[fraud]),
+        'contributions': dict(zip(feature_names, row.tolist()))
+    } for probability, row in zip(proba[:, fraud], contributions[:, :, fraud])]
+    return predictions, explanations
+
+registry = ModelRegistry(load_model_set, MODELS_DIR, warmup=warm_up)
+inference_pool = None
+prediction_cache = None
+if PREDICTION_CACHE_MB > 0:
+    prediction_cache = PredictionCache(int(PREDICTION_CACHE_MB * 1024 * 1024), PREDICTION_CACHE_TTL)
+feature_store = FeatureStore() if FEATURE_STORE_ENABLED else None
+ip_index = None
+
+def load_feature_store():
+    """Restore the feature store from its snapshot, or build it from the booking history"""
+    if os.path.exists(FEATURE_SNAPSHOT):
+        feature_store.load_snapshot(FEATURE_SNAPSHOT)
+    elif os.path.exists(BOOKINGS_CSV):
+        feature_store.load_csv(BOOKINGS_CSV)
+        feature_store.save_snapshot(FEATURE_SNAPSHOT)
+    print(f"Feature store loaded: {feature_store.stats()}")
+    atexit.register(save_feature_snapshot)
+
+def save_feature_snapshot():
+    """Snapshot the feature store if events were ingested since the last snapshot"""
+    if feature_store.events != feature_store.saved_events:
+        feature_store.save_snapshot(FEATURE_SNAPSHOT)
+
+def activate_models(models):
+    """Roll the inference pool onto a newly activated set, then drop the cache entries of the old one"""
+    if inference_pool is not None:
+        inference_pool.reload()
+    if prediction_cache is not None:
+        # Entries of a replaced model version can never hit again; free them right away
+        prediction_cache.clear()
+
+registry.listeners.append(activate_models)
+
+def serving_version():
+    """Version of the models the next prediction will use, or None while the pool is part way through a reload"""
+    if inference_pool is not None:
+        return inference_pool.version
+    return registry.active.version
+
+def predict_cached(name, X, predict_rows):
+    """Score X through the prediction cache when it is enabled"""
+    if prediction_cache is None:
+        return predict_rows(X)
+    return prediction_cache.predict(name, X, predict_rows, serving_version)
+
+def start_models():
+    """Make sure models exist, load the first version and start watching for new ones"""
+    global inference_pool, ip_index
+    
+    # Ensure models exist before loading
+    ensure_models_exist()
+    
+    if feature_store is not None:
+        load_feature_store()
+    if IP_INDEX_ENABLED and os.path.exists(BOOKINGS_CSV):
+        ip_index = IPIndex.from_csv(BOOKINGS_CSV)
+        print(f"IP index loaded: {ip_index.stats()}")
+    
+    # Load models
+    registry.load()
+    if INFERENCE_BACKEND == 'process':
+        from inference_pool import InferencePool
+        inference_pool = InferencePool(INFERENCE_PROCESSES, MODELS_DIR, store=MODEL_STORE,
+                                       flat_max_rows=FLAT_FOREST_MAX_ROWS)
+    if MODEL_WATCH_INTERVAL > 0:
+        registry.watch(MODEL_WATCH_INTERVAL)
+
+def start_models_in_background():
     try:
-        # Get the data from the POST request (user data)
-        data = request.get_json()
+        start_models()
+    except Exception as e:
+        registry.last_error = f'{type(e).__name__}: {e}'
+        print(f"Model startup failed: {e}")
+
+# Inference workers spawned while app.py is the main script re-import it as
+# __mp_main__; they load their own models, so startup is skipped there
+if __name__ == '__mp_main__':
+    pass
+elif LAZY_STARTUP:
+    threading.Thread(target=start_models_in_background, name='model-startup', daemon=True).start()
+else:
+    start_models()
+
+user_batcher = None
+booking_batcher = None
+if BATCHING_ENABLED:
+    batch_config = dict(max_wait_ms=BATCH_MAX_WAIT_MS, max_batch_size=BATCH_MAX_SIZE, max_queue_depth=BATCH_MAX_QUEUE)
+    user_batcher = MicroBatcher(predict_user_rows, name='user', **batch_config)
+    booking_batcher = MicroBatcher(predict_booking_rows, name='booking', **batch_config)
+
+def prediction_confidence(kind, models, X, predictions):
+    """Probability the model gave each predicted class (run by the stats flusher, not per request)"""
+    engine = models.user_engine if kind == 'user' else models.booking_engine
+    return engine.predict_proba(models.pipeline.scale(kind, X)).max(axis=1)
+
+def record_predictions(kind, predictions, records, X):
+    if prediction_stats is not None:
+        prediction_stats.record(kind, predictions, records, X, registry.active)
+
+prediction_stats = None
+if STATS_FLUSH_INTERVAL > 0 and __name__ != '__mp_main__':
+    prediction_stats = PredictionStats(STATS_FILE, STATS_FLUSH_INTERVAL, confidence=prediction_confidence)
+    prediction_stats.start()
+    atexit.register(prediction_stats.stop)
+
+# Body returned by the prediction endpoints until a model version is live
+MODELS_NOT_READY = {'error': 'Models are still loading, try again shortly'}
+
+def score_users(data, explain=False):
+    """
+    Validate, encode and score /predict_user records
+
+    Shared by the Flask routes and the ASGI server (api/asgi.py). With
+    explain, each prediction comes with its per-feature attribution.
+
+    Returns:
+        tuple: (response body, HTTP status code)
+    """
+    try:
+        if registry.active is None:
+            error_count.inc('/predict_user', 'ModelsNotReady')
+            return MODELS_NOT_READY, 503
+        version = registry.active.version
+        
+        # Requests carrying only a user_id get their aggregates from the feature store
+        if feature_store is not None:
+            with stage_seconds.time('user', 'complete', version):
+                data = [feature_store.complete_user(record) for record in data]
         
         # Ensure necessary columns are in the data
         required_columns = ['total_tickets', 'booking_count', 'distinct_payment_methods', 'distinct_ip_addresses', 'payment_method', 'ip_address']
         for column in required_columns:
             if column not in data[0]:
-                return jsonify({'error': f'Missing required column: {column}'}), 400
+                error_count.inc('/predict_user', 'MissingColumn')
+                return {'error': f'Missing required column: {column}'}, 400
+        
+        # Encode straight into the model's feature matrix
+        with stage_seconds.time('user', 'encode', version):
+            user_data = encode_user_records(data)
+        
+        if explain:
+            models = registry.active
+            user_prediction, explanations = explain_rows(models.user_engine, models.pipeline, 'user', user_data, USER_FEATURES)
+            record_predictions('user', user_prediction, data, user_data)
+            return {'user_fraud_prediction': user_prediction.tolist(), 'explanations': explanations}, 200
+        
+        # Scale and predict user fraud
+        predict_rows = user_batcher.predict if user_batcher is not None else predict_user_rows
+        with stage_seconds.time('user', 'score', version):
+            user_prediction = predict_cached('user', user_data, predict_rows)
+        record_predictions('user', user_prediction, data, user_data)
+        
+        return {'user_fraud_prediction': user_prediction.tolist()}, 200
+    
+    except QueueFullError as e:
+        error_count.inc('/predict_user', type(e).__name__)
+        return {'error': str(e)}, 503
+    except Exception as e:
+        error_count.inc('/predict_user', type(e).__name__)
+        return {'error': str(e)}, 400
+
+def score_bookings(data, explain=False, velocity=False, ip_history=False):
+    """
+    Encode and score /predict_booking records, optionally with per-feature
+    attributions, the bookings' velocity features from the feature store and
+    the booking history of their IP addresses and /24 subnets
+
+    Returns:
+        tuple: (response body, HTTP status code)
+    """
+    try:
+        if registry.active is None:
+            error_count.inc('/predict_booking', 'ModelsNotReady')
+            return MODELS_NOT_READY, 503
+        version = registry.active.version
+        if velocity and feature_store is None:
+            error_count.inc('/predict_booking', 'FeatureStoreDisabled')
+            return {'error': 'Feature store is disabled (FRAUD_FEATURE_STORE=0)'}, 404
+        if ip_history and ip_index is None:
+            error_count.inc('/predict_booking', 'IPIndexDisabled')
+            return {'error': 'IP index is disabled (FRAUD_IP_INDEX=0) or there is no booking history'}, 404
+        
+        if feature_store is not None:
+            with stage_seconds.time('booking', 'complete', version):
+                data = [feature_store.complete_booking(record) for record in data]
         
-        # Convert data into a DataFrame
-        df = pd.DataFrame(data)
+        extra = {}
+        if velocity:
+            with stage_seconds.time('booking', 'velocity', version):
+                extra['velocity'] = [feature_store.velocity(record) for record in data]
+        if ip_history:
+            with stage_seconds.time('booking', 'ip_history', version):
+                extra['ip_history'] = ip_index.history(data)
         
-        # Preprocess user data: Map 'payment_method' to numeric values
-        df['payment_method'] = df['payment_method'].map({'credit_card': 1, 'debit_card': 2, 'paypal': 3})
+        # Encode straight into the model's feature matrix
+        with stage_seconds.time('booking', 'encode', version):
+            booking_data = encode_booking_records(data)
         
-        # Check if the mapping was successful
-        if df['payment_method'].isnull().any():
-            return jsonify({'error': 'Invalid payment_method value. Valid values are "credit_card", "debit_card", "paypal".'}), 400
+        if explain:
+            models = registry.active
+            booking_prediction, explanations = explain_rows(models.booking_engine, models.pipeline, 'booking', booking_data, BOOKING_FEATURES)
+            record_predictions('booking', booking_prediction, data, booking_data)
+            return {'booking_fraud_prediction': booking_prediction.tolist(), 'explanations': explanations, **extra}, 200
         
-        # Convert 'ip_address' to numeric (last octet of the IP address)
-        df['ip_address'] = df['ip_address'].apply(lambda x: int(x.split('.')[-1]))  # Example: '192.168.1.4' -> 4
+        # Scale and predict booking fraud
+        predict_rows = booking_batcher.predict if booking_batcher is not None else predict_booking_rows
+        with stage_seconds.time('booking', 'score', version):
+            booking_prediction = predict_cached('booking', booking_data, predict_rows)
+        record_predictions('booking', booking_prediction, data, booking_data)
         
-        # Select the features needed for the model prediction
-        user_data = df[['total_tickets', 'booking_count', 'distinct_payment_methods', 'distinct_ip_addresses']]
+        return {'booking_fraud_prediction': booking_prediction.tolist(), **extra}, 200
+    
+    except QueueFullError as e:
+        error_count.inc('/predict_booking', type(e).__name__)
+        return {'error': str(e)}, 503
+    except Exception as e:
+        error_count.inc('/predict_booking', type(e).__name__)
+        return {'error': str(e)}, 400
+
+def encode_booking_chunk(records):
+    """
+    Encode a chunk of booking records, isolating the ones that cannot be encoded
+
+    The whole chunk is encoded in one pass; only if that fails is it encoded
+    row by row to find the bad records.
+
+    Returns:
+        tuple: (feature matrix of the good records, their indices, {index: exception})
+    """
+    try:
+        return encode_booking_records(records), list(range(len(records))), {}
+    except Exception:
+        pass
+
+    rows = []
+    good = []
+    errors = {}
+    for i, record in enumerate(records):
+        missing = [column for column in BOOKING_FEATURES if column not in record]
+        if missing:
+            errors[i] = KeyError(f'Missing required column: {missing[0]}')
+            continue
+        try:
+            rows.append(encode_booking_records([record]))
+            good.append(i)
+        except Exception as e:
+            errors[i] = e
+
+    X = np.concatenate(rows) if rows else np.empty((0, len(BOOKING_FEATURES)))
+    return X, good, errors
+
+def score_booking_lines(lines, first_line=1):
+    """
+    Score one chunk of an NDJSON /predict_booking/stream body
+
+    Every non-blank line gets one result line, in input order, with its
+    1-based line number and either booking_fraud_prediction or the error
+    that kept that line from being scored; a bad line never fails the
+    rest of the stream. Shared by the Flask route and the ASGI server.
+
+    Args:
+        lines (list of bytes): Raw lines, one booking record each
+        first_line (int): Line number of lines[0] in the request body
+
+    Returns:
+        bytes: NDJSON result lines
+    """
+    results = []
+    records = []
+    for offset, line in enumerate(lines):
+        if not line.strip():
+            continue
+        result = {'line': first_line + offset}
+        results.append(result)
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('Each line must be a JSON object')
+            if 'booking_id' in record:
+                result['booking_id'] = record['booking_id']
+            if feature_store is not None:
+                record = feature_store.complete_booking(record)
+            records.append((result, record))
+        except Exception as e:
+            error_count.inc('/predict_booking/stream', type(e).__name__)
+            result['error'] = f'Invalid JSON: {e}' if isinstance(e, json.JSONDecodeError) else str(e)
+
+    if records:
+        X, good, errors = encode_booking_chunk([record for _, record in records])
+        for i, error in errors.items():
+            error_count.inc('/predict_booking/stream', type(error).__name__)
+            records[i][0]['error'] = error.args[0] if isinstance(error, KeyError) else str(error)
+        try:
+            if good:
+                predictions = predict_cached('booking', X, predict_booking_rows)
+                # The recorder keeps only the tail of each batch; ids are needed for those rows alone
+                record_predictions('booking', predictions, [records[i][1] for i in good[-RECENT_PREDICTIONS:]], X)
+                for i, prediction in zip(good, predictions.tolist()):
+                    records[i][0]['booking_fraud_prediction'] = prediction
+        except Exception as e:
+            error_count.inc('/predict_booking/stream', type(e).__name__, amount=len(good))
+            for i in good:
+                records[i][0]['error'] = str(e)
+
+    return ''.join(json.dumps(result) + '\n' for result in results).encode()
+
+def iter_line_chunks(stream, chunk_rows, block_size=65536):
+    """
+    Read a request body in blocks and group it into chunks of chunk_rows lines
+
+    Yields:
+        tuple: (line number of the chunk's first line, list of lines)
+    """
+    lines = []
+    partial = b''
+    first_line = 1
+    while True:
+        block = stream.read(block_size)
+        *complete, partial = (partial + block).split(b'\n')
+        lines.extend(complete)
+        if not block and partial:
+            lines.append(partial)
+        while len(lines) >= chunk_rows or (lines and not block):
+            chunk, lines = lines[:chunk_rows], lines[chunk_rows:]
+            yield first_line, chunk
+            first_line += len(chunk)
+        if not block:
+            return
+
+def whatif_booking(data):
+    """
+    Score what-if variations of one booking and find the smallest change that flips it
+
+    The body is {"booking": {...}, "grid": {feature: [values]}, "top": n}; grid
+    and top are optional.
+
+    Returns:
+        tuple: (response body, HTTP status code)
+    """
+    try:
+        models = registry.active
+        if models is None:
+            error_count.inc('/whatif_booking', 'ModelsNotReady')
+            return MODELS_NOT_READY, 503
         
-        # Scale the features
-        user_scaled = user_scaler.transform(user_data)
+        booking = data['booking']
+        if feature_store is not None:
+            booking = feature_store.complete_booking(booking)
+        grid = data.get('grid') or DEFAULT_GRID
         
-        # Predict user fraud
-        user_prediction = user_model.predict(user_scaled)
+        # One predict_proba call over the whole grid, on the packed forest unless it is large
+        if models.booking_model is None or count_scenarios(grid) <= FLAT_FOREST_MAX_ROWS:
+            model = models.booking_engine
+        else:
+            model = models.booking_model
         
-        # Return the result as a JSON response
-        return jsonify({'user_fraud_prediction': user_prediction.tolist()})
+        return counterfactuals(booking, model, models.pipeline, grid, int(data.get('top', 5))), 200
     
+    except KeyError as e:
+        error_count.inc('/whatif_booking', type(e).__name__)
+        return {'error': f'Missing required field: {e}'}, 400
+    except Exception as e:
+        error_count.inc('/whatif_booking', type(e).__name__)
+        return {'error': str(e)}, 400
+
+def ingest_booking_events(data):
+    """
+    Add booking events to the feature store
+
+    Returns:
+        tuple: (response body, HTTP status code)
+    """
+    if feature_store is None:
+        return {'error': 'Feature store is disabled (FRAUD_FEATURE_STORE=0)'}, 404
+    try:
+        ingested = feature_store.ingest_records(data)
+        return {'ingested': ingested, **feature_store.stats()}, 200
+    except Exception as e:
+        error_count.inc('/booking_events', type(e).__name__)
+        return {'error': str(e)}, 400
+
+def start_reload(token):
+    """
+    Start a background model reload (POST /admin/reload)
+
+    Returns:
+        tuple: (response body, HTTP status code)
+    """
+    if ADMIN_TOKEN and token != ADMIN_TOKEN:
+        return {'error': 'Invalid admin token'}, 403
+    started = registry.reload_async()
+    return {'reload_started': started, **registry.status()}, 202
+
+def write_feature_snapshot(token):
+    """
+    Snapshot the feature store to FRAUD_FEATURE_SNAPSHOT (POST /admin/feature_snapshot)
+
+    Returns:
+        tuple: (response body, HTTP status code)
+    """
+    if ADMIN_TOKEN and token != ADMIN_TOKEN:
+        return {'error': 'Invalid admin token'}, 403
+    if feature_store is None:
+        return {'error': 'Feature store is disabled (FRAUD_FEATURE_STORE=0)'}, 404
+    feature_store.save_snapshot(FEATURE_SNAPSHOT)
+    return {'snapshot': FEATURE_SNAPSHOT, **feature_store.stats()}, 200
+
+def batching_status():
+    """Settings and achieved batch sizes of the request coalescer (GET /batching_stats)"""
+    if not BATCHING_ENABLED:
+        return {'enabled': False}, 200
+    return {
+        'enabled': True,
+        'max_wait_ms': BATCH_MAX_WAIT_MS,
+        'max_batch_size': BATCH_MAX_SIZE,
+        'max_queue_depth': BATCH_MAX_QUEUE,
+        'user': user_batcher.stats(),
+        'booking': booking_batcher.stats()
+    }, 200
+
+def cache_status():
+    """Prediction cache counters (GET /cache_stats)"""
+    if prediction_cache is None:
+        return {'enabled': False}, 200
+    return {'enabled': True, **prediction_cache.stats()}, 200
+
+def observe_request(endpoint, status, seconds):
+    """Count a finished request and record its latency under the active model version"""
+    version = active_version()
+    request_count.inc(endpoint, str(status), version)
+    request_seconds.observe(endpoint, version, value=seconds)
+
+def render_metrics():
+    """All metrics in the Prometheus text format, with the active model version as fraud_api_model_info"""
+    models = registry.active
+    model_info.clear()
+    if models is not None:
+        model_info.set(models.version, models.loaded_at, value=1)
+    return metrics.render()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    # Streams are timed until their first byte, as the body is generated after this hook
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    if endpoint != '/metrics':
+        observe_request(endpoint, response.status_code, time.perf_counter() - g.request_start)
+    return response
+
+# --- User Fraud Detection Endpoint ---
+@app.route('/predict_user', methods=['POST'])
+def predict_user():
+    version = active_version()
+    try:
+        # Get the data from the POST request (user data)
+        with stage_seconds.time('user', 'parse', version):
+            data = request.get_json()
     except Exception as e:
+        error_count.inc('/predict_user', type(e).__name__)
         return jsonify({'error': str(e)}), 400
+    
+    body, status = score_users(data, explain=request.args.get('explain', '').lower() == 'true')
+    
+    # Return the result as a JSON response
+    with stage_seconds.time('user', 'serialize', version):
+        return jsonify(body), status
 
 # --- Booking Fraud Detection Endpoint ---
 @app.route('/predict_booking', methods=['POST'])
 def predict_booking():
+    version = active_version()
     try:
         # Get the data from the POST request (booking data)
+        with stage_seconds.time('booking', 'parse', version):
+            data = request.get_json()
+    except Exception as e:
+        error_count.inc('/predict_booking', type(e).__name__)
+        return jsonify({'error': str(e)}), 400
+    
+    body, status = score_bookings(data, explain=request.args.get('explain', '').lower() == 'true',
+                                  velocity=request.args.get('velocity', '').lower() == 'true',
+                                  ip_history=request.args.get('ip_history', '').lower() == 'true')
+    
+    # Return the result as a JSON response
+    with stage_seconds.time('booking', 'serialize', version):
+        return jsonify(body), status
+
+# --- Streaming bulk booking scoring (NDJSON in, NDJSON out) ---
+@app.route('/predict_booking/stream', methods=['POST'])
+def predict_booking_stream():
+    if registry.active is None:
+        error_count.inc('/predict_booking/stream', 'ModelsNotReady')
+        return jsonify(MODELS_NOT_READY), 503
+    
+    # Each chunk of lines is scored and sent before the next one is read
+    def generate():
+        for first_line, lines in iter_line_chunks(request.stream, STREAM_CHUNK_ROWS):
+            yield score_booking_lines(lines, first_line)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# --- What-if analysis of a single booking ---
+@app.route('/whatif_booking', methods=['POST'])
+def whatif():
+    try:
         data = request.get_json()
-        
-        # Convert data into a DataFrame
-        df = pd.DataFrame(data)
-        
-        # Preprocess booking data (make sure 'payment_method' and 'ip_address' are encoded)
-        df['payment_method'] = df['payment_method'].map({'credit_card': 1, 'debit_card': 2, 'paypal': 3})
-        df['ip_address'] = df['ip_address'].apply(lambda x: int(x.split('.')[-1]))  # Convert IP address to numeric
-        
-        # Select booking features
-        booking_data = df[['num_tickets', 'payment_method', 'ip_address', 'user_booking_count', 'user_avg_tickets']]
-        
-        # Scale the booking data
-        booking_scaled = booking_scaler.transform(booking_data)
-        
-        # Predict booking fraud
-        booking_prediction = booking_model.predict(booking_scaled)
-        
-        # Return the result as a JSON response
-        return jsonify({'booking_fraud_prediction': booking_prediction.tolist()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
     
+    body, status = whatif_booking(data)
+    return jsonify(body), status
+
+# --- Booking event ingestion for the feature store ---
+@app.route('/booking_events', methods=['POST'])
+def booking_events():
+    try:
+        data = request.get_json()
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+    
+    body, status = ingest_booking_events(data)
+    return jsonify(body), status
 
-# Health check endpoint
+# Health check endpoint (liveness: answers as soon as the process is up)
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'ok', 'message': 'Fraud detection API is running'})
+    return jsonify({'status': 'ok', 'message': 'Fraud detection API is running', **registry.status()})
+
+# Readiness check: 200 only once a model version is live
+@app.route('/ready', methods=['GET'])
+def ready_check():
+    status = registry.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+# Load the latest models from disk in the background and swap them in
+@app.route('/admin/reload', methods=['POST'])
+def reload_models():
+    body, status = start_reload(request.headers.get('X-Admin-Token'))
+    return jsonify(body), status
+
+# Write the feature store to its snapshot file so the next start can restore it
+@app.route('/admin/feature_snapshot', methods=['POST'])
+def feature_snapshot():
+    body, status = write_feature_snapshot(request.headers.get('X-Admin-Token'))
+    return jsonify(body), status
+
+# Batch sizes achieved by the request coalescer
+@app.route('/batching_stats', methods=['GET'])
+def batching_stats():
+    body, status = batching_status()
+    return jsonify(body), status
+
+# Prediction cache hit, miss and eviction counters
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    body, status = cache_status()
+    return jsonify(body), status
+
+# Request, stage, batch-size and error metrics in the Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
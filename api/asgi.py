@@ -0,0 +1,245 @@
+"""
+ASGI serving mode for the fraud detection API
+
+Exposes the same routes as the Flask app (/predict_user, /predict_booking
+and its NDJSON /predict_booking/stream, /whatif_booking, /booking_events,
+the /admin endpoints, /health, /ready, /metrics and the stats endpoints)
+without any web framework, so it runs under any ASGI server:
+
+    uvicorn asgi:application --app-dir api --port 5000
+
+The event loop only moves bytes; JSON parsing, encoding, scoring and response
+serialization run on a bounded thread pool so slow requests never block it.
+"""
+import os
+import json
+import time
+import asyncio
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+import app as fraud_api
+
+# Threads running request work, and how many requests may be in flight before new ones wait
+ASGI_WORKERS = int(os.environ.get('FRAUD_ASGI_WORKERS', str(min(32, (os.cpu_count() or 1) + 4))))
+ASGI_MAX_IN_FLIGHT = int(os.environ.get('FRAUD_ASGI_MAX_IN_FLIGHT', str(ASGI_WORKERS * 4)))
+
+executor = ThreadPoolExecutor(max_workers=ASGI_WORKERS, thread_name_prefix='asgi-inference')
+in_flight = None  # asyncio.Semaphore, created on the serving loop
+
+def handle_prediction(path, body, options):
+    """Parse, score and serialize one prediction request (runs on the thread pool)"""
+    model = ROUTE_MODELS.get(path)
+    version = fraud_api.active_version()
+    try:
+        if model is None:
+            data = json.loads(body)
+        else:
+            with fraud_api.stage_seconds.time(model, 'parse', version):
+                data = json.loads(body)
+    except ValueError as e:
+        fraud_api.error_count.inc(path, type(e).__name__)
+        return json.dumps({'error': f'Invalid JSON body: {e}'}).encode(), 400
+
+    response, status = PREDICTION_ROUTES[path](data, **options)
+    if model is None:
+        return json.dumps(response).encode(), status
+    with fraud_api.stage_seconds.time(model, 'serialize', version):
+        return json.dumps(response).encode(), status
+
+def health_response():
+    return {'status': 'ok', 'message': 'Fraud detection API is running', **fraud_api.registry.status()}, 200
+
+def ready_response():
+    status = fraud_api.registry.status()
+    return status, 200 if status['ready'] else 503
+
+PREDICTION_ROUTES = {
+    '/predict_user': fraud_api.score_users,
+    '/predict_booking': fraud_api.score_bookings,
+    '/whatif_booking': fraud_api.whatif_booking,
+    '/booking_events': fraud_api.ingest_booking_events
+}
+# Routes that take ?explain=true
+EXPLAIN_ROUTES = {'/predict_user', '/predict_booking'}
+
+# Routes that also take ?velocity=true and ?ip_history=true
+VELOCITY_ROUTES = {'/predict_booking'}
+# Model whose parse and serialize stages a route records
+ROUTE_MODELS = {'/predict_user': 'user', '/predict_booking': 'booking'}
+# Routes taking an NDJSON body, scored and answered chunk by chunk
+STREAM_ROUTES = {
+    '/predict_booking/stream': fraud_api.score_booking_lines
+}
+STATUS_ROUTES = {
+    '/health': health_response,
+    '/ready': ready_response,
+    '/batching_stats': fraud_api.batching_status,
+    '/cache_stats': fraud_api.cache_status
+}
+# Routes taking the X-Admin-Token header and no body
+ADMIN_ROUTES = {
+    '/admin/reload': fraud_api.start_reload,
+    '/admin/feature_snapshot': fraud_api.write_feature_snapshot
+}
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+async def send_response(send, body, status, content_type):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*')
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_json(send, body, status):
+    await send_response(send, body, status, b'application/json')
+
+def timed_send(send, endpoint):
+    """Wrap send so the request is counted and timed when its response starts"""
+    start = time.perf_counter()
+
+    async def send_and_record(message):
+        if message['type'] == 'http.response.start':
+            fraud_api.observe_request(endpoint, message['status'], time.perf_counter() - start)
+        await send(message)
+
+    return send_and_record
+
+async def stream_predictions(score_lines, receive, send):
+    """
+    Score an NDJSON request body in chunks of FRAUD_STREAM_CHUNK_ROWS lines
+
+    Only the current chunk and an incomplete trailing line are held in
+    memory; each chunk's results are sent before more of the body is read.
+    """
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'application/x-ndjson'),
+            (b'access-control-allow-origin', b'*')
+        ]
+    })
+
+    loop = asyncio.get_running_loop()
+    chunk_rows = fraud_api.STREAM_CHUNK_ROWS
+    lines = []
+    partial = b''
+    first_line = 1
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        more_body = message.get('more_body', False)
+        *complete, partial = (partial + message.get('body', b'')).split(b'\n')
+        lines.extend(complete)
+        if not more_body and partial:
+            lines.append(partial)
+
+        while len(lines) >= chunk_rows or (lines and not more_body):
+            chunk, lines = lines[:chunk_rows], lines[chunk_rows:]
+            body = await loop.run_in_executor(executor, score_lines, chunk, first_line)
+            first_line += len(chunk)
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+    await send({'type': 'http.response.body', 'body': b''})
+
+async def lifespan(receive, send):
+    global in_flight
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            in_flight = asyncio.Semaphore(ASGI_MAX_IN_FLIGHT)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    global in_flight
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    path = scope['path']
+    method = scope['method']
+
+    if path == '/metrics' and method == 'GET':
+        return await send_response(send, fraud_api.render_metrics().encode(), 200,
+                                   fraud_api.METRICS_CONTENT_TYPE.encode())
+
+    known = path in STATUS_ROUTES or path in PREDICTION_ROUTES or path in STREAM_ROUTES or path in ADMIN_ROUTES
+    send = timed_send(send, path if known else 'unmatched')
+
+    if method == 'OPTIONS':
+        await send({
+            'type': 'http.response.start',
+            'status': 204,
+            'headers': [
+                (b'access-control-allow-origin', b'*'),
+                (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+                (b'access-control-allow-headers', b'content-type, x-admin-token')
+            ]
+        })
+        return await send({'type': 'http.response.body', 'body': b''})
+
+    if path in STATUS_ROUTES and method == 'GET':
+        response, status = STATUS_ROUTES[path]()
+        return await send_json(send, json.dumps(response).encode(), status)
+
+    if path in ADMIN_ROUTES and method == 'POST':
+        await read_body(receive)
+        token = dict(scope.get('headers', [])).get(b'x-admin-token')
+        loop = asyncio.get_running_loop()
+        # Snapshots write the whole store to disk, so keep them off the event loop
+        response, status = await loop.run_in_executor(executor, ADMIN_ROUTES[path],
+                                                      token.decode() if token is not None else None)
+        return await send_json(send, json.dumps(response).encode(), status)
+
+    if path in PREDICTION_ROUTES and method == 'POST':
+        if in_flight is None:
+            in_flight = asyncio.Semaphore(ASGI_MAX_IN_FLIGHT)
+        body = await read_body(receive)
+        options = {}
+        if path in EXPLAIN_ROUTES:
+            query = parse_qs(scope.get('query_string', b'').decode())
+            options['explain'] = query.get('explain', [''])[0].lower() == 'true'
+            if path in VELOCITY_ROUTES:
+                options['velocity'] = query.get('velocity', [''])[0].lower() == 'true'
+                options['ip_history'] = query.get('ip_history', [''])[0].lower() == 'true'
+        async with in_flight:
+            loop = asyncio.get_running_loop()
+            response, status = await loop.run_in_executor(executor, handle_prediction, path, body, options)
+        return await send_json(send, response, status)
+
+    if path in STREAM_ROUTES and method == 'POST':
+        if fraud_api.registry.active is None:
+            fraud_api.error_count.inc(path, 'ModelsNotReady')
+            return await send_json(send, json.dumps(fraud_api.MODELS_NOT_READY).encode(), 503)
+        if in_flight is None:
+            in_flight = asyncio.Semaphore(ASGI_MAX_IN_FLIGHT)
+        async with in_flight:
+            return await stream_predictions(STREAM_ROUTES[path], receive, send)
+
+    if known:
+        return await send_json(send, json.dumps({'error': 'Method not allowed'}).encode(), 405)
+    return await send_json(send, json.dumps({'error': 'Not found'}).encode(), 404)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(application, host='0.0.0.0', port=int(os.environ.get('PORT', '5000')))
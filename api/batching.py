@@ -0,0 +1,124 @@
+import threading
+import queue
+import time
+import numpy as np
+
+class QueueFullError(Exception):
+    """Raised when a batcher already has max_queue_depth requests waiting"""
+
+class PendingPrediction:
+    """One caller's rows waiting in a MicroBatcher queue"""
+
+    def __init__(self, X):
+        self.X = X
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class MicroBatcher:
+    """
+    Coalesce concurrent prediction requests into one vectorized call
+
+    Callers block in predict() while a worker thread collects requests until
+    the oldest one has waited max_wait_ms or max_batch_size rows are queued,
+    runs predict_fn once over the stacked rows and hands each caller its slice.
+    """
+
+    def __init__(self, predict_fn, max_wait_ms=2.0, max_batch_size=64, max_queue_depth=1024, name='batcher'):
+        self.predict_fn = predict_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.name = name
+        self.queue = queue.Queue(maxsize=max_queue_depth)
+
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self.rejected = 0
+        self.batch_size_counts = {}  # rows per batch, bucketed to powers of two
+
+        self.worker = threading.Thread(target=self.run, name=name, daemon=True)
+        self.worker.start()
+
+    def predict(self, X):
+        """
+        Predict X as part of the next batch
+
+        Args:
+            X (np.ndarray): Encoded feature matrix for one request
+
+        Returns:
+            np.ndarray: Predictions for the rows of X
+        """
+        pending = PendingPrediction(X)
+        try:
+            self.queue.put_nowait(pending)
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            raise QueueFullError(f'{self.name} queue is full, try again later')
+
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def collect(self):
+        """Block for the first request, then gather more until the deadline or size limit"""
+        batch = [self.queue.get()]
+        rows = len(batch[0].X)
+        deadline = time.monotonic() + self.max_wait
+
+        while rows < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            rows += len(pending.X)
+
+        return batch, rows
+
+    def run(self):
+        while True:
+            batch, rows = self.collect()
+            try:
+                X = batch[0].X if len(batch) == 1 else np.concatenate([pending.X for pending in batch])
+                predictions = self.predict_fn(X)
+                start = 0
+                for pending in batch:
+                    pending.result = predictions[start:start + len(pending.X)]
+                    start += len(pending.X)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+
+            for pending in batch:
+                pending.done.set()
+            self.record(len(batch), rows)
+
+    def record(self, n_requests, rows):
+        bucket = 1 << max(rows - 1, 0).bit_length()
+        with self.lock:
+            self.batches += 1
+            self.requests += n_requests
+            self.rows += rows
+            self.batch_size_counts[bucket] = self.batch_size_counts.get(bucket, 0) + 1
+
+    def stats(self):
+        """Counters describing the batches formed so far"""
+        with self.lock:
+            return {
+                'batches': self.batches,
+                'requests': self.requests,
+                'rows': self.rows,
+                'rejected': self.rejected,
+                'queue_depth': self.queue.qsize(),
+                'mean_requests_per_batch': self.requests / self.batches if self.batches else 0.0,
+                'mean_rows_per_batch': self.rows / self.batches if self.batches else 0.0,
+                'rows_per_batch_histogram': {f'<={bucket}': count for bucket, count in sorted(self.batch_size_counts.items())}
+            }
@@ -0,0 +1,294 @@
+import os
+import math
+import pickle
+import hashlib
+import threading
+import pandas as pd
+
+from features import PAYMENT_METHOD_MAP, parse_ipv4
+from velocity import VELOCITY_FEATURES, VelocityTracker, parse_booking_time
+
+# Version 2 adds the velocity windows; version 1 snapshots still load, with them empty
+SNAPSHOT_FORMAT_VERSION = 2
+
+# Sketch precision: 2**HLL_PRECISION one-byte registers (~6.5% standard error once dense)
+HLL_PRECISION = 8
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+
+# Distinct values kept exactly (as hashes) before a sketch switches to registers
+HLL_SPARSE_LIMIT = 32
+
+def hash64(value):
+    """Stable 64-bit hash of a string, identical across processes and restarts"""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'little')
+
+class DistinctSketch:
+    """
+    HyperLogLog distinct counter with an exact sparse mode
+
+    Small sets (most users have a handful of IPs) are kept as a set of
+    hashes and counted exactly; past HLL_SPARSE_LIMIT values the sketch
+    switches to fixed-size registers. Adding a value is O(1) either way.
+    """
+
+    __slots__ = ('hashes', 'registers')
+
+    def __init__(self, hashes=None, registers=None):
+        self.hashes = set() if hashes is None and registers is None else hashes
+        self.registers = registers
+
+    def add(self, value):
+        h = hash64(value)
+        if self.registers is None:
+            self.hashes.add(h)
+            if len(self.hashes) > HLL_SPARSE_LIMIT:
+                self.registers = bytearray(HLL_REGISTERS)
+                for sparse_hash in self.hashes:
+                    self.add_hash(sparse_hash)
+                self.hashes = None
+        else:
+            self.add_hash(h)
+
+    def add_hash(self, h):
+        index = h & (HLL_REGISTERS - 1)
+        rank = 64 - HLL_PRECISION - (h >> HLL_PRECISION).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        if self.registers is None:
+            return len(self.hashes)
+
+        estimate = HLL_ALPHA * HLL_REGISTERS ** 2 / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * HLL_REGISTERS and zeros:
+            # Small-range correction (linear counting)
+            estimate = HLL_REGISTERS * math.log(HLL_REGISTERS / zeros)
+        return int(round(estimate))
+
+    def state(self):
+        return tuple(self.hashes) if self.registers is None else bytes(self.registers)
+
+    @classmethod
+    def from_state(cls, state):
+        if isinstance(state, bytes):
+            return cls(registers=bytearray(state))
+        return cls(hashes=set(state))
+
+class UserAggregates:
+    """Running booking aggregates for one user"""
+
+    __slots__ = ('booking_count', 'total_tickets', 'payment_methods', 'ip_addresses',
+                 'last_payment_method', 'last_ip_address')
+
+    def __init__(self):
+        self.booking_count = 0
+        self.total_tickets = 0
+        self.payment_methods = 0  # bitmask over PAYMENT_METHOD_MAP codes; there are only three
+        self.ip_addresses = DistinctSketch()
+        self.last_payment_method = None
+        self.last_ip_address = None
+
+class FeatureStore:
+    """
+    In-process per-user aggregates, updated as booking events arrive
+
+    Fills in the aggregate features the models take (booking count, average
+    tickets, distinct payment methods and IPs) so callers only send a
+    user_id with the booking being scored. Sliding-window booking counts per
+    user and per IP address (velocity.py) are kept alongside.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.user_windows = VelocityTracker()
+        self.ip_windows = VelocityTracker()
+        self.events = 0
+        self.saved_events = 0  # events covered by the last snapshot written or restored
+        self.lock = threading.Lock()
+
+    def ingest(self, user_id, num_tickets, payment_method, ip_address, booking_time=None):
+        """Add one booking to its user's aggregates and velocity windows in O(1) amortized"""
+        code = PAYMENT_METHOD_MAP.get(payment_method)
+        if code is None:
+            raise ValueError('Invalid payment_method value. Valid values are "credit_card", "debit_card", "paypal".')
+        num_tickets = int(num_tickets)
+        timestamp = parse_booking_time(booking_time)
+
+        with self.lock:
+            user = self.users.get(user_id)
+            if user is None:
+                user = self.users[user_id] = UserAggregates()
+            user.booking_count += 1
+            user.total_tickets += num_tickets
+            user.payment_methods |= 1 << code
+            user.ip_addresses.add(ip_address)
+            user.last_payment_method = payment_method
+            user.last_ip_address = ip_address
+            self.user_windows.add(user_id, timestamp)
+            self.ip_windows.add(ip_address, timestamp)
+            self.events += 1
+
+    def ingest_records(self, records):
+        """
+        Ingest a list of booking events, validating all of them first
+
+        booking_time is optional; events without one are timed on arrival.
+
+        Returns:
+            int: Number of events ingested
+        """
+        tickets = []
+        for record in records:
+            for column in ('user_id', 'num_tickets', 'payment_method', 'ip_address'):
+                if column not in record:
+                    raise ValueError(f'Missing required column: {column}')
+            if record['payment_method'] not in PAYMENT_METHOD_MAP:
+                raise ValueError('Invalid payment_method value. Valid values are "credit_card", "debit_card", "paypal".')
+            try:
+                tickets.append(int(record['num_tickets']))
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid num_tickets value: {record['num_tickets']!r}")
+        parse_ipv4([record['ip_address'] for record in records])
+        times = [parse_booking_time(record.get('booking_time')) for record in records]
+
+        # Nothing below can fail on bad input, so a rejected batch leaves the store untouched
+        for record, num_tickets, timestamp in zip(records, tickets, times):
+            self.ingest(record['user_id'], num_tickets, record['payment_method'], record['ip_address'], timestamp)
+        return len(records)
+
+    def load_csv(self, path, chunk_size=100000):
+        """Replay a bookings.csv-shaped file into the store, in booking_time order when it has one"""
+        columns = ['user_id', 'num_tickets', 'payment_method', 'ip_address']
+        if 'booking_time' in pd.read_csv(path, nrows=0).columns:
+            columns.append('booking_time')
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunk_size):
+            if 'booking_time' in chunk:
+                # Epoch seconds, parsed for the whole chunk at once and replayed in time order, as
+                # the bookings arrived (the file need not be sorted; a late event more than the
+                # largest window behind its key's newest is not counted)
+                chunk['booking_time'] = pd.to_datetime(chunk['booking_time'], format='ISO8601', utc=True).astype('int64') / 1e9
+                chunk = chunk.sort_values('booking_time', kind='stable')
+            for row in zip(*(chunk[column].tolist() for column in columns)):
+                self.ingest(*row)
+
+    def complete_booking(self, record):
+        """
+        Fill in user_booking_count and user_avg_tickets from the store
+
+        The current booking is counted in, as in the training data, where the
+        aggregates cover all of a user's bookings. Records that already carry
+        both values are returned unchanged.
+        """
+        if 'user_booking_count' in record and 'user_avg_tickets' in record:
+            return record
+        if 'user_id' not in record:
+            raise ValueError('Missing required column: user_id (or user_booking_count and user_avg_tickets)')
+        if 'num_tickets' not in record:
+            raise ValueError('Missing required column: num_tickets')
+
+        with self.lock:
+            user = self.users.get(record['user_id'])
+            booking_count = user.booking_count if user else 0
+            total_tickets = user.total_tickets if user else 0
+
+        booking_count += 1
+        return {**record,
+                'user_booking_count': booking_count,
+                'user_avg_tickets': (total_tickets + record['num_tickets']) / booking_count}
+
+    def velocity(self, record):
+        """
+        VELOCITY_FEATURES for a booking being scored
+
+        The windows end at the record's booking_time (now if it has none) and
+        count the booking itself, like complete_booking's aggregates; it is
+        not ingested.
+
+        Returns:
+            dict: Feature name -> count
+        """
+        for column in ('user_id', 'ip_address'):
+            if column not in record:
+                raise ValueError(f'Missing required column: {column}')
+        timestamp = parse_booking_time(record.get('booking_time'))
+
+        with self.lock:
+            counts = (self.user_windows.counts(record['user_id'], timestamp) +
+                      self.ip_windows.counts(record['ip_address'], timestamp))
+        return {feature: count + 1 for feature, count in zip(VELOCITY_FEATURES, counts)}
+
+    def complete_user(self, record):
+        """Fill in a /predict_user record from the store when only user_id is given"""
+        if 'total_tickets' in record:
+            return record
+        if 'user_id' not in record:
+            raise ValueError('Missing required column: user_id (or the user aggregates)')
+
+        with self.lock:
+            user = self.users.get(record['user_id'])
+            if user is None:
+                raise ValueError(f"Unknown user_id: {record['user_id']!r}")
+            return {
+                'total_tickets': user.total_tickets,
+                'booking_count': user.booking_count,
+                'distinct_payment_methods': bin(user.payment_methods).count('1'),
+                'distinct_ip_addresses': user.ip_addresses.count(),
+                'payment_method': user.last_payment_method,
+                'ip_address': user.last_ip_address,
+                **record
+            }
+
+    def save_snapshot(self, path):
+        """Write the whole store to path (atomically, via a temporary file)"""
+        with self.lock:
+            users = {
+                user_id: (user.booking_count, user.total_tickets, user.payment_methods,
+                          user.ip_addresses.state(), user.last_payment_method, user.last_ip_address)
+                for user_id, user in self.users.items()
+            }
+            velocity = {'users': self.user_windows.state(), 'ips': self.ip_windows.state()}
+            events = self.events
+
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'format_version': SNAPSHOT_FORMAT_VERSION, 'events': events, 'users': users,
+                         'velocity': velocity},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.saved_events = events
+
+    def load_snapshot(self, path):
+        """Replace the store's contents with a snapshot written by save_snapshot"""
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+        if snapshot.get('format_version') not in (1, SNAPSHOT_FORMAT_VERSION):
+            raise ValueError(f"Unsupported feature store snapshot format: {snapshot.get('format_version')}")
+
+        users = {}
+        for user_id, (booking_count, total_tickets, payment_methods, ip_state, last_payment, last_ip) in snapshot['users'].items():
+            user = users[user_id] = UserAggregates()
+            user.booking_count = booking_count
+            user.total_tickets = total_tickets
+            user.payment_methods = payment_methods
+            user.ip_addresses = DistinctSketch.from_state(ip_state)
+            user.last_payment_method = last_payment
+            user.last_ip_address = last_ip
+
+        velocity = snapshot.get('velocity', {'users': {}, 'ips': {}})
+        user_windows = VelocityTracker()
+        user_windows.load_state(velocity['users'])
+        ip_windows = VelocityTracker()
+        ip_windows.load_state(velocity['ips'])
+
+        with self.lock:
+            self.users = users
+            self.user_windows = user_windows
+            self.ip_windows = ip_windows
+            self.events = snapshot['events']
+            self.saved_events = self.events
+
+    def stats(self):
+        return {'users': len(self.users), 'events': self.events,
+                'velocity_keys': len(self.user_windows.keys) + len(self.ip_windows.keys)}
@@ -0,0 +1,293 @@
+import os
+import time
+import queue
+import atexit
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+from features import USER_FEATURES, BOOKING_FEATURES
+from pipeline import FeaturePipeline
+from forest import FlatForest
+import model_store
+
+# Widest feature matrix any model takes; every input buffer is sized for it
+MAX_FEATURES = max(len(USER_FEATURES), len(BOOKING_FEATURES))
+FEATURE_COUNTS = {'user': len(USER_FEATURES), 'booking': len(BOOKING_FEATURES)}
+
+# Don't split a batch across workers into chunks smaller than this
+MIN_ROWS_PER_WORKER = 256
+
+def load_models_from_disk(models_dir, store):
+    """Load (model, engine) per model name, and the feature pipeline"""
+    if store == 'mmap':
+        user_engine, booking_engine = model_store.load_flat_models(models_dir)
+        return {'user': (None, user_engine), 'booking': (None, booking_engine)}, FeaturePipeline()
+    if store == 'compiled':
+        user_engine, booking_engine = model_store.load_compiled_models(models_dir)
+        return {'user': (None, user_engine), 'booking': (None, booking_engine)}, FeaturePipeline()
+
+    user_model, user_scaler, booking_model, booking_scaler = model_store.load_models(models_dir)
+    return {
+        'user': (user_model, FlatForest.from_sklearn(user_model)),
+        'booking': (booking_model, FlatForest.from_sklearn(booking_model))
+    }, FeaturePipeline(user_scaler, booking_scaler)
+
+def load_worker_models(models_dir, store):
+    """
+    Load the models inside a worker process, along with the version they came from
+
+    Returns:
+        tuple: (models per name, FeaturePipeline, model_store.model_version of the loaded files)
+    """
+    while True:
+        version = model_store.model_version(models_dir)
+        models, pipeline = load_models_from_disk(models_dir, store)
+        # An export that landed mid-load could leave the label behind the files; load again
+        if model_store.model_version(models_dir) == version:
+            return models, pipeline, version
+
+def worker_main(conn, input_name, output_name, models_dir, store, flat_max_rows, cpu):
+    """
+    Serve predictions for one pool slot until told to stop
+
+    The parent writes the encoded rows into the shared input buffer and sends
+    (model name, row count); predictions go back through the shared output
+    buffer, so only these small control messages are ever pickled.
+    """
+    if cpu is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {cpu})
+
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    models, pipeline, version = load_worker_models(models_dir, store)
+    conn.send(('ready', version))
+
+    while True:
+        message = conn.recv()
+        try:
+            if message[0] == 'stop':
+                break
+            if message[0] == 'reload':
+                models, pipeline, version = load_worker_models(models_dir, store)
+                conn.send(('ok', version))
+                continue
+
+            _, name, n_rows = message
+            model, engine = models[name]
+            X = np.ndarray((n_rows, FEATURE_COUNTS[name]), dtype=np.float64, buffer=input_shm.buf)
+            pipeline.scale(name, X)
+            if model is None or n_rows <= flat_max_rows:
+                predictions = engine.predict(X)
+            else:
+                predictions = model.predict(X)
+            np.ndarray((n_rows,), dtype=np.int64, buffer=output_shm.buf)[:] = predictions
+            conn.send(('ok', None))
+        except Exception as e:
+            conn.send(('error', f'{type(e).__name__}: {e}'))
+
+    input_shm.close()
+    output_shm.close()
+
+class PoolWorker:
+    """Parent-side handle for one worker process and its shared buffers"""
+
+    def __init__(self, ctx, max_rows, models_dir, store, flat_max_rows, cpu):
+        self.max_rows = max_rows
+        self.cpu = cpu
+        self.input_shm = shared_memory.SharedMemory(create=True, size=max_rows * MAX_FEATURES * 8)
+        self.output_shm = shared_memory.SharedMemory(create=True, size=max_rows * 8)
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=worker_main,
+            args=(child_conn, self.input_shm.name, self.output_shm.name, models_dir, store, flat_max_rows, cpu),
+            name=f'inference-worker-{cpu}',
+            daemon=True
+        )
+        self.process.start()
+        # Drop the parent's copy of the child end so a dead worker shows up as EOF
+        child_conn.close()
+        # Version of the models the worker holds, known once it reports ready
+        self.version = None
+
+    def wait(self):
+        status, detail = self.conn.recv()
+        if status == 'error':
+            raise RuntimeError(detail)
+        return detail
+
+    def load(self, reload=False):
+        """Wait for the worker to load (or, with reload, to reload) its models and record their version"""
+        if reload:
+            self.conn.send(('reload',))
+        self.version = self.wait()
+
+    def exited(self):
+        """Error reported for a request that lost this worker's process"""
+        self.process.join(timeout=1)
+        return RuntimeError(f'Inference worker {self.process.name} exited with code {self.process.exitcode}')
+
+    def submit(self, name, X):
+        """Copy X into the input buffer and ask the worker to score it"""
+        np.ndarray(X.shape, dtype=np.float64, buffer=self.input_shm.buf)[:] = X
+        self.conn.send(('predict', name, len(X)))
+
+    def collect(self, n_rows):
+        self.wait()
+        return np.ndarray((n_rows,), dtype=np.int64, buffer=self.output_shm.buf).copy()
+
+    def close(self):
+        try:
+            self.conn.send(('stop',))
+        except (OSError, EOFError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.input_shm.close()
+        self.input_shm.unlink()
+        self.output_shm.close()
+        self.output_shm.unlink()
+
+class InferencePool:
+    """
+    Score batches on a pool of pinned worker processes, one model copy per worker
+
+    Large batches are split across idle workers so they run on several cores
+    at once; each chunk is exchanged through shared memory rather than pickled.
+    """
+
+    def __init__(self, processes, models_dir, store='pickle', max_rows=4096, flat_max_rows=512):
+        self.ctx = mp.get_context('spawn')
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else [None]
+
+        # Everything but the core a worker is pinned to, kept to restart workers that die
+        self.worker_args = (max_rows, models_dir, store, flat_max_rows)
+        self.workers = [PoolWorker(self.ctx, *self.worker_args, cpus[i % len(cpus)]) for i in range(processes)]
+        self.max_rows = max_rows
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            worker.load()
+            self.idle.put(worker)
+
+        atexit.register(self.close)
+
+    @property
+    def version(self):
+        """
+        Version of the models every worker holds, or None while a reload is part way through
+
+        A worker is never idle between loading new models and recording their
+        version, so no prediction is made by models the pool has not reported.
+        """
+        versions = {worker.version for worker in self.workers}
+        return versions.pop() if len(versions) == 1 else None
+
+    def predict(self, name, X):
+        """
+        Predict every row of X with the named model ('user' or 'booking')
+
+        Returns:
+            np.ndarray: int64 predictions
+        """
+        if not self.workers:
+            raise RuntimeError('No inference workers left; every worker died and could not be restarted')
+        n_rows = len(X)
+        chunk_size = min(self.max_rows, max(MIN_ROWS_PER_WORKER, -(-n_rows // len(self.workers))))
+        chunks = [(start, min(start + chunk_size, n_rows)) for start in range(0, n_rows, chunk_size)]
+        predictions = np.empty(n_rows, dtype=np.int64)
+
+        while chunks:
+            # Block for one worker, then take whichever others are idle right now
+            acquired = [self.idle.get()]
+            while len(acquired) < len(chunks):
+                try:
+                    acquired.append(self.idle.get_nowait())
+                except queue.Empty:
+                    break
+
+            wave, chunks = chunks[:len(acquired)], chunks[len(acquired):]
+            submitted = []
+            dead = []
+            error = None
+            try:
+                for worker, (start, end) in zip(acquired, wave):
+                    try:
+                        worker.submit(name, X[start:end])
+                    except (EOFError, OSError):
+                        dead.append(worker)
+                        raise worker.exited()
+                    submitted.append((worker, start, end))
+            except Exception as e:
+                error = e
+
+            try:
+                # Drain every submitted worker, even after a failure, so no reply is left in a pipe
+                for worker, start, end in submitted:
+                    try:
+                        predictions[start:end] = worker.collect(end - start)
+                    except RuntimeError as e:
+                        error = error or e
+                    except (EOFError, OSError):
+                        # The process is gone (killed, or crashed outside the request handler)
+                        dead.append(worker)
+                        error = error or worker.exited()
+            finally:
+                for worker in acquired:
+                    if worker in dead:
+                        self.respawn(worker)
+                    else:
+                        self.idle.put(worker)
+
+            if error is not None:
+                raise error
+
+        return predictions
+
+    def respawn(self, dead):
+        """Start a replacement for a worker whose process died, or drop its slot if that fails too"""
+        dead.close()
+        worker = None
+        try:
+            worker = PoolWorker(self.ctx, *self.worker_args, dead.cpu)
+            worker.load()
+        except Exception as e:
+            if worker is not None:
+                worker.close()
+            self.workers.remove(dead)
+            print(f"Inference worker could not be restarted, {len(self.workers)} left: {e}")
+            return
+        self.workers[self.workers.index(dead)] = worker
+        self.idle.put(worker)
+
+    def reload(self):
+        """Have every worker reload its models from disk, one at a time so the pool keeps serving"""
+        pending = set(self.workers)
+        while pending:
+            # A worker restarted since the reload began already loaded the new models
+            pending.intersection_update(self.workers)
+            if not pending:
+                break
+            worker = self.idle.get()
+            if worker not in pending:
+                # Already reloaded; hand it back and wait for one of the busy ones
+                self.idle.put(worker)
+                time.sleep(0.001)
+                continue
+            try:
+                worker.load(reload=True)
+            except (EOFError, OSError):
+                # Died mid-reload; its replacement starts on the new models
+                pending.discard(worker)
+                self.respawn(worker)
+                continue
+            except Exception:
+                self.idle.put(worker)
+                raise
+            pending.discard(worker)
+            self.idle.put(worker)
+
+    def close(self):
+        workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.close()
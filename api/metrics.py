@@ -0,0 +1,151 @@
+import bisect
+import threading
+import time
+
+# Stage and request latency buckets in seconds (50 us to 5 s)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Rows per model call, powers of two up to 64k
+BATCH_ROW_BUCKETS = tuple(2 ** i for i in range(17))
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Base for a labelled metric; label values are passed positionally, in labelnames order"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), enabled=True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.enabled = enabled
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self):
+        with self.lock:
+            values = list(self.values.items())
+        return self.header() + [f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}'
+                                for labels, value in values]
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, *labels, value):
+        with self.lock:
+            self.values[labels] = value
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+class Histogram(Metric):
+    """
+    Cumulative-bucket histogram in the Prometheus layout
+
+    Each labelled series keeps one count per bucket plus a sum; observe()
+    is a bisect and two increments under the metric's lock.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, enabled=True):
+        super().__init__(name, documentation, labelnames, enabled)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        if not self.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                # One count per bucket plus +Inf, then the sum
+                series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing the wall-clock time of its block"""
+        return Timer(self, labels)
+
+    def render(self):
+        with self.lock:
+            values = [(labels, list(series)) for labels, series in self.values.items()]
+
+        lines = self.header()
+        for labels, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = f'le="{format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(series[-1])}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+class Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(*self.labels, value=time.perf_counter() - self.start)
+
+class MetricsRegistry:
+    """Creates metrics and renders all of them in the Prometheus text exposition format"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames, self.enabled))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames, self.enabled))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets, self.enabled))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,119 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Rough per-entry cost on top of the feature bytes: key tuple, bytes object header,
+# OrderedDict node and the cached (prediction, expiry) pair
+ENTRY_OVERHEAD_BYTES = 260
+
+class PredictionCache:
+    """
+    Bounded LRU/TTL cache of per-row predictions
+
+    Entries are keyed on (model name, model version, encoded feature row),
+    so a new model version never sees predictions made by the previous one.
+    The version comes from the scorer itself: while it is switching models
+    (or switches during a call) rows are scored but not cached.
+    The least recently used rows are evicted once the estimated size passes
+    max_bytes; rows older than ttl_seconds (0 = no expiry) count as misses.
+    """
+
+    def __init__(self, max_bytes, ttl_seconds=0):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.size_bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypassed = 0
+
+    def predict(self, name, X, predict_rows, serving_version):
+        """
+        Predict every row of X, calling predict_rows only for rows not in the cache
+
+        Args:
+            name (str): Model name ('user' or 'booking')
+            X (np.ndarray): Encoded, unscaled feature matrix
+            predict_rows (callable): Scores a feature matrix (may scale it in place)
+            serving_version (callable): Version of the models predict_rows would use right now,
+                or None while they are being replaced
+
+        Returns:
+            np.ndarray: int64 predictions
+        """
+        version = serving_version()
+        if version is None:
+            with self.lock:
+                self.bypassed += len(X)
+            return predict_rows(X)
+
+        keys = [(name, version, row.tobytes()) for row in X]
+        predictions = np.empty(len(X), dtype=np.int64)
+        missing = []
+        now = time.monotonic()
+
+        with self.lock:
+            for i, key in enumerate(keys):
+                entry = self.entries.get(key)
+                if entry is not None and self.ttl_seconds and entry[1] <= now:
+                    del self.entries[key]
+                    self.size_bytes -= ENTRY_OVERHEAD_BYTES + len(key[2])
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    missing.append(i)
+                    continue
+                self.entries.move_to_end(key)
+                predictions[i] = entry[0]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+
+        if not missing:
+            return predictions
+
+        fresh = predict_rows(X[missing])
+        predictions[missing] = fresh
+        # Versions only move forward, so the same one on both sides means it scored these rows
+        if serving_version() != version:
+            with self.lock:
+                self.bypassed += len(missing)
+            return predictions
+
+        expires = now + self.ttl_seconds
+        with self.lock:
+            for i, prediction in zip(missing, fresh.tolist()):
+                key = keys[i]
+                if key not in self.entries:
+                    self.size_bytes += ENTRY_OVERHEAD_BYTES + len(key[2])
+                self.entries[key] = (prediction, expires)
+            while self.size_bytes > self.max_bytes and self.entries:
+                key, _ = self.entries.popitem(last=False)
+                self.size_bytes -= ENTRY_OVERHEAD_BYTES + len(key[2])
+                self.evictions += 1
+
+        return predictions
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'size_bytes': self.size_bytes,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'bypassed': self.bypassed
+        }
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from model_stats import RECENT_PREDICTIONS, add_predictions, update_stats_file
+
+class PredictionStats:
+    """
+    Records served predictions and merges them into model_stats.json
+
+    record() is all the request path does: it appends to two deques, which
+    is atomic under the GIL, so requests never wait on a lock. A bounded
+    ring keeps the latest batches for recent_predictions; a queue of
+    per-batch counts feeds prediction_history. A background thread drains
+    both every flush_interval seconds, adds them to the file and replaces
+    it atomically (model_stats.update_stats_file), so several API processes
+    can share one stats file without losing counts.
+    """
+
+    def __init__(self, path, flush_interval=10.0, recent=RECENT_PREDICTIONS, confidence=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.recent_limit = recent
+        # confidence(kind, models, X, predictions) -> probability of each predicted class
+        self.confidence = confidence
+
+        self.recent = deque(maxlen=recent)
+        self.pending = deque()
+        self.flush_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.flushes = 0
+        self.worker = None
+
+    def record(self, kind, predictions, records=None, X=None, models=None):
+        """
+        Record one scored batch
+
+        Args:
+            kind (str): 'user' or 'booking'
+            predictions (np.ndarray): 0/1 prediction per row
+            records (list or None): Request records, for the entity ids
+            X (np.ndarray or None): Encoded rows, scored again for the confidence at flush time
+            models (ModelSet or None): Model set that produced the predictions
+        """
+        timestamp = time.time()
+        self.pending.append((timestamp, kind, predictions))
+        tail = slice(-self.recent_limit, None)
+        self.recent.append((timestamp, kind, predictions[tail],
+                            records[tail] if records is not None else None,
+                            X[tail].copy() if X is not None else None, models))
+
+    def start(self):
+        self.worker = threading.Thread(target=self.run, name='prediction-stats', daemon=True)
+        self.worker.start()
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Prediction stats flush failed: {e}")
+
+    def stop(self):
+        """Stop the flusher and write out what is still pending"""
+        self.stopped.set()
+        self.flush()
+
+    def drain_counts(self):
+        """Pop the pending batches into (rows per model, {month: [user rows, booking rows, fraud]})"""
+        totals = {'user': 0, 'booking': 0}
+        months = {}
+        while True:
+            try:
+                timestamp, kind, predictions = self.pending.popleft()
+            except IndexError:
+                return totals, months
+            month = datetime.fromtimestamp(timestamp).strftime('%Y-%m')
+            counts = months.setdefault(month, [0, 0, 0])
+            counts[0 if kind == 'user' else 1] += len(predictions)
+            counts[2] += int(predictions.sum())
+            totals[kind] += len(predictions)
+
+    def drain_recent(self):
+        """Pop the ring's batches into recent_predictions entries, newest first"""
+        batches = []
+        while True:
+            try:
+                batches.append(self.recent.popleft())
+            except IndexError:
+                break
+
+        entries = []
+        for timestamp, kind, predictions, records, X, models in batches:
+            confidence = None
+            if self.confidence is not None and X is not None and models is not None:
+                confidence = self.confidence(kind, models, X, predictions)
+            for i, prediction in enumerate(predictions):
+                record = records[i] if records is not None and i < len(records) else {}
+                entries.append({
+                    'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
+                    'type': kind,
+                    'id': record.get(f'{kind}_id') if isinstance(record, dict) else None,
+                    'result': 'fraud' if prediction else 'legitimate',
+                    'confidence': float(confidence[i]) if confidence is not None else None
+                })
+        entries.reverse()
+        return entries[:self.recent_limit]
+
+    def flush(self):
+        """
+        Add everything recorded since the last flush to the stats file
+
+        Returns:
+            bool: Whether anything was written
+        """
+        with self.flush_lock:
+            totals, months = self.drain_counts()
+            recent = self.drain_recent()
+            if not months and not recent:
+                return False
+
+            update_stats_file(lambda stats: add_predictions(stats, totals, months, recent, self.recent_limit),
+                              self.path)
+            self.flushes += 1
+            return True
@@ -0,0 +1,143 @@
+import time
+import threading
+from datetime import datetime
+
+from model_store import model_version
+from pipeline import FeaturePipeline
+
+class ModelSet:
+    """One loaded generation of the user and booking models"""
+
+    def __init__(self, user_model, user_scaler, booking_model, booking_scaler, user_engine, booking_engine):
+        self.user_model = user_model
+        self.user_scaler = user_scaler
+        self.booking_model = booking_model
+        self.booking_scaler = booking_scaler
+        self.user_engine = user_engine
+        self.booking_engine = booking_engine
+        # Encoding and scaling of this generation's inputs
+        self.pipeline = FeaturePipeline(user_scaler, booking_scaler)
+
+        # Filled in by the registry once the set is loaded and warmed up
+        self.version = None
+        self.fingerprint = None
+        self.loaded_at = None
+        self.load_seconds = None
+
+class ModelRegistry:
+    """
+    Holds the active ModelSet and swaps in new versions without a restart
+
+    A reload builds and warms the new set in the background while requests
+    keep using the current one; the swap is a single reference assignment,
+    so a request that read `registry.active` once always sees a complete set.
+    """
+
+    def __init__(self, loader, models_dir, warmup=None):
+        self.loader = loader
+        self.models_dir = models_dir
+        self.warmup = warmup
+        self.listeners = []  # called with each newly activated ModelSet
+
+        self.active = None
+        self.generation = 0
+        self.reload_lock = threading.Lock()
+        self.reloading = False
+        self.last_error = None
+        self.watcher = None
+
+    def load(self):
+        """Load, warm up and activate a new ModelSet in the calling thread"""
+        with self.reload_lock:
+            self.reloading = True
+            try:
+                start = time.perf_counter()
+                while True:
+                    fingerprint = model_version(self.models_dir)
+                    models = self.loader()
+                    # An export that landed mid-load would leave the label behind the files; load again
+                    if model_version(self.models_dir) == fingerprint:
+                        break
+                if self.warmup is not None:
+                    self.warmup(models)
+
+                models.fingerprint = fingerprint
+                models.version = f'{self.generation + 1}-{fingerprint}'
+                models.pipeline.version = models.version
+                models.loaded_at = datetime.now().isoformat()
+                models.load_seconds = time.perf_counter() - start
+
+                self.generation += 1
+                self.active = models
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f'{type(e).__name__}: {e}'
+                raise
+            finally:
+                self.reloading = False
+
+        for listener in self.listeners:
+            try:
+                listener(models)
+            except Exception as e:
+                print(f"Model activation listener failed: {e}")
+        return models
+
+    def reload_async(self):
+        """
+        Start a background reload unless one is already running
+
+        Returns:
+            bool: True if a reload was started
+        """
+        if self.reloading:
+            return False
+
+        def run():
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Model reload failed, keeping version {self.active.version if self.active else None}: {e}")
+
+        threading.Thread(target=run, name='model-reload', daemon=True).start()
+        return True
+
+    def watch(self, interval=5.0):
+        """
+        Poll models_dir and reload when model_store.model_version changes
+
+        An export switches versions in one step; a change is still only acted
+        on once two consecutive polls agree, so legacy pickles that are still
+        being written are not picked up half done.
+        """
+        def run():
+            pending = None
+            while True:
+                time.sleep(interval)
+                try:
+                    fingerprint = model_version(self.models_dir)
+                except FileNotFoundError:
+                    # Legacy pickles being replaced; look again next poll
+                    continue
+                if self.active is not None and fingerprint == self.active.fingerprint:
+                    pending = None
+                elif fingerprint == pending and not self.reloading:
+                    print(f"Model files changed, reloading from {self.models_dir}")
+                    self.reload_async()
+                    pending = None
+                else:
+                    pending = fingerprint
+
+        self.watcher = threading.Thread(target=run, name='model-watcher', daemon=True)
+        self.watcher.start()
+
+    def status(self):
+        models = self.active
+        return {
+            'ready': models is not None,
+            'model_version': models.version if models else None,
+            'model_loaded_at': models.loaded_at if models else None,
+            'model_load_seconds': models.load_seconds if models else None,
+            'reloading': self.reloading,
+            'last_reload_error': self.last_error
+        }
@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'scripts'))
+from columnar import convert_csv, has_fresh_table, table_path
+
+# Columns score_bookings.py reads from each file
+PROJECTIONS = {
+    'bookings.csv': ['booking_id', 'user_id', 'num_tickets', 'payment_method', 'ip_address'],
+    'booking_training_data.csv': ['num_tickets', 'payment_method', 'ip_address', 'user_booking_count',
+                                  'user_avg_tickets', 'is_fraudulent']
+}
+
+# Run in a fresh process per measurement, so peak RSS belongs to that load alone
+LOAD_CODE = """
+import sys, time, json
+import numpy as np
+import pandas as pd
+sys.path.insert(0, 'scripts')
+from columnar import read_table, read_frame
+from features import encode_booking_frame, encode_booking_columns
+
+def peak_rss_kb():
+    # VmHWM starts over at exec; ru_maxrss would carry the parent's peak across fork
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+
+method, path, columns = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+baseline = peak_rss_kb()
+start = time.perf_counter()
+
+if method == 'csv':
+    data = pd.read_csv(path, usecols=columns)
+elif method == 'table':
+    data = read_table(path, columns)
+    # Mapping is lazy; touch every page so the timing covers reading the data
+    for values in data.values():
+        np.asarray(values).view(np.uint8).sum()
+elif method == 'table-decoded':
+    data = read_frame(path, columns)
+elif method == 'csv-features':
+    data = encode_booking_frame(pd.read_csv(path, usecols=columns))
+elif method == 'table-features':
+    data = encode_booking_columns(read_table(path, columns))
+
+seconds = time.perf_counter() - start
+peak = peak_rss_kb()
+print(json.dumps({'seconds': seconds, 'peak_mb': (peak - baseline) / 1024}))
+"""
+
+def measure(method, path, columns):
+    output = subprocess.run([sys.executable, '-c', LOAD_CODE, method, path, json.dumps(columns)],
+                            cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+def size_mb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 1e6
+    return os.path.getsize(path) / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare load time and memory of CSV files and their column tables')
+    parser.add_argument('--data-dir', default=os.path.join(ROOT_DIR, 'data'))
+    args = parser.parse_args()
+
+    print(f"{'file':<27} {'columns':>9} {'method':>15} {'load (s)':>9} {'peak RSS (MB)':>14}")
+    for name, projection in PROJECTIONS.items():
+        csv_path = os.path.abspath(os.path.join(args.data_dir, name))
+        if not has_fresh_table(csv_path):
+            start = time.perf_counter()
+            convert_csv(csv_path)
+            print(f"Converted {csv_path} in {time.perf_counter() - start:.1f} s")
+        print(f"{name}: CSV {size_mb(csv_path):.0f} MB, table {size_mb(table_path(csv_path)):.0f} MB")
+
+        runs = [('all', 'csv', None), ('all', 'table', None),
+                ('projected', 'csv', projection), ('projected', 'table', projection),
+                ('projected', 'table-decoded', projection)]
+        if name == 'booking_training_data.csv':
+            features = projection[:-1]
+            runs += [('features', 'csv-features', features), ('features', 'table-features', features)]
+
+        for label, method, columns in runs:
+            r = measure(method, csv_path, columns)
+            print(f"{'':<27} {label:>9} {method:>15} {r['seconds']:>9.2f} {r['peak_mb']:>14.0f}")
+
+if __name__ == "__main__":
+    main()
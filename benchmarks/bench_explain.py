@@ -0,0 +1,37 @@
+import os
+import sys
+import time
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'scripts'))
+sys.path.append(os.path.join(ROOT_DIR, 'api'))
+from bench_features import random_bookings, time_per_call
+from features import encode_booking_records, scale_features
+from forest import FlatForest
+import model_store
+
+BATCH_SIZES = [1, 10, 100, 1000]
+
+def main():
+    _, _, booking_model, booking_scaler = model_store.load_models()
+    engine = FlatForest.from_sklearn(booking_model)
+
+    start = time.perf_counter()
+    engine.prepare_explanations()
+    print(f"attribution tables: {(time.perf_counter() - start) * 1000:.1f} ms, "
+          f"{engine.node_contributions.nbytes / 1024:.0f} KB for {len(engine.feature)} nodes\n")
+
+    print(f"{'batch':>6} {'predict_proba (us)':>19} {'explain (us)':>13} {'ratio':>6} {'explanations/s':>15}  max |base + sum - proba|")
+    for batch_size in BATCH_SIZES:
+        X = scale_features(encode_booking_records(random_bookings(batch_size)), booking_scaler)
+        proba, base, contributions = engine.explain(X)
+        error = np.abs(base + contributions.sum(axis=1) - proba).max()
+
+        predict_us = time_per_call(engine.predict_proba, X)
+        explain_us = time_per_call(engine.explain, X)
+        print(f"{batch_size:>6} {predict_us:>19.1f} {explain_us:>13.1f} {explain_us / predict_us:>5.1f}x "
+              f"{batch_size / explain_us * 1e6:>15.0f}  {error:.1e}")
+
+if __name__ == "__main__":
+    main()
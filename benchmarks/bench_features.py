@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import random
+import joblib
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'scripts'))
+from features import BOOKING_FEATURES, encode_booking_records, scale_features
+
+BATCH_SIZES = [1, 10, 1000]
+
+def random_bookings(count, seed=0):
+    """Generate /predict_booking payloads shaped like data/booking_training_data.csv"""
+    rng = random.Random(seed)
+    return [{
+        'num_tickets': rng.randint(1, 25),
+        'payment_method': rng.choice(['credit_card', 'debit_card', 'paypal']),
+        'ip_address': f"{rng.randint(1, 255)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 255)}",
+        'user_booking_count': rng.randint(0, 20),
+        'user_avg_tickets': rng.uniform(1, 20)
+    } for _ in range(count)]
+
+def pandas_features(data, scaler):
+    """The DataFrame pipeline /predict_booking used before the fast path"""
+    df = pd.DataFrame(data)
+    df['payment_method'] = df['payment_method'].map({'credit_card': 1, 'debit_card': 2, 'paypal': 3})
+    df['ip_address'] = df['ip_address'].apply(lambda x: int(x.split('.')[-1]))
+    return scaler.transform(df[BOOKING_FEATURES])
+
+def fast_features(data, scaler):
+    return scale_features(encode_booking_records(data), scaler)
+
+def time_per_call(func, *args, min_time=0.5):
+    """Median wall time per call in microseconds"""
+    timings = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time or len(timings) < 5:
+        t0 = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - t0)
+    return float(np.median(timings)) * 1e6
+
+def main():
+    models_dir = os.path.join(ROOT_DIR, 'models')
+    booking_model = joblib.load(os.path.join(models_dir, 'booking_fraud_model.pkl'))
+    booking_scaler = joblib.load(os.path.join(models_dir, 'booking_scaler.pkl'))
+
+    print(f"{'batch':>6} {'pandas (us)':>12} {'fast (us)':>10} {'speedup':>8}  predictions")
+    for batch_size in BATCH_SIZES:
+        data = random_bookings(batch_size)
+
+        legacy = pandas_features(data, booking_scaler)
+        fast = fast_features(data, booking_scaler)
+        identical = np.array_equal(legacy, fast) and np.array_equal(
+            booking_model.predict_proba(legacy), booking_model.predict_proba(fast))
+
+        pandas_us = time_per_call(pandas_features, data, booking_scaler)
+        fast_us = time_per_call(fast_features, data, booking_scaler)
+        print(f"{batch_size:>6} {pandas_us:>12.1f} {fast_us:>10.1f} {pandas_us / fast_us:>7.1f}x  "
+              f"{'identical' if identical else 'MISMATCH'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'scripts'))
+sys.path.append(os.path.join(ROOT_DIR, 'api'))
+from bench_features import random_bookings, time_per_call
+from forest import FlatForest
+
+BATCH_SIZES = [1, 10, 100, 1000]
+
+def p50_request_latency(client, payload, requests=300):
+    """Median /predict_booking latency through the Flask test client, in microseconds"""
+    timings = []
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        client.post('/predict_booking', json=payload)
+        timings.append(time.perf_counter() - t0)
+    return float(np.median(timings)) * 1e6
+
+def main():
+    # Benchmark requests are not recorded into data/model_stats.json
+    os.environ.setdefault('FRAUD_STATS_FLUSH_INTERVAL', '0')
+    import app
+
+    models = app.registry.active
+    booking_model = models.booking_model
+    engine = FlatForest.from_sklearn(booking_model)
+
+    print("predict_proba")
+    print(f"{'batch':>6} {'sklearn (us)':>13} {'flat (us)':>10} {'speedup':>8}  outputs")
+    for batch_size in BATCH_SIZES:
+        X = models.pipeline.bookings(random_bookings(batch_size))
+        # Parity also covers missing values (JSON null), which follow each split's learned direction
+        X_missing = X.copy()
+        X_missing[::2, np.arange(0, batch_size, 2) % X.shape[1]] = np.nan
+        identical = (np.array_equal(booking_model.predict_proba(X), engine.predict_proba(X)) and
+                     np.array_equal(booking_model.predict_proba(X_missing), engine.predict_proba(X_missing)))
+        sklearn_us = time_per_call(booking_model.predict_proba, X)
+        flat_us = time_per_call(engine.predict_proba, X)
+        print(f"{batch_size:>6} {sklearn_us:>13.1f} {flat_us:>10.1f} {sklearn_us / flat_us:>7.1f}x  "
+              f"{'identical' if identical else 'MISMATCH'}")
+
+    client = app.app.test_client()
+    payload = random_bookings(1)
+    flat_p50 = p50_request_latency(client, payload)
+    flat_max_rows, app.FLAT_FOREST_MAX_ROWS = app.FLAT_FOREST_MAX_ROWS, 0  # route the endpoint back through sklearn
+    sklearn_p50 = p50_request_latency(client, payload)
+    app.FLAT_FOREST_MAX_ROWS = flat_max_rows
+
+    print("\nsingle-row /predict_booking (Flask test client)")
+    print(f"p50 sklearn: {sklearn_p50:.1f} us, flat: {flat_p50:.1f} us ({sklearn_p50 / flat_p50:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'scripts'))
+sys.path.append(os.path.join(ROOT_DIR, 'api'))
+from bench_features import random_bookings
+from features import encode_booking_records
+from model_store import MODELS_DIR
+
+def rows_per_second(predict, X, min_time=2.0):
+    """Score X repeatedly for at least min_time seconds and return the row throughput"""
+    rows = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time:
+        predict(X)
+        rows += len(X)
+    return rows / (time.perf_counter() - start)
+
+def main():
+    from inference_pool import InferencePool
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    parser = argparse.ArgumentParser(description='Measure batch scoring throughput of the process-pool backend')
+    parser.add_argument('--processes', type=int, nargs='+', default=sorted({1, 2, 4, cores}))
+    parser.add_argument('--batch-size', type=int, default=8192)
+    parser.add_argument('--store', default='pickle', choices=['pickle', 'mmap', 'compiled'])
+    args = parser.parse_args()
+
+    X = encode_booking_records(random_bookings(args.batch_size))
+    print(f"{args.batch_size} bookings per call, {cores} core(s) available, {args.store} store")
+    if max(args.processes) > cores:
+        # Extra workers only take turns on the same cores, so those rows show IPC overhead
+        print(f"Scaling beyond {cores} process(es) is not measured on this host; run it on a machine "
+              f"with at least {max(args.processes)} cores")
+    print(f"{'processes':>10} {'rows/s':>12} {'scaling':>8}  outputs")
+
+    baseline = None
+    reference = None
+    for processes in args.processes:
+        pool = InferencePool(processes, MODELS_DIR, store=args.store)
+        try:
+            predictions = pool.predict('booking', X)
+            reference = predictions if reference is None else reference
+            throughput = rows_per_second(lambda rows: pool.predict('booking', rows), X)
+        finally:
+            pool.close()
+
+        baseline = baseline or throughput
+        print(f"{processes:>10} {throughput:>12.0f} {throughput / baseline:>7.2f}x  "
+              f"{'identical' if np.array_equal(predictions, reference) else 'MISMATCH'}"
+              f"{'  (more processes than cores)' if processes > cores else ''}")
+
+if __name__ == "__main__":
+    main()
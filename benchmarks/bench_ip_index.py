@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'scripts'))
+from features import parse_ipv4
+from ip_index import IPIndex
+
+BATCH_SIZES = [1, 10, 1000, 100000]
+
+def dotted(packed):
+    """Dotted strings for uint32 addresses"""
+    return [f"{a >> 24}.{a >> 16 & 255}.{a >> 8 & 255}.{a & 255}" for a in packed.tolist()]
+
+def split_last_octets(ip_addresses):
+    """The per-string parsing the scripts used before parse_ipv4"""
+    return np.array([int(ip.split('.')[-1]) for ip in ip_addresses], dtype=np.float64)
+
+def time_per_call(func, *args, min_time=0.5):
+    """Median wall time per call in microseconds"""
+    timings = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time or len(timings) < 5:
+        t0 = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - t0)
+    return float(np.median(timings)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='IPv4 parsing and IP index build, lookup and memory')
+    parser.add_argument('--addresses', type=int, default=10_000_000, help='bookings to index')
+    parser.add_argument('--distinct', type=int, default=5_000_000, help='distinct addresses among them')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    known = rng.integers(0, 2 ** 32, args.distinct, dtype=np.uint64).astype(np.uint32)
+    bookings = known[rng.integers(0, len(known), args.addresses)]
+
+    print(f"{'batch':>7} {'split (us)':>11} {'parse_ipv4 (us)':>16} {'lookup (us)':>12}")
+    for batch_size in BATCH_SIZES:
+        queries = dotted(bookings[:batch_size])
+        if batch_size == BATCH_SIZES[0]:
+            t0 = time.perf_counter()
+            index = IPIndex.from_addresses(bookings)
+            build_seconds = time.perf_counter() - t0
+        split_us = time_per_call(split_last_octets, queries)
+        parse_us = time_per_call(parse_ipv4, queries)
+        lookup_us = time_per_call(index.lookup, queries)
+        print(f"{batch_size:>7} {split_us:>11.1f} {parse_us:>16.1f} {lookup_us:>12.1f}")
+
+    stats = index.stats()
+    print(f"\nIndex of {args.addresses} bookings: built in {build_seconds:.2f} s, {stats['addresses']} addresses, "
+          f"{stats['subnets']} /24 subnets, {stats['bytes'] / 2 ** 20:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
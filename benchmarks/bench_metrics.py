@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Per-request time of /predict_booking through the Flask stack, with recording switched
+# off and on in alternating rounds so drift in machine speed hits both settings alike
+REQUEST_CODE = """
+import sys, time, json, random
+sys.path.insert(0, 'api')
+import app
+
+rows, requests, rounds = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+while app.registry.active is None:
+    time.sleep(0.01)
+
+rng = random.Random(0)
+payload = [{'num_tickets': rng.randint(1, 25), 'payment_method': rng.choice(['credit_card', 'debit_card', 'paypal']),
+            'ip_address': f'10.0.{rng.randint(0, 255)}.{rng.randint(0, 255)}',
+            'user_booking_count': rng.randint(1, 20), 'user_avg_tickets': rng.random() * 10} for _ in range(rows)]
+client = app.app.test_client()
+for _ in range(50):
+    client.post('/predict_booking', json=payload)
+
+# Same switch as FRAUD_METRICS=0, without a second process
+best = {False: float('inf'), True: float('inf')}
+for _ in range(rounds):
+    for enabled in (False, True):
+        for metric in app.metrics.metrics:
+            metric.enabled = enabled
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.post('/predict_booking', json=payload)
+        best[enabled] = min(best[enabled], (time.perf_counter() - start) / requests)
+print(json.dumps({'off_us': best[False] * 1e6, 'on_us': best[True] * 1e6}))
+"""
+
+# Cost of the individual recording calls
+OPS_CODE = """
+import sys, time, json
+sys.path.insert(0, 'api')
+from metrics import MetricsRegistry
+
+registry = MetricsRegistry()
+counter = registry.counter('c', 'c', ['endpoint', 'status', 'model_version'])
+histogram = registry.histogram('h', 'h', ['model', 'stage', 'model_version'])
+n = 200000
+
+def per_call(fn):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+def timed_block():
+    with histogram.time('booking', 'predict', 'v1'):
+        pass
+
+print(json.dumps({
+    'counter_inc_ns': per_call(lambda: counter.inc('/predict_booking', '200', 'v1')),
+    'histogram_observe_ns': per_call(lambda: histogram.observe('booking', 'predict', 'v1', value=0.0004)),
+    'histogram_time_ns': per_call(timed_block)
+}))
+"""
+
+def run(code, args, env_overrides):
+    env = dict(os.environ, PYTHONWARNINGS='ignore', FRAUD_FEATURE_STORE='0', FRAUD_STATS_FLUSH_INTERVAL='0',
+               **env_overrides)
+    output = subprocess.run([sys.executable, '-c', code, *map(str, args)], cwd=ROOT_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the request overhead of the /metrics instrumentation')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1, 100], help='bookings per request')
+    parser.add_argument('--requests', type=int, default=500, help='requests per timing round')
+    parser.add_argument('--rounds', type=int, default=10, help='timing rounds per setting (best one counts)')
+    args = parser.parse_args()
+
+    ops = run(OPS_CODE, [], {})
+    print(f"counter inc {ops['counter_inc_ns']:.0f} ns, histogram observe {ops['histogram_observe_ns']:.0f} ns, "
+          f"timed block {ops['histogram_time_ns']:.0f} ns")
+
+    print(f"{'rows/request':>12} {'metrics off (us)':>17} {'metrics on (us)':>16} {'overhead (us)':>14} {'overhead':>9}")
+    for rows in args.rows:
+        r = run(REQUEST_CODE, [rows, args.requests, args.rounds], {})
+        off, on = r['off_us'], r['on_us']
+        print(f"{rows:>12} {off:>17.1f} {on:>16.1f} {on - off:>14.1f} {(on - off) / off:>9.1%}")
+
+if __name__ == "__main__":
+    main()
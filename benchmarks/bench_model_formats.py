@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'scripts'))
+import joblib
+import model_store
+from features import scale_features
+from model_store import (MODELS_DIR, FUSED_MODELS_FILE, FLAT_MODELS_SUBDIR, COMPILED_MODELS_FILE, LEGACY_MODEL_FILES,
+                         require_serving_dir)
+from train_models_from_csv import TRAINING_SETS, load_training_matrices
+
+def load_legacy():
+    """The four legacy pickles, as (model, scaler) per model name"""
+    return {name: (joblib.load(os.path.join(MODELS_DIR, f'{name}_fraud_model.pkl')),
+                   joblib.load(os.path.join(MODELS_DIR, f'{name}_scaler.pkl')))
+            for name in ('user', 'booking')}
+
+def load_fused():
+    fused = joblib.load(os.path.join(require_serving_dir(MODELS_DIR), FUSED_MODELS_FILE))
+    return {'user': (fused['user_model'], None), 'booking': (fused['booking_model'], None)}
+
+def load_flat():
+    user_forest, booking_forest = model_store.load_flat_models(MODELS_DIR, mmap=False)
+    return {'user': (user_forest, None), 'booking': (booking_forest, None)}
+
+def load_compiled():
+    user_forest, booking_forest = model_store.load_compiled_models(MODELS_DIR)
+    return {'user': (user_forest, None), 'booking': (booking_forest, None)}
+
+# Format name, loader, files on disk (legacy pickles in models/, the rest in the live serving generation)
+FORMATS = [
+    ('pickles', load_legacy, LEGACY_MODEL_FILES, False),
+    ('fused', load_fused, [FUSED_MODELS_FILE], True),
+    ('flat', load_flat, [FLAT_MODELS_SUBDIR], True),
+    ('compiled', load_compiled, [COMPILED_MODELS_FILE], True)
+]
+
+def disk_bytes(names, serving):
+    """Total size of the given files (or directories, recursively)"""
+    base = require_serving_dir(MODELS_DIR) if serving else MODELS_DIR
+    total = 0
+    for name in names:
+        path = os.path.join(base, name)
+        if os.path.isdir(path):
+            total += sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+        else:
+            total += os.path.getsize(path)
+    return total
+
+def time_per_call(func, *args, min_time=0.5):
+    """Median wall time per call in microseconds"""
+    timings = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time or len(timings) < 5:
+        t0 = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - t0)
+    return float(np.median(timings)) * 1e6
+
+def compare(models, reference, matrices):
+    """Prediction mismatches and largest probability difference against the reference models"""
+    mismatches, max_diff = 0, 0.0
+    for name, X in matrices.items():
+        expected = reference[name][0].predict_proba(scale_features(X.copy(), reference[name][1]))
+        model, scaler = models[name]
+        actual = model.predict_proba(scale_features(X.copy(), scaler))
+        mismatches += int((expected.argmax(axis=1) != actual.argmax(axis=1)).sum())
+        max_diff = max(max_diff, float(np.abs(expected - actual).max()))
+    return mismatches, max_diff
+
+def main():
+    parser = argparse.ArgumentParser(description='Size, load time and prediction equivalence of the model formats')
+    parser.add_argument('--min-time', type=float, default=1.0, help='seconds of repeated loads per format')
+    args = parser.parse_args()
+
+    os.chdir(ROOT_DIR)
+    matrices = {name: load_training_matrices(name, csv_path, features)[0] for name, csv_path, features in TRAINING_SETS}
+    reference = load_legacy()
+
+    print(f"{'format':>9} {'size (KB)':>10} {'load (ms)':>10} {'mismatches':>11} {'max diff':>9}")
+    for name, loader, files, serving in FORMATS:
+        load_ms = time_per_call(loader, min_time=args.min_time) / 1000
+        mismatches, max_diff = compare(loader(), reference, matrices)
+        print(f"{name:>9} {disk_bytes(files, serving) / 1024:>10.1f} {load_ms:>10.2f} {mismatches:>11} {max_diff:>9.1g}")
+
+    rows = sum(len(X) for X in matrices.values())
+    print(f"\nPredictions compared with the scaler+model pickles on the {rows} training rows of both models")
+
+if __name__ == "__main__":
+    main()
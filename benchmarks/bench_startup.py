@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter: time the import of api/app.py, the first /health and readiness
+STARTUP_CODE = """
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, 'api')
+import app
+imported = time.perf_counter()
+health = app.app.test_client().get('/health')
+first_health = time.perf_counter()
+while app.registry.active is None and app.registry.last_error is None:
+    time.sleep(0.005)
+ready = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - start,
+    'first_health_s': first_health - start,
+    'ready_s': ready - start,
+    'health_status': health.status_code
+}))
+"""
+
+MODES = [
+    ('eager, pickle', {'FRAUD_LAZY_STARTUP': '0', 'FRAUD_MODEL_STORE': 'pickle'}),
+    ('lazy, pickle', {'FRAUD_LAZY_STARTUP': '1', 'FRAUD_MODEL_STORE': 'pickle'}),
+    ('eager, mmap', {'FRAUD_LAZY_STARTUP': '0', 'FRAUD_MODEL_STORE': 'mmap'}),
+    ('lazy, mmap', {'FRAUD_LAZY_STARTUP': '1', 'FRAUD_MODEL_STORE': 'mmap'}),
+    ('eager, compiled', {'FRAUD_LAZY_STARTUP': '0', 'FRAUD_MODEL_STORE': 'compiled'})
+]
+
+def measure(env_overrides, runs=5):
+    """Median of each startup milestone over several cold interpreter starts"""
+    env = dict(os.environ, PYTHONWARNINGS='ignore', **env_overrides)
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', STARTUP_CODE], cwd=ROOT_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: sorted(r[key] for r in results)[len(results) // 2] for key in ('import_s', 'first_health_s', 'ready_s')}
+
+def main():
+    print(f"{'mode':>15} {'import app (s)':>15} {'first /health (s)':>18} {'ready (s)':>10}")
+    for name, env_overrides in MODES:
+        r = measure(env_overrides)
+        print(f"{name:>15} {r['import_s']:>15.3f} {r['first_health_s']:>18.3f} {r['ready_s']:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'scripts'))
+sys.path.append(os.path.join(ROOT_DIR, 'api'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from bench_features import random_bookings, time_per_call
+from load_test import start_server, run_clients, http_client
+
+RESULTS_FORMAT_VERSION = 1
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+DEFAULT_PAYLOADS = os.path.join(ROOT_DIR, 'benchmarks', 'payloads.jsonl')
+
+ENDPOINTS = {'booking': '/predict_booking', 'user': '/predict_user'}
+TRANSPORTS = ['inprocess', 'flask', 'asgi']
+
+# Run in a scratch directory holding copies of the training CSVs, so the repo's models stay untouched
+TRAIN_CODE = """
+import sys, json
+sys.path.insert(0, sys.argv[1])
+from train_models_from_csv import train_models
+timings = train_models()
+print(json.dumps(timings))
+"""
+
+def random_users(count, seed=0):
+    """Generate /predict_user payloads shaped like data/user_training_data.csv"""
+    rng = random.Random(seed)
+    return [{
+        'total_tickets': rng.randint(1, 60),
+        'booking_count': rng.randint(1, 20),
+        'distinct_payment_methods': rng.randint(1, 3),
+        'distinct_ip_addresses': rng.randint(1, 10),
+        'payment_method': rng.choice(['credit_card', 'debit_card', 'paypal']),
+        'ip_address': f"{rng.randint(1, 255)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 255)}"
+    } for _ in range(count)]
+
+SYNTHETIC = {'booking': random_bookings, 'user': random_users}
+
+def load_payloads(path):
+    """
+    Read recorded request bodies, one JSON object per line
+
+    A line is either {"endpoint": "/predict_booking", "body": [...]} or a
+    bare body (a record or list of records), whose endpoint is inferred
+    from its fields.
+
+    Returns:
+        dict: Model name ('booking', 'user') -> list of JSON bodies
+    """
+    payloads = {name: [] for name in ENDPOINTS}
+    paths = {path: name for name, path in ENDPOINTS.items()}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, dict) and 'body' in entry:
+                name, body = paths[entry['endpoint']], entry['body']
+            else:
+                body = entry
+                first = body[0] if isinstance(body, list) else body
+                name = 'booking' if 'num_tickets' in first else 'user'
+            payloads[name].append(json.dumps(body))
+    return payloads
+
+def row_count(body):
+    records = json.loads(body)
+    return len(records) if isinstance(records, list) else 1
+
+def in_process_client(app_module, path):
+    """Client factory for run_clients posting to the Flask app through a test client per thread"""
+    def open_client():
+        client = app_module.app.test_client()
+
+        def send(body):
+            return client.post(path, data=body, content_type='application/json').status_code
+
+        return send, lambda: None
+    return open_client
+
+def load_scenarios(args, replayed):
+    """(source, model, batch size, bodies) for every load measurement"""
+    scenarios = []
+    for name in args.endpoints:
+        if replayed.get(name):
+            scenarios.append(('replay', name, None, replayed[name]))
+        for batch_size in args.batch_sizes:
+            bodies = [json.dumps(SYNTHETIC[name](batch_size, seed=i)) for i in range(64)]
+            scenarios.append(('synthetic', name, batch_size, bodies))
+    return scenarios
+
+def run_load_suite(args, app_module, replayed):
+    """Every load scenario at every concurrency level, over each transport"""
+    results = []
+    scenarios = load_scenarios(args, replayed)
+    print(f"{'transport':>9} {'endpoint':>16} {'source':>9} {'batch':>6} {'clients':>7} {'req/s':>9} "
+          f"{'rows/s':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'errors':>6}")
+    for transport in args.transports:
+        proc = None
+        if transport != 'inprocess':
+            proc = start_server(transport, args.port)
+        try:
+            for source, name, batch_size, bodies in scenarios:
+                path = ENDPOINTS[name]
+                if transport == 'inprocess':
+                    open_client = in_process_client(app_module, path)
+                else:
+                    open_client = http_client('127.0.0.1', args.port, path)
+                rows = batch_size or float(np.mean([row_count(body) for body in bodies]))
+
+                for concurrency in args.concurrency:
+                    r = run_clients(open_client, bodies, concurrency, args.duration)
+                    r.update(kind='load', transport=transport, endpoint=path, source=source,
+                             batch_size=batch_size, concurrency=concurrency,
+                             rows_per_s=r['throughput_rps'] * rows)
+                    r['name'] = (f"load/{transport}{path}/{source}"
+                                 f"{f'/b{batch_size}' if batch_size else ''}/c{concurrency}")
+                    results.append(r)
+                    print(f"{transport:>9} {path:>16} {source:>9} {batch_size or '-':>6} {concurrency:>7} "
+                          f"{r['throughput_rps']:>9.1f} {r['rows_per_s']:>10.0f} {r['p50_ms'] or 0:>9.2f} "
+                          f"{r['p95_ms'] or 0:>9.2f} {r['p99_ms'] or 0:>9.2f} {r['errors']:>6}")
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+    return results
+
+def stage_functions(app_module, name, batch_size):
+    """(stage, function) pairs timing each step /predict_<name> takes for one request"""
+    from features import USER_FEATURES, BOOKING_FEATURES, encode_user_records, encode_booking_records
+
+    models = app_module.registry.active
+    if name == 'booking':
+        model, engine = models.booking_model, models.booking_engine
+        encode, features, score = encode_booking_records, BOOKING_FEATURES, app_module.score_bookings
+    else:
+        model, engine = models.user_model, models.user_engine
+        encode, features, score = encode_user_records, USER_FEATURES, app_module.score_users
+
+    records = SYNTHETIC[name](batch_size)
+    body = json.dumps(records)
+    X = encode(records)
+    X_scaled = models.pipeline.scale(name, X)
+    predictions = engine.predict(X_scaled)
+    response = {f'{name}_fraud_prediction': predictions.tolist()}
+
+    stages = [
+        ('parse', lambda: json.loads(body)),
+        ('encode', lambda: encode(records)),
+        ('scale', lambda: models.pipeline.scale(name, X)),
+        ('predict_flat', lambda: engine.predict(X_scaled)),
+        ('explain', lambda: app_module.explain_rows(engine, models.pipeline, name, X, features)),
+        ('serialize', lambda: json.dumps(response)),
+        ('end_to_end', lambda: score(records))
+    ]
+    if model is not None:
+        stages.insert(4, ('predict_sklearn', lambda: model.predict(X_scaled)))
+    return stages
+
+def run_stage_suite(args, app_module):
+    """Median time per call of each pipeline stage, per model and batch size"""
+    results = []
+    print(f"\n{'stage':>24} {'batch':>6} {'us/call':>11} {'us/row':>9}")
+    for name in args.endpoints:
+        for batch_size in args.batch_sizes:
+            for stage, func in stage_functions(app_module, name, batch_size):
+                us = time_per_call(func, min_time=args.stage_time)
+                results.append({'kind': 'stage', 'name': f'stage/{name}/{stage}/b{batch_size}', 'model': name,
+                                'stage': stage, 'batch_size': batch_size, 'us': us, 'us_per_row': us / batch_size})
+                print(f"{f'{name}/{stage}':>24} {batch_size:>6} {us:>11.1f} {us / batch_size:>9.2f}")
+
+    from analyze_booking import analyze_booking
+    booking = random_bookings(1, seed=1)[0]
+    analyze_booking(booking)
+    us = time_per_call(analyze_booking, booking, min_time=args.stage_time)
+    results.append({'kind': 'stage', 'name': 'stage/analyze_booking', 'stage': 'analyze_booking', 'us': us})
+    print(f"{'analyze_booking':>24} {1:>6} {us:>11.1f} {us:>9.2f}")
+    return results
+
+def run_train_benchmark():
+    """Stage timings of train_models() on copies of the training CSVs"""
+    with tempfile.TemporaryDirectory() as scratch:
+        os.makedirs(os.path.join(scratch, 'data'))
+        for name in ('user_training_data.csv', 'booking_training_data.csv'):
+            shutil.copy(os.path.join(ROOT_DIR, 'data', name), os.path.join(scratch, 'data', name))
+        output = subprocess.run([sys.executable, '-c', TRAIN_CODE, os.path.join(ROOT_DIR, 'scripts')], cwd=scratch,
+                                env=dict(os.environ, PYTHONWARNINGS='ignore'),
+                                capture_output=True, text=True, check=True).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+
+    print(f"\n{'train_models stage':>24} {'seconds':>9}")
+    results = []
+    for stage, seconds in list(timings.items()) + [('total', sum(timings.values()))]:
+        results.append({'kind': 'train', 'name': f'train/{stage}', 'stage': stage, 'seconds': seconds})
+        print(f"{stage:>24} {seconds:>9.2f}")
+    return results
+
+def git_revision():
+    """Current commit and whether the tree has uncommitted changes (None outside a git checkout)"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def environment():
+    import sklearn
+
+    commit, dirty = git_revision()
+    return {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__
+    }
+
+# Metric compared per result kind, and whether a lower value is better
+COMPARED_METRICS = {
+    'load': [('throughput_rps', False), ('p50_ms', True), ('p95_ms', True), ('p99_ms', True)],
+    'stage': [('us', True)],
+    'train': [('seconds', True)]
+}
+
+def compare(baseline, current, threshold):
+    """
+    Print every metric of current next to the same-named result in baseline
+
+    Returns:
+        int: Number of metrics that got worse by more than threshold (a fraction)
+    """
+    previous = {r['name']: r for r in baseline['results']}
+    regressions = 0
+    print(f"\nCompared with {baseline['environment'].get('commit')} ({baseline['environment'].get('timestamp')}):")
+    print(f"{'result':>48} {'metric':>15} {'before':>11} {'after':>11} {'change':>8}")
+    for result in current['results']:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        for metric, lower_is_better in COMPARED_METRICS[result['kind']]:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = new / old - 1
+            worse = change > threshold if lower_is_better else change < -threshold
+            regressions += worse
+            print(f"{result['name']:>48} {metric:>15} {old:>11.2f} {new:>11.2f} {change:>+8.1%}"
+                  f"{'  REGRESSION' if worse else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test and micro-benchmark the fraud scoring stack')
+    parser.add_argument('--transports', nargs='+', default=TRANSPORTS, choices=TRANSPORTS,
+                        help='inprocess (Flask test client) and/or a local flask or asgi server')
+    parser.add_argument('--endpoints', nargs='+', default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument('--payloads', default=DEFAULT_PAYLOADS, help="recorded request bodies to replay ('' to skip)")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=2.0, help='seconds per load measurement')
+    parser.add_argument('--stage-time', type=float, default=0.5, help='minimum seconds per stage measurement')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--skip', nargs='+', default=[], choices=['load', 'stages', 'train'])
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative change reported as a regression by --compare')
+    args = parser.parse_args()
+
+    # Benchmark requests are not recorded into data/model_stats.json
+    os.environ.setdefault('FRAUD_STATS_FLUSH_INTERVAL', '0')
+    import app as app_module
+    while app_module.registry.active is None:
+        time.sleep(0.01)
+
+    replayed = load_payloads(args.payloads) if args.payloads else {}
+    results = []
+    if 'load' not in args.skip:
+        results += run_load_suite(args, app_module, replayed)
+    if 'stages' not in args.skip:
+        results += run_stage_suite(args, app_module)
+    if 'train' not in args.skip:
+        results += run_train_benchmark()
+
+    report = {
+        'format_version': RESULTS_FORMAT_VERSION,
+        'environment': environment(),
+        'config': vars(args),
+        'results': results
+    }
+    output = args.output
+    if output is None:
+        commit = report['environment']['commit']
+        label = (commit[:12] if commit else 'unversioned') + ('-dirty' if report['environment']['dirty'] else '')
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f'{label}.json')
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            print(f"{regressions} metric(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in each simulated worker: import the API, report its startup time, then idle until released
+WORKER_CODE = """
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, 'api')
+import app
+print(json.dumps({'startup_s': time.perf_counter() - start, 'sklearn_loaded': 'sklearn' in sys.modules}), flush=True)
+sys.stdin.read()
+"""
+
+def memory_kb(pid):
+    """Rss and Pss (shared pages split between the processes mapping them) from smaps_rollup"""
+    memory = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                memory[key] = int(rest.split()[0])
+    return memory
+
+def run_workers(store, workers):
+    # Feature store and IP index off: only the models differ between the stores
+    env = dict(os.environ, FRAUD_MODEL_STORE=store, FRAUD_FEATURE_STORE='0', FRAUD_IP_INDEX='0',
+               PYTHONWARNINGS='ignore')
+    procs = [subprocess.Popen([sys.executable, '-c', WORKER_CODE], cwd=ROOT_DIR, env=env,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+             for _ in range(workers)]
+    try:
+        reports = [json.loads(proc.stdout.readline()) for proc in procs]
+        memory = [memory_kb(proc.pid) for proc in procs]
+    finally:
+        for proc in procs:
+            proc.stdin.close()
+            proc.wait()
+
+    return {
+        'store': store,
+        'workers': workers,
+        'mean_startup_s': sum(r['startup_s'] for r in reports) / workers,
+        'sklearn_loaded': any(r['sklearn_loaded'] for r in reports),
+        'mean_rss_mb': sum(m['Rss'] for m in memory) / workers / 1024,
+        'mean_pss_mb': sum(m['Pss'] for m in memory) / workers / 1024
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-worker memory and cold start of the model stores')
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{'store':>8} {'workers':>8} {'startup (s)':>12} {'RSS/worker (MB)':>16} {'PSS/worker (MB)':>16}  sklearn imported")
+    for store in ('pickle', 'mmap', 'compiled'):
+        r = run_workers(store, args.workers)
+        print(f"{r['store']:>8} {r['workers']:>8} {r['mean_startup_s']:>12.3f} {r['mean_rss_mb']:>16.1f} "
+              f"{r['mean_pss_mb']:>16.1f}  {r['sklearn_loaded']}")
+
+if __name__ == "__main__":
+    main()
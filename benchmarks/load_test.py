@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import http.client
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from bench_features import random_bookings
+
+SERVER_COMMANDS = {
+    'flask': [sys.executable, '-c',
+              "import sys; sys.path.insert(0, 'api'); from app import app; "
+              "app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:application', '--app-dir', 'api',
+             '--host', '127.0.0.1', '--log-level', 'warning', '--port']
+}
+
+def start_server(kind, port):
+    """Launch a server in a subprocess and wait until /ready answers 200"""
+    command = SERVER_COMMANDS[kind] + [str(port)]
+    # Load-test predictions are not recorded into data/model_stats.json
+    env = dict(os.environ, PYTHONWARNINGS='ignore', FRAUD_STATS_FLUSH_INTERVAL='0')
+    proc = subprocess.Popen(command, cwd=ROOT_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/ready')
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            pass
+        time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f'{kind} server did not become ready on port {port}')
+
+def latency_summary(latencies, errors, elapsed):
+    """Throughput and latency percentiles of one measurement"""
+    all_latencies = np.concatenate([np.asarray(l) for l in latencies]) * 1000
+    summary = {
+        'requests': int(all_latencies.size),
+        'errors': int(sum(errors)),
+        'throughput_rps': all_latencies.size / elapsed
+    }
+    for p in (50, 95, 99):
+        summary[f'p{p}_ms'] = float(np.percentile(all_latencies, p)) if all_latencies.size else None
+    return summary
+
+def run_clients(open_client, payloads, concurrency, duration):
+    """
+    Keep `concurrency` client threads sending payloads back to back for `duration` seconds
+
+    Args:
+        open_client (callable): Returns (send, close) for one client; send(body)
+            returns the HTTP status and raises OSError or HTTPException if the
+            connection broke
+        payloads (list): Request bodies, taken round-robin
+        concurrency (int): Client threads
+        duration (float): Seconds to run
+
+    Returns:
+        dict: Throughput, latency percentiles and error count
+    """
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    stop_at = time.perf_counter() + duration
+
+    def client(index):
+        send, close = open_client()
+        i = index
+        while time.perf_counter() < stop_at:
+            body = payloads[i % len(payloads)]
+            i += concurrency
+            t0 = time.perf_counter()
+            try:
+                if send(body) != 200:
+                    errors[index] += 1
+            except (OSError, http.client.HTTPException):
+                errors[index] += 1
+                close()
+                send, close = open_client()
+                continue
+            latencies[index].append(time.perf_counter() - t0)
+        close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latency_summary(latencies, errors, time.perf_counter() - start)
+
+def http_client(host, port, path):
+    """Client factory for run_clients posting JSON bodies over one keep-alive connection"""
+    def open_client():
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        headers = {'Content-Type': 'application/json'}
+
+        def send(body):
+            conn.request('POST', path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+
+        return send, conn.close
+    return open_client
+
+def run_load(host, port, path, payloads, concurrency, duration):
+    """Load a running server over HTTP (see run_clients)"""
+    return run_clients(http_client(host, port, path), payloads, concurrency, duration)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the Flask and ASGI servers under concurrent load')
+    parser.add_argument('--servers', nargs='+', default=['flask', 'asgi'], choices=sorted(SERVER_COMMANDS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--batch-size', type=int, default=1, help='bookings per request')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per measurement')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    payloads = [json.dumps(random_bookings(args.batch_size, seed=i)) for i in range(256)]
+    results = []
+
+    print(f"{'server':>6} {'clients':>8} {'req/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'errors':>7}")
+    for kind in args.servers:
+        proc = start_server(kind, args.port)
+        try:
+            for concurrency in args.concurrency:
+                r = run_load('127.0.0.1', args.port, '/predict_booking', payloads, concurrency, args.duration)
+                r.update(server=kind, concurrency=concurrency, batch_size=args.batch_size)
+                results.append(r)
+                print(f"{kind:>6} {concurrency:>8} {r['throughput_rps']:>9.1f} {r['p50_ms']:>9.2f} "
+                      f"{r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['errors']:>7}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,34 @@
-import pandas as pd
-import numpy as np
-import joblib
 import os
 import json
-from sklearn.preprocessing import StandardScaler
+from functools import lru_cache
+import model_store
+from forest import FlatForest
+from features import BOOKING_FEATURES, encode_booking_records
+from pipeline import load_pipeline
+from ip_index import BOOKINGS_CSV, IPIndex
+from whatif import DEFAULT_GRID, simulate, find_scenario, describe_scenario, flips_by_cost
 
-def load_models():
-    """Load the trained models and scalers"""
-    models_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
-    
-    booking_model = joblib.load(os.path.join(models_dir, 'booking_fraud_model.pkl'))
-    booking_scaler = joblib.load(os.path.join(models_dir, 'booking_scaler.pkl'))
+@lru_cache(maxsize=2)
+def load_models(version):
+    """Load the trained booking model and scaler (None for the fused artifact), once per model version"""
+    _, _, booking_model, booking_scaler = model_store.load_models()
     
     return booking_model, booking_scaler
 
+@lru_cache(maxsize=1)
+def load_ip_index():
+    """Booking counts per IP address and /24 from data/bookings.csv (None without it), once per process"""
+    return IPIndex.from_csv(BOOKINGS_CSV) if os.path.exists(BOOKINGS_CSV) else None
+
+@lru_cache(maxsize=2)
+def load_explainer(version):
+    """Packed copy of the booking model with its decision-path tables precomputed"""
+    booking_model, _ = load_models(version)
+    explainer = FlatForest.from_sklearn(booking_model)
+    explainer.prepare_explanations()
+    
+    return explainer
+
 def analyze_booking(booking_data):
     """
     Analyze a specific booking to determine why it was flagged and what changes would make it not flagged
@@ -24,42 +39,36 @@ def analyze_booking(booking_data):
     Returns:
         dict: Analysis results
     """
-    # Load models
-    booking_model, booking_scaler = load_models()
-    
-    # Convert to DataFrame
-    df = pd.DataFrame([booking_data])
-    
-    # Preprocess booking data
-    df['payment_method'] = df['payment_method'].map({'credit_card': 1, 'debit_card': 2, 'paypal': 3})
-    df['ip_address'] = df['ip_address'].apply(lambda x: int(x.split('.')[-1]))
-    
-    # Select booking features
-    booking_features = ['num_tickets', 'payment_method', 'ip_address', 'user_booking_count', 'user_avg_tickets']
-    X = df[booking_features]
+    # Load models (reloaded only when they are retrained)
+    version = model_store.model_version()
+    booking_model, _ = load_models(version)
+    pipeline = load_pipeline()
     
-    # Scale the data
-    X_scaled = booking_scaler.transform(X)
+    # The booking's encoded feature values, as the model sees them before scaling
+    values = dict(zip(BOOKING_FEATURES, encode_booking_records([booking_data])[0].tolist()))
     
-    # Make prediction
-    prediction = booking_model.predict(X_scaled)[0]
-    probability = booking_model.predict_proba(X_scaled)[0][1]
+    # Score the booking together with every what-if scenario in a single call;
+    # row 0 of the simulation is the unchanged booking
+    simulation = simulate(booking_data, DEFAULT_GRID, booking_model, pipeline)
+    prediction = simulation['predictions'][0]
+    probability = simulation['probabilities'][0]
     
     # Get feature importance
     feature_importance = booking_model.feature_importances_
     
-    # Calculate feature contributions
+    # Calculate feature contributions: how much each feature's splits along the
+    # booking's decision paths moved the fraud probability, averaged over the trees
+    explainer = load_explainer(version)
+    _, _, contributions = explainer.explain(pipeline.booking(booking_data))
+    fraud_contributions = contributions[0, :, list(explainer.classes_).index(1)]
+    
     feature_contributions = []
-    for i, feature in enumerate(booking_features):
-        value = X.iloc[0, i]
-        importance = feature_importance[i]
-        contribution = importance * value
-        
+    for i, feature in enumerate(BOOKING_FEATURES):
         feature_contributions.append({
             'feature': feature,
-            'value': value,
-            'importance': importance,
-            'contribution': contribution
+            'value': values[feature],
+            'importance': float(feature_importance[i]),
+            'contribution': float(fraud_contributions[i])
         })
     
     # Sort by contribution
@@ -67,45 +76,55 @@ def analyze_booking(booking_data):
     
     # Generate risk factors
     risk_factors = []
-    if df['num_tickets'].values[0] > 4:
+    if values['num_tickets'] > 4:
         risk_factors.append({
             'factor': 'Large number of tickets',
             'description': 'Booking has 5 or more tickets, which is higher than typical legitimate bookings',
-            'severity': 'medium' if df['num_tickets'].values[0] < 10 else 'high'
+            'severity': 'medium' if values['num_tickets'] < 10 else 'high'
         })
     
-    if df['payment_method'].values[0] == 3:  # PayPal
+    if values['payment_method'] == 3:  # PayPal
         risk_factors.append({
             'factor': 'Payment method',
             'description': 'PayPal payments have a slightly higher fraud rate in our system',
             'severity': 'low'
         })
     
-    if df['user_booking_count'].values[0] == 0:
+    if values['user_booking_count'] == 0:
         risk_factors.append({
             'factor': 'New user',
             'description': 'User has no previous booking history',
             'severity': 'medium'
         })
     
+    # Reputation of the booking's IP address and its /24 in the booking history
+    ip_index = load_ip_index()
+    ip_history = ip_index.history([booking_data])[0] if ip_index is not None else None
+    if ip_history is not None and ip_history['subnet_history_bookings'] == 0:
+        risk_factors.append({
+            'factor': 'Unknown network',
+            'description': 'No previous booking came from this IP address or its /24 subnet',
+            'severity': 'low'
+        })
+    
     # Generate recommendations to reduce fraud risk
     recommendations = []
     if prediction == 1:  # If flagged as fraud
-        if df['num_tickets'].values[0] > 4:
+        if values['num_tickets'] > 4:
             recommendations.append({
                 'action': 'Reduce number of tickets',
                 'description': 'Bookings with fewer tickets are less likely to be flagged',
                 'impact': 'high'
             })
         
-        if df['payment_method'].values[0] == 3:  # PayPal
+        if values['payment_method'] == 3:  # PayPal
             recommendations.append({
                 'action': 'Use credit card instead of PayPal',
                 'description': 'Credit card payments have lower fraud rates',
                 'impact': 'medium'
             })
         
-        if df['user_booking_count'].values[0] == 0:
+        if values['user_booking_count'] == 0:
             recommendations.append({
                 'action': 'Build booking history',
                 'description': 'Users with established booking history are less likely to be flagged',
@@ -114,83 +133,32 @@ def analyze_booking(booking_data):
     
     # Simulate changes to see what would make the booking not flagged
     simulations = []
-    
-    # Simulation 1: Change payment method to credit card
-    if df['payment_method'].values[0] != 1:
-        sim_data = booking_data.copy()
-        sim_data['payment_method'] = 'credit_card'
-        sim_df = pd.DataFrame([sim_data])
-        sim_df['payment_method'] = sim_df['payment_method'].map({'credit_card': 1, 'debit_card': 2, 'paypal': 3})
-        sim_df['ip_address'] = sim_df['ip_address'].apply(lambda x: int(x.split('.')[-1]))
-        sim_X = sim_df[booking_features]
-        sim_X_scaled = booking_scaler.transform(sim_X)
-        sim_prediction = booking_model.predict(sim_X_scaled)[0]
-        sim_probability = booking_model.predict_proba(sim_X_scaled)[0][1]
-        
-        simulations.append({
-            'change': 'Change payment method to credit card',
-            'prediction': 'legitimate' if sim_prediction == 0 else 'fraud',
-            'probability': float(sim_probability),
-            'effective': sim_prediction == 0
-        })
-    
-    # Simulation 2: Reduce number of tickets to 3
-    if df['num_tickets'].values[0] > 3:
-        sim_data = booking_data.copy()
-        sim_data['num_tickets'] = 3
-        sim_df = pd.DataFrame([sim_data])
-        sim_df['payment_method'] = sim_df['payment_method'].map({'credit_card': 1, 'debit_card': 2, 'paypal': 3})
-        sim_df['ip_address'] = sim_df['ip_address'].apply(lambda x: int(x.split('.')[-1]))
-        sim_X = sim_df[booking_features]
-        sim_X_scaled = booking_scaler.transform(sim_X)
-        sim_prediction = booking_model.predict(sim_X_scaled)[0]
-        sim_probability = booking_model.predict_proba(sim_X_scaled)[0][1]
-        
-        simulations.append({
-            'change': 'Reduce number of tickets to 3',
-            'prediction': 'legitimate' if sim_prediction == 0 else 'fraud',
-            'probability': float(sim_probability),
-            'effective': sim_prediction == 0
-        })
-    
-    # Simulation 3: Increase user booking count to 5
-    if df['user_booking_count'].values[0] < 5:
-        sim_data = booking_data.copy()
-        sim_data['user_booking_count'] = 5
-        sim_df = pd.DataFrame([sim_data])
-        sim_df['payment_method'] = sim_df['payment_method'].map({'credit_card': 1, 'debit_card': 2, 'paypal': 3})
-        sim_df['ip_address'] = sim_df['ip_address'].apply(lambda x: int(x.split('.')[-1]))
-        sim_X = sim_df[booking_features]
-        sim_X_scaled = booking_scaler.transform(sim_X)
-        sim_prediction = booking_model.predict(sim_X_scaled)[0]
-        sim_probability = booking_model.predict_proba(sim_X_scaled)[0][1]
+    checks = [
+        (values['payment_method'] != 1, 'Change payment method to credit card',
+         {'payment_method': 'credit_card'}),
+        (values['num_tickets'] > 3, 'Reduce number of tickets to 3',
+         {'num_tickets': 3}),
+        (values['user_booking_count'] < 5, 'Increase user booking history to 5 bookings',
+         {'user_booking_count': 5}),
+        (True, 'Combined changes: credit card payment, 3 tickets, 5 previous bookings',
+         {'payment_method': 'credit_card', 'num_tickets': 3, 'user_booking_count': 5})
+    ]
+    for applies, change, changes in checks:
+        if not applies:
+            continue
+        row = find_scenario(simulation, changes)
+        sim_prediction = simulation['predictions'][row]
         
         simulations.append({
-            'change': 'Increase user booking history to 5 bookings',
+            'change': change,
             'prediction': 'legitimate' if sim_prediction == 0 else 'fraud',
-            'probability': float(sim_probability),
-            'effective': sim_prediction == 0
+            'probability': float(simulation['probabilities'][row]),
+            'effective': bool(sim_prediction == 0)
         })
     
-    # Simulation 4: Combine multiple changes
-    sim_data = booking_data.copy()
-    sim_data['payment_method'] = 'credit_card'
-    sim_data['num_tickets'] = 3
-    sim_data['user_booking_count'] = 5
-    sim_df = pd.DataFrame([sim_data])
-    sim_df['payment_method'] = sim_df['payment_method'].map({'credit_card': 1, 'debit_card': 2, 'paypal': 3})
-    sim_df['ip_address'] = sim_df['ip_address'].apply(lambda x: int(x.split('.')[-1]))
-    sim_X = sim_df[booking_features]
-    sim_X_scaled = booking_scaler.transform(sim_X)
-    sim_prediction = booking_model.predict(sim_X_scaled)[0]
-    sim_probability = booking_model.predict_proba(sim_X_scaled)[0][1]
-    
-    simulations.append({
-        'change': 'Combined changes: credit card payment, 3 tickets, 5 previous bookings',
-        'prediction': 'legitimate' if sim_prediction == 0 else 'fraud',
-        'probability': float(sim_probability),
-        'effective': sim_prediction == 0
-    })
+    # Smallest change across the whole grid that flips the decision
+    flips = flips_by_cost(simulation)
+    minimal_flip = describe_scenario(simulation, flips[0]) if len(flips) else None
     
     # Create analysis result
     analysis = {
@@ -198,8 +166,10 @@ def analyze_booking(booking_data):
         'probability': float(probability),
         'feature_contributions': feature_contributions,
         'risk_factors': risk_factors,
+        'ip_history': ip_history,
         'recommendations': recommendations,
-        'simulations': simulations
+        'simulations': simulations,
+        'minimal_flip': minimal_flip
     }
     
     return analysis
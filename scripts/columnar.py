@@ -0,0 +1,309 @@
+import os
+import sys
+import json
+import errno
+import shutil
+import tempfile
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from features import PAYMENT_METHOD_MAP, encode_payment_methods, parse_ipv4
+
+FORMAT_VERSION = 1
+
+# A table lives next to its CSV: data/bookings.csv -> data/bookings.cols/
+TABLE_SUFFIX = '.cols'
+META_FILE = 'meta.json'
+
+DEFAULT_CHUNK_SIZE = 1000000
+
+# Storage type of the columns in data/; other columns are typed from what pandas parses
+COLUMN_TYPES = {
+    'user_id': 'string',
+    'name': 'string',
+    'email': 'string',
+    'booking_id': 'string',
+    'ticket_id': 'string',
+    'created_at': 'timestamp',
+    'booking_time': 'timestamp',
+    'payment_method': 'payment_method',  # uint8 PAYMENT_METHOD_MAP codes
+    'ip_address': 'ipv4',  # packed uint32
+    'user_avg_tickets': 'float'
+}
+
+# Payment method names in code order (code 1 first)
+PAYMENT_METHOD_NAMES = sorted(PAYMENT_METHOD_MAP, key=PAYMENT_METHOD_MAP.get)
+
+# Decimal strings of 0-255, indexed by value, for formatting IP octets
+OCTET_STRINGS = np.array([str(i) for i in range(256)], dtype=object)
+
+def table_path(csv_path):
+    return os.path.splitext(csv_path)[0] + TABLE_SUFFIX
+
+def source_fingerprint(csv_path):
+    """Size and modification time of a CSV; a table is only used while they match"""
+    source = os.stat(csv_path)
+    return {'size': source.st_size, 'mtime_ns': source.st_mtime_ns}
+
+def column_type(name, values):
+    if name in COLUMN_TYPES:
+        return COLUMN_TYPES[name]
+    if pd.api.types.is_bool_dtype(values):
+        return 'bool'
+    if pd.api.types.is_integer_dtype(values):
+        return 'int'
+    if pd.api.types.is_float_dtype(values):
+        return 'float'
+    return 'string'
+
+def encode_column(values, kind):
+    """
+    Encode one column of a CSV chunk into its stored form
+
+    Categoricals (as built by generate_csv_data.py) are encoded through
+    their categories, so each distinct value is parsed once.
+
+    Args:
+        values (pd.Series): Column as parsed by pandas
+        kind (str): Storage type from column_type()
+
+    Returns:
+        np.ndarray: Encoded values
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = encode_column(pd.Series(values.cat.categories), kind)
+        return categories[values.cat.codes.to_numpy()]
+
+    if kind == 'string':
+        return np.char.encode(values.to_numpy().astype(str), 'utf-8')
+    if kind == 'timestamp':
+        return pd.to_datetime(values, format='ISO8601').to_numpy().astype('datetime64[s]')
+    if kind == 'payment_method':
+        return encode_payment_methods(values.to_numpy()).astype(np.uint8)
+    if kind == 'ipv4':
+        return parse_ipv4(values.to_numpy())
+    if kind == 'bool':
+        return values.to_numpy(dtype=bool)
+    if kind == 'float':
+        return values.to_numpy(dtype=np.float64)
+    return values.to_numpy(dtype=np.int64)
+
+def narrowest_int(values):
+    """Cast an int64 column to the smallest integer type holding all of its values"""
+    if not len(values):
+        return values.astype(np.int8)
+    low, high = int(values.min()), int(values.max())
+    for dtype in (np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return values
+
+def write_table(chunks, path, source=None):
+    """
+    Write DataFrame chunks as a table: one .npy file per column plus meta.json
+
+    The table is built in a directory of its own and renamed into place, so
+    readers never see a partly written one and concurrent writers (say,
+    pre-fork API workers converting a stale table at startup) never touch
+    each other's files.
+
+    Args:
+        chunks (iterable of pd.DataFrame): Rows, all with the same columns
+        path (str): Table directory to create or replace
+        source (dict or None): Fingerprint of the CSV the rows came from
+
+    Returns:
+        dict: The table's metadata
+    """
+    parts = {}
+    kinds = {}
+    for chunk in chunks:
+        for name in chunk.columns:
+            kind = kinds.setdefault(name, column_type(name, chunk[name]))
+            parts.setdefault(name, []).append(encode_column(chunk[name], kind))
+
+    tmp_path = scratch_table_dir(path)
+    try:
+        meta = {'format_version': FORMAT_VERSION, 'source': source, 'rows': 0, 'columns': {}}
+        for name, arrays in parts.items():
+            # np.concatenate widens the fixed-width string chunks to the longest value
+            values = np.concatenate(arrays)
+            del arrays[:]
+            if kinds[name] == 'int':
+                values = narrowest_int(values)
+            np.save(os.path.join(tmp_path, f'{name}.npy'), values)
+            meta['rows'] = len(values)
+            meta['columns'][name] = {'type': kinds[name], 'dtype': values.dtype.str}
+
+        with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+        return publish_table(tmp_path, path, meta)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+def scratch_table_dir(path):
+    """New empty directory next to a table, named so data/*.cols/ ignore rules cover it"""
+    base = os.path.basename(path)[:-len(TABLE_SUFFIX)] if path.endswith(TABLE_SUFFIX) else os.path.basename(path)
+    return tempfile.mkdtemp(prefix=f'{base}.', suffix=f'.tmp{TABLE_SUFFIX}', dir=os.path.dirname(path) or '.')
+
+def publish_table(tmp_path, path, meta):
+    """
+    Rename a finished table directory to path
+
+    Renaming onto a missing path is atomic. A table already there is kept if
+    it was built from the same source (another writer got there first);
+    otherwise it is renamed aside and ours renamed in, so path is only
+    missing between those two renames.
+
+    Returns:
+        dict: Metadata of the table now at path
+    """
+    while True:
+        try:
+            os.rename(tmp_path, path)
+            return meta
+        except OSError as e:
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                raise
+
+        try:
+            current = read_meta(path)
+        except (OSError, ValueError):
+            current = None
+        if current is not None and meta['source'] is not None and current['source'] == meta['source']:
+            shutil.rmtree(tmp_path)
+            return current
+
+        old_path = scratch_table_dir(path)
+        try:
+            os.rename(path, old_path)
+        except FileNotFoundError:
+            # Another writer moved it aside first; try the rename again
+            os.rmdir(old_path)
+            continue
+        shutil.rmtree(old_path)
+
+def convert_csv(csv_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Convert a CSV file into a table next to it and return the table's path"""
+    path = table_path(csv_path)
+    source = source_fingerprint(csv_path)
+    # round_trip parses floats exactly, so the table matches the frame the CSV was written from
+    write_table(pd.read_csv(csv_path, chunksize=chunk_size, float_precision='round_trip'), path, source)
+    return path
+
+def write_frame(df, csv_path):
+    """Write the table for a CSV that was just written from df, without parsing it back"""
+    write_table([df], table_path(csv_path), source_fingerprint(csv_path))
+
+def read_meta(path):
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported table format in {path}: {meta.get('format_version')}")
+    return meta
+
+def has_fresh_table(csv_path):
+    """True if the CSV has a table that was built from its current contents"""
+    path = table_path(csv_path)
+    if not os.path.exists(os.path.join(path, META_FILE)):
+        return False
+    return read_meta(path)['source'] == source_fingerprint(csv_path)
+
+def read_table(csv_path, columns=None, convert=True, mmap=True):
+    """
+    Load columns of a CSV file from its table, memory-mapped
+
+    Only the requested columns' files are opened. A missing or stale table
+    is rebuilt from the CSV first when convert is True.
+
+    Args:
+        csv_path (str): The CSV file (or a .cols table directory)
+        columns (list or None): Columns to load; None loads all of them
+        convert (bool): Build the table if it is missing or out of date
+        mmap (bool): Memory-map the column files instead of reading them
+
+    Returns:
+        dict: Column name -> encoded np.ndarray, in the requested order
+    """
+    if csv_path.endswith(TABLE_SUFFIX):
+        path = csv_path
+    else:
+        path = table_path(csv_path)
+        if not has_fresh_table(csv_path):
+            if not convert:
+                raise FileNotFoundError(f"No up-to-date table for {csv_path}; run scripts/columnar.py {csv_path}")
+            convert_csv(csv_path)
+
+    # A writer replacing the table between opening meta.json and the last column would
+    # mix two versions (or find it missing for a moment); meta.json's source tells
+    for attempt in range(3):
+        if attempt:
+            time.sleep(0.05)
+        try:
+            meta = read_meta(path)
+            columns = list(meta['columns']) if columns is None else columns
+            missing = [name for name in columns if name not in meta['columns']]
+            if missing:
+                raise KeyError(f"Columns not in {path}: {missing}")
+
+            data = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                    for name in columns}
+            if read_meta(path)['source'] == meta['source']:
+                return data
+        except FileNotFoundError:
+            if attempt == 2:
+                raise
+    raise RuntimeError(f"{path} kept changing while it was read")
+
+def column_types(path):
+    return {name: column['type'] for name, column in read_meta(path)['columns'].items()}
+
+def decode_column(values, kind):
+    """
+    Turn a stored column back into what pd.read_csv would give for it
+
+    Returns:
+        np.ndarray or pd.Categorical: Decoded values (categorical for payment methods)
+    """
+    if kind == 'string':
+        return np.char.decode(values, 'utf-8').astype(object)
+    if kind == 'payment_method':
+        return pd.Categorical.from_codes(values.astype(np.int64) - 1, PAYMENT_METHOD_NAMES)
+    if kind == 'ipv4':
+        ips = values.astype(np.int64)
+        return (OCTET_STRINGS[ips >> 24] + '.' + OCTET_STRINGS[(ips >> 16) & 255] + '.' +
+                OCTET_STRINGS[(ips >> 8) & 255] + '.' + OCTET_STRINGS[ips & 255])
+    return np.asarray(values)
+
+def read_frame(csv_path, columns=None, convert=True):
+    """Load columns of a CSV file from its table as a decoded DataFrame"""
+    data = read_table(csv_path, columns, convert)
+    kinds = column_types(csv_path if csv_path.endswith(TABLE_SUFFIX) else table_path(csv_path))
+    return pd.DataFrame({name: decode_column(values, kinds[name]) for name, values in data.items()})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert CSV files into memory-mappable column tables')
+    parser.add_argument('csv_files', nargs='*', default=['data/users.csv', 'data/bookings.csv',
+                                                          'data/user_training_data.csv',
+                                                          'data/booking_training_data.csv'])
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='CSV rows parsed at a time')
+    parser.add_argument('--force', action='store_true', help='rebuild tables that are already up to date')
+    args = parser.parse_args()
+
+    for csv_path in args.csv_files:
+        if not os.path.exists(csv_path):
+            print(f"Input file not found: {csv_path}")
+            sys.exit(1)
+        if has_fresh_table(csv_path) and not args.force:
+            print(f"{table_path(csv_path)} is up to date")
+            continue
+        path = convert_csv(csv_path, args.chunk_size)
+        meta = read_meta(path)
+        size = sum(os.path.getsize(os.path.join(path, f'{name}.npy')) for name in meta['columns'])
+        print(f"{csv_path} -> {path}: {meta['rows']:,} rows, {size / 1e6:.1f} MB "
+              f"(CSV {os.path.getsize(csv_path) / 1e6:.1f} MB)")
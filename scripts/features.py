@@ -0,0 +1,185 @@
+import socket
+from functools import partial
+import numpy as np
+
+# Encoding shared by every model input
+PAYMENT_METHOD_MAP = {'credit_card': 1, 'debit_card': 2, 'paypal': 3}
+
+# Dotted IPv4 string -> its 4 network-order bytes (canonical dotted quads only)
+inet_pton_v4 = partial(socket.inet_pton, socket.AF_INET)
+
+USER_FEATURES = ['total_tickets', 'booking_count', 'distinct_payment_methods', 'distinct_ip_addresses']
+BOOKING_FEATURES = ['num_tickets', 'payment_method', 'ip_address', 'user_booking_count', 'user_avg_tickets']
+
+def encode_payment_methods(payment_methods):
+    """
+    Map payment method names to their numeric codes
+
+    Args:
+        payment_methods (sequence of str): Payment method names
+
+    Returns:
+        np.ndarray: float64 codes (1 = credit_card, 2 = debit_card, 3 = paypal)
+    """
+    codes = np.fromiter((PAYMENT_METHOD_MAP.get(m, 0) for m in payment_methods), dtype=np.float64, count=len(payment_methods))
+
+    if not codes.all():
+        raise ValueError('Invalid payment_method value. Valid values are "credit_card", "debit_card", "paypal".')
+
+    return codes
+
+def parse_ipv4(ip_addresses):
+    """
+    Pack dotted IPv4 strings into integers (a << 24 | b << 16 | c << 8 | d)
+
+    Each address is converted by the C inet_pton into its 4 network-order
+    bytes, and the joined buffer is read as one big-endian array, so there is
+    no per-row work in Python. Only canonical dotted quads are accepted (no
+    leading zeros, shorthand forms or whitespace).
+
+    Args:
+        ip_addresses (sequence of str): Dotted IPv4 address strings
+
+    Returns:
+        np.ndarray: uint32 addresses
+    """
+    try:
+        packed = b''.join(map(inet_pton_v4, ip_addresses))
+    except (OSError, TypeError, ValueError):
+        for ip in ip_addresses:
+            try:
+                inet_pton_v4(ip)
+            except (OSError, TypeError, ValueError):
+                raise ValueError(f'Invalid ip_address value: {ip!r}') from None
+        raise
+
+    return np.frombuffer(packed, dtype='>u4').astype(np.uint32)
+
+def ip_last_octets(ip_addresses):
+    """
+    The booking model's ip_address feature: each address's last octet
+
+    Args:
+        ip_addresses (sequence of str): Dotted IPv4 address strings
+
+    Returns:
+        np.ndarray: float64 last octets
+    """
+    return (parse_ipv4(ip_addresses) & 255).astype(np.float64)
+
+def encode_user_records(records):
+    """
+    Encode user records into the user model's feature matrix
+
+    Args:
+        records (list of dict): User records as received by /predict_user
+
+    Returns:
+        np.ndarray: C-contiguous float64 array of shape (n, len(USER_FEATURES))
+    """
+    X = np.empty((len(records), len(USER_FEATURES)), dtype=np.float64)
+    for i, feature in enumerate(USER_FEATURES):
+        X[:, i] = [record[feature] for record in records]
+
+    # payment_method and ip_address are not model inputs, but invalid values are still rejected
+    encode_payment_methods([record['payment_method'] for record in records])
+    parse_ipv4([record['ip_address'] for record in records])
+
+    return X
+
+def booking_matrix(num_tickets, payment_codes, packed_ips, user_booking_count, user_avg_tickets):
+    """
+    Assemble the booking model's feature matrix from encoded columns
+
+    Every booking encoder ends here, so records, DataFrames and column
+    tables all produce the same features the same way.
+
+    Args:
+        num_tickets (array-like): Tickets per booking
+        payment_codes (array-like): PAYMENT_METHOD_MAP codes
+        packed_ips (np.ndarray): uint32 addresses from parse_ipv4; the model sees the last octet
+        user_booking_count (array-like): Bookings by the booking's user
+        user_avg_tickets (array-like): Average tickets per booking of the user
+
+    Returns:
+        np.ndarray: C-contiguous float64 array of shape (n, len(BOOKING_FEATURES))
+    """
+    X = np.empty((len(packed_ips), len(BOOKING_FEATURES)), dtype=np.float64)
+    X[:, 0] = num_tickets
+    X[:, 1] = payment_codes
+    X[:, 2] = packed_ips & 255
+    X[:, 3] = user_booking_count
+    X[:, 4] = user_avg_tickets
+
+    return X
+
+def encode_booking_records(records):
+    """
+    Encode booking records into the booking model's feature matrix
+
+    Args:
+        records (list of dict): Booking records as received by /predict_booking
+
+    Returns:
+        np.ndarray: C-contiguous float64 array of shape (n, len(BOOKING_FEATURES))
+    """
+    return booking_matrix([record['num_tickets'] for record in records],
+                          encode_payment_methods([record['payment_method'] for record in records]),
+                          parse_ipv4([record['ip_address'] for record in records]),
+                          [record['user_booking_count'] for record in records],
+                          [record['user_avg_tickets'] for record in records])
+
+def encode_booking_frame(df):
+    """
+    Encode a DataFrame with the booking columns into the booking model's feature matrix
+
+    Args:
+        df (pd.DataFrame): Rows with num_tickets, payment_method, ip_address,
+            user_booking_count and user_avg_tickets columns
+
+    Returns:
+        np.ndarray: C-contiguous float64 array of shape (n, len(BOOKING_FEATURES))
+    """
+    return booking_matrix(df['num_tickets'].to_numpy(),
+                          encode_payment_methods(df['payment_method'].to_numpy()),
+                          parse_ipv4(df['ip_address'].to_numpy()),
+                          df['user_booking_count'].to_numpy(),
+                          df['user_avg_tickets'].to_numpy())
+
+def encode_booking_columns(columns):
+    """
+    Build the booking feature matrix from pre-encoded columns (see columnar.py)
+
+    Args:
+        columns (dict): num_tickets, payment_method (codes), ip_address (packed
+            uint32), user_booking_count and user_avg_tickets arrays
+
+    Returns:
+        np.ndarray: C-contiguous float64 array of shape (n, len(BOOKING_FEATURES))
+    """
+    return booking_matrix(columns['num_tickets'], columns['payment_method'], columns['ip_address'],
+                          columns['user_booking_count'], columns['user_avg_tickets'])
+
+def scale_features(X, scaler):
+    """
+    Apply a fitted StandardScaler to an encoded feature matrix in place
+
+    Same arithmetic as scaler.transform, without its per-call validation
+    and without allocating a second copy of the matrix. Fused models take
+    raw features and come with no scaler, in which case X is returned as is.
+
+    Args:
+        X (np.ndarray): float64 matrix from one of the encode_* functions
+        scaler (StandardScaler or None): Fitted scaler
+
+    Returns:
+        np.ndarray: X, scaled
+    """
+    if scaler is None:
+        return X
+    if scaler.with_mean:
+        np.subtract(X, scaler.mean_, out=X)
+    if scaler.with_std:
+        np.divide(X, scaler.scale_, out=X)
+
+    return X
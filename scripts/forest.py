@@ -0,0 +1,185 @@
+import numpy as np
+
+class FlatForest:
+    """
+    Inference-only copy of a fitted RandomForestClassifier
+
+    Every tree's nodes are packed into one set of contiguous arrays
+    (structure of arrays) with node indices offset per tree. A batch is scored
+    by advancing all (tree, sample) cursors together one level at a time with
+    a handful of vectorized gathers, with no per-tree Python loop, input
+    validation or thread dispatch. The fixed cost is tiny, so this wins for
+    small batches; past roughly a thousand rows sklearn's compiled traversal
+    is as fast or faster.
+
+    Outputs match the source model's predict_proba/predict exactly: inputs
+    are compared as float32 like sklearn does, missing (NaN) values follow
+    each split's learned missing-value direction, and per-tree probabilities
+    are summed in tree order before dividing by the number of trees.
+    """
+
+    def __init__(self, children, feature, threshold, missing_right, value, roots, max_depth, classes, n_features):
+        self.children = children      # (2 * n_nodes,) left child at 2i, right child at 2i + 1
+        self.feature = feature        # (n_nodes,) split feature, 0 for leaves
+        self.threshold = threshold    # (n_nodes,) split threshold, +inf for leaves
+        self.missing_right = missing_right  # (n_nodes,) bool, NaN goes to the right child
+        self.value = value            # (n_nodes, n_classes) per-tree class probabilities
+        self.roots = roots            # (n_trees,) index of each tree's root node
+        self.max_depth = max_depth
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        self.node_contributions = None  # built on first use by prepare_explanations()
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Pack a fitted RandomForestClassifier
+
+        Args:
+            model (RandomForestClassifier): Single-output fitted forest
+
+        Returns:
+            FlatForest: Packed copy of the forest
+        """
+        if model.n_outputs_ != 1:
+            raise ValueError('FlatForest only supports single-output forests')
+
+        n_classes = len(model.classes_)
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        n_nodes = offsets[-1]
+
+        children = np.empty(2 * n_nodes, dtype=np.intp)
+        feature = np.empty(n_nodes, dtype=np.intp)
+        threshold = np.empty(n_nodes, dtype=np.float64)
+        missing_right = np.empty(n_nodes, dtype=bool)
+        value = np.empty((n_nodes, n_classes), dtype=np.float64)
+
+        for tree, start, end in zip(trees, offsets[:-1], offsets[1:]):
+            nodes = np.arange(start, end)
+            is_leaf = tree.children_left == -1
+            children[2 * nodes] = np.where(is_leaf, nodes, tree.children_left + start)
+            children[2 * nodes + 1] = np.where(is_leaf, nodes, tree.children_right + start)
+            feature[start:end] = np.where(is_leaf, 0, tree.feature)
+            threshold[start:end] = np.where(is_leaf, np.inf, tree.threshold)
+            missing_right[start:end] = ~is_leaf & (tree.missing_go_to_left == 0)
+            value[start:end] = tree.value[:, 0, :n_classes]
+
+        return cls(children, feature, threshold, missing_right, value,
+                   roots=offsets[:-1].astype(np.intp),
+                   max_depth=max(tree.max_depth for tree in trees),
+                   classes=model.classes_,
+                   n_features=model.n_features_in_)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """
+        Find the leaf reached in every tree by every sample
+
+        Args:
+            X (array-like): Feature matrix of shape (n_samples, n_features)
+
+        Returns:
+            np.ndarray: Global leaf node indices of shape (n_trees, n_samples)
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f'X has shape {X.shape}, but the forest expects {self.n_features_in_} features')
+
+        n_samples = X.shape[0]
+        flat_X = X.ravel()
+        has_missing = bool(np.isnan(flat_X).any())
+
+        # One cursor per (tree, sample), tree-major; cursors that reach a leaf are dropped
+        nodes = np.repeat(self.roots, n_samples)
+        rows = np.tile(np.arange(n_samples, dtype=np.intp) * self.n_features_in_, self.n_trees)
+        active = np.arange(nodes.size)
+        current = nodes.copy()
+
+        for _ in range(self.max_depth):
+            x = flat_X.take(rows + self.feature.take(current))
+            go_right = x > self.threshold.take(current)
+            if has_missing:
+                # NaN compares False everywhere; send it where sklearn's node sends it
+                missing = np.isnan(x)
+                go_right[missing] = self.missing_right.take(current[missing])
+            following = self.children.take(2 * current + go_right)
+            nodes[active] = following
+
+            moved = following != current
+            if moved.all():
+                current = following
+                continue
+            active, current, rows = active[moved], following[moved], rows[moved]
+            if not active.size:
+                break
+
+        return nodes.reshape(self.n_trees, n_samples)
+
+    def predict_proba(self, X):
+        """Mean class probabilities across trees, shape (n_samples, n_classes)"""
+        leaf_values = self.value[self.apply(X)]
+        # Accumulate in tree order (not pairwise) to reproduce sklearn's sum bit for bit
+        proba = np.add.accumulate(leaf_values, axis=0)[-1]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        """Most probable class for each sample"""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    def prepare_explanations(self):
+        """
+        Precompute every node's decision-path contributions
+
+        Walking from a node's parent to the node changes the class
+        probabilities by value[node] - value[parent]; that change is credited
+        to the feature the parent splits on. node_contributions[n] holds those
+        credits summed over the path from the root to n, so explaining a
+        sample only needs the leaves it reaches. Built level by level, with
+        the same vectorized gathers as apply().
+        """
+        n_nodes, n_classes = self.value.shape
+        contributions = np.zeros((n_nodes, self.n_features_in_, n_classes))
+
+        parents = np.asarray(self.roots)
+        for _ in range(self.max_depth):
+            children = self.children.reshape(-1, 2)[parents]
+            internal = children[:, 0] != parents
+            parents, children = parents[internal], children[internal]
+            if not parents.size:
+                break
+
+            split_features = self.feature[parents]
+            for side in (0, 1):
+                child = children[:, side]
+                contributions[child] = contributions[parents]
+                contributions[child, split_features] += self.value[child] - self.value[parents]
+            parents = children.ravel()
+
+        self.node_contributions = contributions
+
+    def explain(self, X):
+        """
+        Decompose each prediction into a base value plus one term per feature
+
+        For every class, base + contributions.sum(axis=1) equals predict_proba
+        up to float rounding (Saabas decision-path attribution, averaged over
+        the trees).
+
+        Returns:
+            tuple: (proba of shape (n_samples, n_classes), base of shape (n_classes,),
+                contributions of shape (n_samples, n_features, n_classes))
+        """
+        if self.node_contributions is None:
+            self.prepare_explanations()
+
+        leaves = self.apply(X)
+        proba = np.add.accumulate(self.value[leaves], axis=0)[-1]
+        proba /= self.n_trees
+        base = self.value[self.roots].mean(axis=0)
+        contributions = self.node_contributions[leaves].mean(axis=0)
+        return proba, base, contributions
@@ -1,226 +1,250 @@
 import pandas as pd
 import numpy as np
 import os
-import random
-from datetime import datetime, timedelta
+import argparse
+
+from columnar import write_frame
+from velocity import velocity_columns
 
 # Create directories if they don't exist
 os.makedirs('data', exist_ok=True)
 
-# Function to generate random date within a range
-def random_date(start_date, end_date):
-    time_between = end_date - start_date
-    days_between = time_between.days
-    random_days = random.randrange(days_between)
-    return start_date + timedelta(days=random_days)
+PAYMENT_METHODS = np.array(['credit_card', 'debit_card', 'paypal'], dtype=object)
+
+# Decimal strings of 0-255, indexed by value, for formatting IP octets
+OCTET_STRINGS = np.array([str(i) for i in range(256)], dtype=object)
+
+# Function to generate random timestamps (at midnight) within a range
+def random_dates(rng, start_date, end_date, count):
+    """
+    Draw count random days in [start_date, end_date)
+
+    Returns:
+        np.ndarray: datetime64[s] timestamps
+    """
+    start = np.datetime64(start_date, 'D')
+    days_between = (np.datetime64(end_date, 'D') - start).astype(np.int64)
+    return (start + rng.integers(days_between, size=count)).astype('datetime64[s]')
+
+def format_timestamps(timestamps):
+    """Format datetime64[s] values as 'YYYY-MM-DD HH:MM:SS' strings"""
+    strings = np.datetime_as_string(timestamps, unit='s')
+    chars = strings.view('U1').reshape(len(strings), -1)
+    chars[:, 10] = ' '  # ISO 'T' separator
+    return chars.view(strings.dtype).ravel()
+
+def format_ids(prefix, values, width):
+    """
+    Format integers as prefix + zero-padded digits, like f"{prefix}{str(value).zfill(width)}"
+
+    All ids get the same number of digits, so width grows if a value needs more.
+    """
+    if len(values):
+        width = max(width, len(str(int(values.max()))))
+    digits = values[:, None] // 10 ** np.arange(width - 1, -1, -1, dtype=np.int64) % 10
+    chars = np.empty((len(values), len(prefix) + width), dtype=np.uint8)
+    chars[:, :len(prefix)] = np.frombuffer(prefix.encode(), dtype=np.uint8)
+    chars[:, len(prefix):] = digits + ord('0')
+    return chars.view(f'S{chars.shape[1]}').ravel().astype(str)
+
+# Function to generate random IP addresses, packed into one integer each
+def random_ips(rng, count):
+    octets = [rng.integers(1, 256, count), rng.integers(0, 256, count),
+              rng.integers(0, 256, count), rng.integers(1, 256, count)]
+    return (octets[0] << 24) | (octets[1] << 16) | (octets[2] << 8) | octets[3]
 
-# Function to generate random IP address
-def random_ip():
-    return f"{random.randint(1, 255)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 255)}"
+def format_ips(ips):
+    """Format packed IPs as dotted strings"""
+    return (OCTET_STRINGS[ips >> 24] + '.' + OCTET_STRINGS[(ips >> 16) & 255] + '.' +
+            OCTET_STRINGS[(ips >> 8) & 255] + '.' + OCTET_STRINGS[ips & 255])
+
+def resolve_copies(values, source):
+    """
+    Give every row the value of the row it copies
+
+    source[i] == i marks a row keeping its own value; otherwise it points at
+    an earlier row, which may itself be a copy. Chains are collapsed by
+    pointer jumping, so this takes a logarithmic number of passes.
+    """
+    while True:
+        next_source = source[source]
+        if np.array_equal(next_source, source):
+            return values[source]
+        source = next_source
+
+def categorical(format_values, values):
+    """Build a categorical column, formatting only the distinct values"""
+    distinct, codes = np.unique(values, return_inverse=True)
+    return pd.Categorical.from_codes(codes, format_values(distinct))
 
 # Generate user data
-def generate_users(count=50):
-    users = []
-    for i in range(count):
-        user_id = f"user_{str(i).zfill(3)}"
-        users.append({
-            'user_id': user_id,
-            'name': f"User {i}",
-            'email': f"user{i}@example.com",
-            'created_at': random_date(datetime(2022, 1, 1), datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
-        })
-    return pd.DataFrame(users)
+def generate_users(count=50, rng=None, end_date=None):
+    rng = np.random.default_rng() if rng is None else rng
+    end_date = np.datetime64('now') if end_date is None else end_date
+    ids = pd.Series(np.arange(count)).astype(str)
+
+    return pd.DataFrame({
+        'user_id': format_ids('user_', np.arange(count), 3),
+        'name': 'User ' + ids,
+        'email': 'user' + ids + '@example.com',
+        'created_at': format_timestamps(random_dates(rng, '2022-01-01', end_date, count))
+    })
 
 # Generate booking data with fraud patterns
-def generate_bookings(users_df, count=500):
-    payment_methods = ['credit_card', 'debit_card', 'paypal']
-    bookings = []
-    
-    # Track user booking patterns for fraud simulation
-    user_patterns = {}
-    for user_id in users_df['user_id']:
-        user_patterns[user_id] = {
-            'count': 0,
-            'ips': set(),
-            'payment_methods': set(),
-            'is_fraudulent': random.random() < 0.1  # 10% of users are fraudulent
-        }
-    
-    for i in range(count):
-        # Select a user
-        user_id = random.choice(users_df['user_id'].tolist())
-        user_pattern = user_patterns[user_id]
-        user_pattern['count'] += 1
-        
-        # Determine if this booking should be fraudulent
-        is_fraudulent = user_pattern['is_fraudulent']
-        
-        # Non-fraudulent users can still have occasional fraudulent bookings
-        if not is_fraudulent and random.random() < 0.05:
-            is_fraudulent = True
-        
-        # Generate booking data with patterns
-        if is_fraudulent:
-            # Fraudulent booking patterns
-            if random.random() < 0.7:
-                # Large number of tickets
-                num_tickets = random.randint(10, 25)
-            else:
-                num_tickets = random.randint(1, 5)
-            
-            # Unusual booking times for some fraudulent bookings
-            if random.random() < 0.6:
-                booking_date = random_date(datetime(2023, 1, 1), datetime.now())
-                booking_date = booking_date.replace(hour=random.randint(0, 4), minute=random.randint(0, 59))
-                booking_time = booking_date.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                booking_time = random_date(datetime(2023, 1, 1), datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Multiple payment methods for fraudulent users
-            if len(user_pattern['payment_methods']) < 3 and random.random() < 0.7:
-                # Try to use a new payment method
-                unused_methods = [m for m in payment_methods if m not in user_pattern['payment_methods']]
-                if unused_methods:
-                    payment_method = random.choice(unused_methods)
-                else:
-                    payment_method = random.choice(payment_methods)
-            else:
-                payment_method = random.choice(payment_methods)
-            
-            # Multiple IP addresses for fraudulent users
-            if len(user_pattern['ips']) < 5 and random.random() < 0.8:
-                ip_address = random_ip()
-            elif user_pattern['ips']:
-                # Sometimes reuse an existing IP
-                ip_address = random.choice(list(user_pattern['ips']))
-            else:
-                ip_address = random_ip()
-        else:
-            # Normal booking patterns
-            num_tickets = random.randint(1, 4)
-            booking_time = random_date(datetime(2023, 1, 1), datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Normal users tend to use the same payment method
-            if not user_pattern['payment_methods'] or random.random() < 0.1:
-                payment_method = random.choice(payment_methods)
-            else:
-                # Reuse an existing payment method
-                payment_method = random.choice(list(user_pattern['payment_methods']))
-            
-            # Normal users tend to use the same IP address
-            if not user_pattern['ips'] or random.random() < 0.2:
-                ip_address = random_ip()
-            else:
-                # Reuse an existing IP
-                ip_address = random.choice(list(user_pattern['ips']))
-        
-        # Update user patterns
-        user_pattern['ips'].add(ip_address)
-        user_pattern['payment_methods'].add(payment_method)
-        
-        # Calculate price based on number of tickets
-        base_price = 500  # Base price per ticket
-        price = base_price * num_tickets
-        
-        # Create the booking
-        booking_id = f"booking_{str(i).zfill(5)}"
-        ticket_id = f"TKT{str(random.randint(0, 999999)).zfill(6)}"
-        
-        bookings.append({
-            'booking_id': booking_id,
-            'ticket_id': ticket_id,
-            'user_id': user_id,
-            'num_tickets': num_tickets,
-            'price': price,
-            'payment_method': payment_method,
-            'booking_time': booking_time,
-            'ip_address': ip_address,
-            'is_refunded': random.random() < 0.05,  # 5% of bookings are refunded
-            'is_flagged_suspicious': is_fraudulent
-        })
-    
-    return pd.DataFrame(bookings)
+def generate_bookings(users_df, count=500, rng=None, end_date=None):
+    """
+    Generate bookings with fraud patterns, all rows at once
+
+    Every booking draws a user uniformly; 10% of users are fraudulent and
+    normal users still make an occasional (5%) fraudulent booking.
+    Fraudulent bookings take more tickets, are often placed at night and
+    keep switching payment methods and IPs. Normal bookings mostly reuse a
+    payment method and IP from one of the same user's earlier bookings.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    end_date = np.datetime64('now') if end_date is None else end_date
+    n_users = len(users_df)
+    fraudulent_users = rng.random(n_users) < 0.1  # 10% of users are fraudulent
+
+    # Select a user for each booking and decide which bookings are fraudulent
+    user_index = rng.integers(n_users, size=count)
+    is_fraudulent = fraudulent_users[user_index] | (rng.random(count) < 0.05)
+
+    # Large number of tickets for most fraudulent bookings
+    num_tickets = np.where(
+        is_fraudulent,
+        np.where(rng.random(count) < 0.7, rng.integers(10, 26, count), rng.integers(1, 6, count)),
+        rng.integers(1, 5, count)
+    )
+
+    # Unusual booking times (midnight to 4am) for some fraudulent bookings
+    booking_times = random_dates(rng, '2023-01-01', end_date, count)
+    at_night = is_fraudulent & (rng.random(count) < 0.6)
+    night_seconds = rng.integers(0, 5, count) * 3600 + rng.integers(0, 60, count) * 60
+    booking_times += np.where(at_night, night_seconds, 0).astype('timedelta64[s]')
+
+    # Group each user's bookings together (in booking order) to model their history
+    order = np.argsort(user_index, kind='stable')
+    sorted_users = user_index[order]
+    fraudulent = is_fraudulent[order]
+    group_start = np.searchsorted(sorted_users, sorted_users)
+    position = np.arange(count) - group_start  # bookings the user made before this one
+    has_history = position > 0
+    # An earlier booking of the same user, picked uniformly
+    earlier = group_start + (rng.random(count) * position).astype(np.int64)
+    own_row = np.arange(count)
+
+    # Fraudulent bookings mostly cycle through every payment method; normal users
+    # tend to reuse one they have used before
+    method_order = rng.permuted(np.tile(np.arange(3), (n_users, 1)), axis=1)
+    payment_code = np.where(
+        fraudulent & (rng.random(count) < 0.7),
+        method_order[sorted_users, position % 3],
+        rng.integers(3, size=count)
+    )
+    reuse_payment = ~fraudulent & has_history & (rng.random(count) >= 0.1)
+    payment_code = resolve_copies(payment_code, np.where(reuse_payment, earlier, own_row))
+
+    # Fraudulent bookings use a new IP for most of their first few bookings;
+    # normal users tend to reuse an existing IP
+    fresh_ip = np.where(fraudulent, (position < 5) & (rng.random(count) < 0.8), rng.random(count) < 0.2)
+    reuse_ip = has_history & ~fresh_ip
+    ips = resolve_copies(random_ips(rng, count), np.where(reuse_ip, earlier, own_row))
+
+    # Back to booking order
+    booking_payment = np.empty(count, dtype=np.int64)
+    booking_payment[order] = payment_code
+    booking_ips = np.empty(count, dtype=np.int64)
+    booking_ips[order] = ips
+
+    # Calculate price based on number of tickets
+    base_price = 500  # Base price per ticket
+
+    # Columns with repeated values are categoricals, so each distinct string is built once
+    return pd.DataFrame({
+        'booking_id': format_ids('booking_', np.arange(count), 5),
+        'ticket_id': categorical(lambda v: format_ids('TKT', v, 6), rng.integers(0, 1000000, count)),
+        'user_id': pd.Categorical.from_codes(user_index, users_df['user_id']),
+        'num_tickets': num_tickets,
+        'price': base_price * num_tickets,
+        'payment_method': pd.Categorical.from_codes(booking_payment, PAYMENT_METHODS),
+        'booking_time': categorical(format_timestamps, booking_times),
+        'ip_address': categorical(format_ips, booking_ips),
+        'is_refunded': rng.random(count) < 0.05,  # 5% of bookings are refunded
+        'is_flagged_suspicious': is_fraudulent
+    })
 
 # Generate training data for ML models
 def generate_training_data(bookings_df):
-    # Prepare user-level features
-    user_stats = {}
-    
-    # Calculate user statistics
-    for _, booking in bookings_df.iterrows():
-        user_id = booking['user_id']
-        if user_id not in user_stats:
-            user_stats[user_id] = {
-                'total_tickets': 0,
-                'booking_count': 0,
-                'payment_methods': set(),
-                'ip_addresses': set(),
-                'is_fraudulent': False
-            }
-        
-        user_stats[user_id]['total_tickets'] += booking['num_tickets']
-        user_stats[user_id]['booking_count'] += 1
-        user_stats[user_id]['payment_methods'].add(booking['payment_method'])
-        user_stats[user_id]['ip_addresses'].add(booking['ip_address'])
-        
-        if booking['is_flagged_suspicious']:
-            user_stats[user_id]['is_fraudulent'] = True
-    
+    # Per-user statistics, in order of each user's first booking
+    grouped = bookings_df.groupby('user_id', sort=False, observed=True)
+
     # Create user training data
-    user_training_data = []
-    for user_id, stats in user_stats.items():
-        user_training_data.append({
-            'user_id': user_id,
-            'total_tickets': stats['total_tickets'],
-            'booking_count': stats['booking_count'],
-            'distinct_payment_methods': len(stats['payment_methods']),
-            'distinct_ip_addresses': len(stats['ip_addresses']),
-            'payment_method': list(stats['payment_methods'])[0],  # Just use the first one for simplicity
-            'ip_address': list(stats['ip_addresses'])[0],  # Just use the first one for simplicity
-            'is_fraudulent': 1 if stats['is_fraudulent'] else 0
-        })
-    
-    # Create booking training data
-    booking_training_data = []
-    for _, booking in bookings_df.iterrows():
-        user_id = booking['user_id']
-        user_stat = user_stats[user_id]
-        
-        booking_training_data.append({
-            'booking_id': booking['booking_id'],
-            'num_tickets': booking['num_tickets'],
-            'payment_method': booking['payment_method'],
-            'ip_address': booking['ip_address'],
-            'user_booking_count': user_stat['booking_count'],
-            'user_avg_tickets': user_stat['total_tickets'] / user_stat['booking_count'],
-            'is_fraudulent': 1 if booking['is_flagged_suspicious'] else 0
-        })
-    
-    return pd.DataFrame(user_training_data), pd.DataFrame(booking_training_data)
+    user_training_df = pd.DataFrame({
+        'total_tickets': grouped['num_tickets'].sum(),
+        'booking_count': grouped.size(),
+        'distinct_payment_methods': grouped['payment_method'].nunique(),
+        'distinct_ip_addresses': grouped['ip_address'].nunique(),
+        'payment_method': grouped['payment_method'].first(),  # Just use the first one for simplicity
+        'ip_address': grouped['ip_address'].first(),  # Just use the first one for simplicity
+        'is_fraudulent': grouped['is_flagged_suspicious'].any().astype(int)
+    }).reset_index()
+
+    # Create booking training data, with each booking's velocity features as of its booking_time
+    user_booking_count = grouped['num_tickets'].transform('size')
+    velocity = velocity_columns(bookings_df['user_id'], bookings_df['ip_address'], bookings_df['booking_time'])
+    booking_training_df = pd.DataFrame({
+        'booking_id': bookings_df['booking_id'],
+        'num_tickets': bookings_df['num_tickets'],
+        'payment_method': bookings_df['payment_method'],
+        'ip_address': bookings_df['ip_address'],
+        'user_booking_count': user_booking_count,
+        'user_avg_tickets': grouped['num_tickets'].transform('sum') / user_booking_count,
+        **velocity,
+        'is_fraudulent': bookings_df['is_flagged_suspicious'].astype(int)
+    })
+
+    return user_training_df, booking_training_df
 
 # Main function to generate all data
-def generate_all_data():
+def generate_all_data(user_count=50, booking_count=500, seed=None, end_date=None, tables=True):
+    rng = np.random.default_rng(seed)
+
     print("Generating user data...")
-    users_df = generate_users(50)
-    
+    users_df = generate_users(user_count, rng, end_date)
+
     print("Generating booking data...")
-    bookings_df = generate_bookings(users_df, 500)
-    
+    bookings_df = generate_bookings(users_df, booking_count, rng, end_date)
+
     print("Generating training data...")
     user_training_df, booking_training_df = generate_training_data(bookings_df)
-    
-    # Save data to CSV files
-    users_df.to_csv('data/users.csv', index=False)
-    bookings_df.to_csv('data/bookings.csv', index=False)
-    user_training_df.to_csv('data/user_training_data.csv', index=False)
-    booking_training_df.to_csv('data/booking_training_data.csv', index=False)
-    
+
+    # Save data to CSV files, each with its column table (encoded from the frame, not re-parsed)
+    outputs = [(users_df, 'data/users.csv'), (bookings_df, 'data/bookings.csv'),
+               (user_training_df, 'data/user_training_data.csv'),
+               (booking_training_df, 'data/booking_training_data.csv')]
+    for df, csv_path in outputs:
+        df.to_csv(csv_path, index=False)
+        if tables:
+            write_frame(df, csv_path)
+
     print("Data generation complete!")
     print("Generated CSV files:")
-    print("- data/users.csv: Contains information about 50 users")
-    print("- data/bookings.csv: Contains 500 booking records")
+    print(f"- data/users.csv: Contains information about {user_count} users")
+    print(f"- data/bookings.csv: Contains {booking_count} booking records")
     print("- data/user_training_data.csv: Training data for user-level fraud detection")
     print("- data/booking_training_data.csv: Training data for booking-level fraud detection")
+    if tables:
+        print("- data/*.cols: Memory-mappable column tables of the files above")
 
 if __name__ == "__main__":
-    generate_all_data()
+    parser = argparse.ArgumentParser(description='Generate synthetic users, bookings and training data')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--bookings', type=int, default=500)
+    parser.add_argument('--seed', type=int, help='seed for reproducible output')
+    parser.add_argument('--end-date', help='latest creation/booking date (YYYY-MM-DD, default today); '
+                                           'fix it together with --seed to reproduce a dataset on another day')
+    parser.add_argument('--no-tables', action='store_true', help='write only the CSV files, not their column tables')
+    args = parser.parse_args()
+
+    generate_all_data(args.users, args.bookings, args.seed, args.end_date, not args.no_tables)
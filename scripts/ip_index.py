@@ -0,0 +1,106 @@
+import os
+import numpy as np
+import pandas as pd
+
+from features import parse_ipv4
+from columnar import narrowest_int, read_table
+
+BOOKINGS_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'bookings.csv')
+
+IP_HISTORY_FEATURES = ['ip_history_bookings', 'subnet_history_bookings']
+
+# From this many addresses a lookup sorts them first: the binary searches then walk
+# the index in order, which takes about half the time of scattered cache misses
+SORTED_LOOKUP_MIN_ROWS = 512
+
+class IPIndex:
+    """
+    Booking counts per known IPv4 address and per /24 subnet
+
+    Addresses (and their /24 prefixes, address >> 8) are kept as sorted
+    uint32 arrays with a parallel array of counts in the narrowest integer
+    type that holds them. A lookup is one vectorized binary search per
+    array, O(log n) per address. Memory is 4 bytes per distinct address and
+    per distinct /24 plus their counts (usually one byte each): under 90 MB
+    for ten million scattered addresses.
+    """
+
+    def __init__(self, addresses, address_counts, subnets, subnet_counts):
+        self.addresses = addresses
+        self.address_counts = address_counts
+        self.subnets = subnets
+        self.subnet_counts = subnet_counts
+
+    @classmethod
+    def from_addresses(cls, packed):
+        """
+        Build the index from one packed address per booking
+
+        Args:
+            packed (np.ndarray): uint32 addresses, as from parse_ipv4
+
+        Returns:
+            IPIndex: The index
+        """
+        addresses, address_counts = np.unique(np.asarray(packed, dtype=np.uint32), return_counts=True)
+        # Addresses are sorted, so each /24 is a contiguous run of them
+        prefixes = addresses >> 8
+        first = np.ones(len(prefixes), dtype=bool)
+        first[1:] = prefixes[1:] != prefixes[:-1]
+        starts = np.flatnonzero(first)
+        subnet_counts = np.add.reduceat(address_counts, starts) if len(starts) else address_counts
+        return cls(addresses, narrowest_int(address_counts), prefixes[starts], narrowest_int(subnet_counts))
+
+    @classmethod
+    def from_csv(cls, path=BOOKINGS_CSV, use_tables=True):
+        """Build the index from the ip_address column of a bookings.csv-shaped file"""
+        if use_tables:
+            packed = read_table(path, ['ip_address'])['ip_address']
+        else:
+            packed = parse_ipv4(pd.read_csv(path, usecols=['ip_address'])['ip_address'].to_numpy())
+        return cls.from_addresses(packed)
+
+    def lookup(self, ip_addresses):
+        """
+        Booking history of each address and of its /24 subnet
+
+        Args:
+            ip_addresses (sequence of str or np.ndarray): Dotted strings, or uint32 addresses
+
+        Returns:
+            tuple: (bookings from the address, bookings from its /24), int64 arrays
+        """
+        if not (isinstance(ip_addresses, np.ndarray) and ip_addresses.dtype == np.uint32):
+            ip_addresses = parse_ipv4(ip_addresses)
+        if len(ip_addresses) < SORTED_LOOKUP_MIN_ROWS:
+            return (self.count(self.addresses, self.address_counts, ip_addresses),
+                    self.count(self.subnets, self.subnet_counts, ip_addresses >> 8))
+
+        # Sorted addresses also have sorted /24 prefixes, so one sort serves both searches
+        order = np.argsort(ip_addresses)
+        ordered = ip_addresses[order]
+        ip_counts = np.empty(len(order), dtype=np.int64)
+        subnet_counts = np.empty(len(order), dtype=np.int64)
+        ip_counts[order] = self.count(self.addresses, self.address_counts, ordered)
+        subnet_counts[order] = self.count(self.subnets, self.subnet_counts, ordered >> 8)
+        return ip_counts, subnet_counts
+
+    @staticmethod
+    def count(keys, counts, values):
+        """Count stored for each value in sorted keys, 0 for values not among them"""
+        if not len(keys):
+            return np.zeros(len(values), dtype=np.int64)
+        positions = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+        return np.where(keys[positions] == values, counts[positions], 0).astype(np.int64)
+
+    def history(self, records):
+        """IP_HISTORY_FEATURES for a list of records with an ip_address"""
+        ip_counts, subnet_counts = self.lookup([record['ip_address'] for record in records])
+        return [dict(zip(IP_HISTORY_FEATURES, counts)) for counts in zip(ip_counts.tolist(), subnet_counts.tolist())]
+
+    def stats(self):
+        return {
+            'addresses': len(self.addresses),
+            'subnets': len(self.subnets),
+            'bytes': sum(array.nbytes for array in (self.addresses, self.address_counts, self.subnets, self.subnet_counts))
+        }
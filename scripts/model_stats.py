@@ -0,0 +1,94 @@
+import os
+import json
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; updates then only exclude threads of this process
+    fcntl = None
+
+STATS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'model_stats.json')
+
+# Entries kept in recent_predictions
+RECENT_PREDICTIONS = 20
+
+MODEL_KEYS = {'user': 'user_model', 'booking': 'booking_model'}
+HISTORY_KEYS = {'user': 'user_predictions', 'booking': 'booking_predictions'}
+
+def empty_stats():
+    """model_stats.json with no predictions recorded yet"""
+    return {
+        'user_model': {'predictions': 0},
+        'booking_model': {'predictions': 0},
+        'recent_predictions': [],
+        'prediction_history': {'dates': [], 'user_predictions': [], 'booking_predictions': [], 'fraud_detected': []}
+    }
+
+def load_stats(path=STATS_FILE):
+    """Read model_stats.json, filling in any section it is missing"""
+    stats = empty_stats()
+    if os.path.exists(path):
+        with open(path) as f:
+            stored = json.load(f)
+        for key, value in stored.items():
+            if isinstance(value, dict) and isinstance(stats.get(key), dict):
+                stats[key].update(value)
+            else:
+                stats[key] = value
+    return stats
+
+def update_stats_file(update, path=STATS_FILE):
+    """
+    Apply update(stats) to model_stats.json as one atomic read-modify-write
+
+    The file is rewritten through a temporary file renamed over it, so
+    readers see either the old or the new version, never a partial one.
+    An flock on a side file serializes writers across processes, so the API
+    workers and the scripts can all update it without losing changes.
+
+    Args:
+        update (callable): Modifies the loaded stats dict in place
+        path (str): Stats file
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        stats = load_stats(path)
+        update(stats)
+
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(stats, f, indent=2)
+        os.replace(tmp_path, path)
+
+def add_predictions(stats, totals, months, recent, recent_limit=RECENT_PREDICTIONS):
+    """
+    Add recorded predictions to loaded stats
+
+    Args:
+        stats (dict): Loaded model_stats.json
+        totals (dict): Rows scored per model ('user', 'booking')
+        months (dict): 'YYYY-MM' -> [user rows, booking rows, rows predicted fraudulent]
+        recent (list): New recent_predictions entries, newest first
+        recent_limit (int): Entries recent_predictions keeps
+    """
+    for kind, rows in totals.items():
+        model = stats[MODEL_KEYS[kind]]
+        model['predictions'] = model.get('predictions', 0) + rows
+
+    history = stats['prediction_history']
+    for month in sorted(months):
+        user_rows, booking_rows, fraud = months[month]
+        if month not in history['dates']:
+            history['dates'].append(month)
+            for key in ('user_predictions', 'booking_predictions', 'fraud_detected'):
+                history[key].append(0)
+        index = history['dates'].index(month)
+        history[HISTORY_KEYS['user']][index] += user_rows
+        history[HISTORY_KEYS['booking']][index] += booking_rows
+        history['fraud_detected'][index] += fraud
+
+    # Another process may have written newer entries; keep the latest of both
+    merged = recent + stats['recent_predictions']
+    merged.sort(key=lambda entry: entry['timestamp'], reverse=True)
+    stats['recent_predictions'] = merged[:recent_limit]
@@ -0,0 +1,387 @@
+import os
+import json
+import shutil
+import hashlib
+from datetime import datetime
+import numpy as np
+from forest import FlatForest
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+
+# Serving artifacts (fused, flat and compiled) live in one directory per export under
+# models/serving; CURRENT names the live one and is switched with a single os.replace,
+# so a loader never sees files from two exports. Older generations are kept for a while
+# for processes that resolved CURRENT just before a switch.
+SERVING_SUBDIR = 'serving'
+CURRENT_GENERATION_FILE = 'CURRENT'
+GENERATIONS_KEPT = 3
+
+# Single-file artifact holding both forests with the scalers folded into their thresholds
+FUSED_MODELS_FILE = 'fraud_models.pkl'
+FUSED_FORMAT_VERSION = 1
+
+# Packed forests as raw .npy arrays, one directory per model, loadable with mmap_mode
+# so every worker process maps the same page-cache pages instead of unpickling a copy
+FLAT_MODELS_SUBDIR = 'flat'
+FLAT_FORMAT_VERSION = 2
+FLAT_ARRAYS = ['children', 'feature', 'threshold', 'missing_right', 'value', 'roots', 'classes']
+
+# Both packed forests in one small binary file: float32 thresholds, the narrowest unsigned
+# ints that hold node, feature and value-table indices, one bit per node for the side
+# missing values go to, and a table of distinct class probability rows; read with a
+# single read() and a few array views
+COMPILED_MODELS_FILE = 'fraud_models.bin'
+COMPILED_MAGIC = b'FRDM'
+COMPILED_FORMAT_VERSION = 2
+COMPILED_ARRAYS = ['children', 'feature', 'threshold', 'missing_right', 'value_index', 'value_table', 'roots',
+                   'classes']
+COMPILED_ALIGNMENT = 8
+
+# Original layout: one pickle per model and per scaler
+LEGACY_MODEL_FILES = [
+    'user_fraud_model.pkl',
+    'user_scaler.pkl',
+    'booking_fraud_model.pkl',
+    'booking_scaler.pkl'
+]
+
+def current_generation(models_dir=MODELS_DIR):
+    """Name of the live serving generation, or None before the first export"""
+    try:
+        with open(os.path.join(models_dir, SERVING_SUBDIR, CURRENT_GENERATION_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def serving_dir(models_dir=MODELS_DIR):
+    """
+    Directory of the live serving generation, or None before the first export
+
+    Resolve it once per load and read every file from the returned path.
+    """
+    generation = current_generation(models_dir)
+    return os.path.join(models_dir, SERVING_SUBDIR, generation) if generation is not None else None
+
+def require_serving_dir(models_dir=MODELS_DIR):
+    path = serving_dir(models_dir)
+    if path is None:
+        raise FileNotFoundError(f"No serving models in {models_dir}; run train_models_from_csv.py --export-only")
+    return path
+
+def new_generation(models_dir=MODELS_DIR):
+    """
+    Create the empty directory for the next serving generation
+
+    Returns:
+        tuple: (generation name, directory path)
+    """
+    serving = os.path.join(models_dir, SERVING_SUBDIR)
+    os.makedirs(serving, exist_ok=True)
+    while True:
+        name = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        path = os.path.join(serving, name)
+        try:
+            os.mkdir(path)
+            return name, path
+        except FileExistsError:
+            continue
+
+def activate_generation(name, models_dir=MODELS_DIR):
+    """Point CURRENT at a fully written generation, then drop all but the newest GENERATIONS_KEPT"""
+    serving = os.path.join(models_dir, SERVING_SUBDIR)
+    tmp_path = os.path.join(serving, f'{CURRENT_GENERATION_FILE}.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(name)
+    os.replace(tmp_path, os.path.join(serving, CURRENT_GENERATION_FILE))
+
+    generations = sorted(entry.name for entry in os.scandir(serving) if entry.is_dir())
+    for old in generations[:-GENERATIONS_KEPT]:
+        if old != name:
+            shutil.rmtree(os.path.join(serving, old), ignore_errors=True)
+
+def has_fused_models(models_dir=MODELS_DIR):
+    path = serving_dir(models_dir)
+    return path is not None and os.path.exists(os.path.join(path, FUSED_MODELS_FILE))
+
+def missing_model_files(models_dir=MODELS_DIR):
+    """List the legacy files that are missing, or nothing if a fused artifact is present"""
+    if has_fused_models(models_dir):
+        return []
+    return [f for f in LEGACY_MODEL_FILES if not os.path.exists(os.path.join(models_dir, f))]
+
+def model_version(models_dir=MODELS_DIR):
+    """
+    Identifier of the models every store currently loads
+
+    The live serving generation's name, which changes with every export; before
+    the first export, a short hash of the size and mtime of the legacy pickles.
+    It can key anything derived from one generation of the models.
+    """
+    generation = current_generation(models_dir)
+    if generation is not None:
+        return generation
+
+    digest = hashlib.sha1()
+    for name in LEGACY_MODEL_FILES:
+        stat = os.stat(os.path.join(models_dir, name))
+        digest.update(f'{name}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()[:12]
+
+def load_scalers(models_dir=MODELS_DIR, legacy=False):
+    """
+    Load just the scalers that go with load_models' models
+
+    Args:
+        models_dir (str): Models directory
+        legacy (bool): Load the legacy scalers even when a fused artifact is live,
+            for inputs to the four legacy pickles
+
+    Returns:
+        tuple: (user_scaler, booking_scaler), both None for the fused artifact
+    """
+    if not legacy and has_fused_models(models_dir):
+        return None, None
+
+    import joblib
+    return (joblib.load(os.path.join(models_dir, 'user_scaler.pkl')),
+            joblib.load(os.path.join(models_dir, 'booking_scaler.pkl')))
+
+def save_fused_models(user_model, booking_model, generation_dir):
+    """Write both raw-feature forests to the fused artifact of a new generation"""
+    import joblib
+
+    joblib.dump({
+        'format_version': FUSED_FORMAT_VERSION,
+        'user_model': user_model,
+        'booking_model': booking_model
+    }, os.path.join(generation_dir, FUSED_MODELS_FILE))
+
+def load_models(models_dir=MODELS_DIR):
+    """
+    Load the user and booking models from whichever layout is on disk
+
+    The live generation's fused artifact is preferred; its models take raw
+    features, so the returned scalers are None. Otherwise the four legacy
+    pickles are loaded.
+
+    Returns:
+        tuple: (user_model, user_scaler, booking_model, booking_scaler)
+    """
+    # Imported here so processes serving only the packed forests never pay for it
+    import joblib
+
+    path = serving_dir(models_dir)
+    if path is not None and os.path.exists(os.path.join(path, FUSED_MODELS_FILE)):
+        fused = joblib.load(os.path.join(path, FUSED_MODELS_FILE))
+        if fused.get('format_version') != FUSED_FORMAT_VERSION:
+            raise ValueError(f"Unsupported fused model format: {fused.get('format_version')}")
+        return fused['user_model'], None, fused['booking_model'], None
+
+    user_model = joblib.load(os.path.join(models_dir, 'user_fraud_model.pkl'))
+    user_scaler = joblib.load(os.path.join(models_dir, 'user_scaler.pkl'))
+    booking_model = joblib.load(os.path.join(models_dir, 'booking_fraud_model.pkl'))
+    booking_scaler = joblib.load(os.path.join(models_dir, 'booking_scaler.pkl'))
+
+    return user_model, user_scaler, booking_model, booking_scaler
+
+def save_flat_forest(forest, path):
+    """
+    Write a FlatForest as one .npy file per array plus a small JSON header
+
+    path is inside a generation that is not live yet, so files are written in
+    place; processes mapping the live generation never see them change.
+    """
+    arrays = {
+        'children': forest.children,
+        'feature': forest.feature,
+        'threshold': forest.threshold,
+        'missing_right': forest.missing_right,
+        'value': forest.value,
+        'roots': forest.roots,
+        'classes': forest.classes_
+    }
+
+    os.makedirs(path, exist_ok=True)
+    for name in FLAT_ARRAYS:
+        np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(arrays[name]))
+
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({
+            'format_version': FLAT_FORMAT_VERSION,
+            'max_depth': int(forest.max_depth),
+            'n_features': int(forest.n_features_in_)
+        }, f)
+
+def load_flat_forest(path, mmap=True):
+    """
+    Load a FlatForest written by save_flat_forest
+
+    Args:
+        path (str): Directory holding the forest's arrays
+        mmap (bool): Map the arrays read-only instead of reading them into memory
+
+    Returns:
+        FlatForest: Forest backed by the mapped (or loaded) arrays
+    """
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('format_version') != FLAT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported flat model format: {meta.get('format_version')}")
+
+    # np.asarray drops the memmap subclass without copying, keeping later gathers on plain ndarrays
+    arrays = {name: np.asarray(np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None))
+              for name in FLAT_ARRAYS}
+
+    return FlatForest(arrays['children'], arrays['feature'], arrays['threshold'], arrays['missing_right'],
+                      arrays['value'],
+                      roots=arrays['roots'],
+                      max_depth=meta['max_depth'],
+                      classes=arrays['classes'],
+                      n_features=meta['n_features'])
+
+def has_flat_models(models_dir=MODELS_DIR):
+    path = serving_dir(models_dir)
+    if path is None:
+        return False
+    flat_dir = os.path.join(path, FLAT_MODELS_SUBDIR)
+    return all(os.path.exists(os.path.join(flat_dir, name, 'meta.json')) for name in ('user', 'booking'))
+
+def save_flat_models(user_forest, booking_forest, generation_dir):
+    """Write both packed forests (built from the fused, raw-feature models) into a new generation"""
+    flat_dir = os.path.join(generation_dir, FLAT_MODELS_SUBDIR)
+    save_flat_forest(user_forest, os.path.join(flat_dir, 'user'))
+    save_flat_forest(booking_forest, os.path.join(flat_dir, 'booking'))
+
+def load_flat_models(models_dir=MODELS_DIR, mmap=True):
+    """
+    Load both packed forests; they take raw features, so no scalers are needed
+
+    Returns:
+        tuple: (user_forest, booking_forest)
+    """
+    flat_dir = os.path.join(require_serving_dir(models_dir), FLAT_MODELS_SUBDIR)
+    return (load_flat_forest(os.path.join(flat_dir, 'user'), mmap),
+            load_flat_forest(os.path.join(flat_dir, 'booking'), mmap))
+
+def narrowest_uint(max_value):
+    """Smallest unsigned integer dtype that can hold max_value"""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+def float32_floor(values):
+    """
+    Round float64 values down to the nearest float32
+
+    Trees compare float32 inputs with x <= threshold; for every float32 x that
+    holds exactly when x <= float32_floor(threshold), so the rounding is lossless.
+    """
+    rounded = values.astype(np.float32)
+    too_high = rounded.astype(np.float64) > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+def compile_forest(forest):
+    """
+    Encode a FlatForest as the compact arrays of the compiled format
+
+    Returns:
+        tuple: (dict of arrays by name, dict of scalar metadata)
+    """
+    n_nodes = len(forest.feature)
+    value_table, value_index = np.unique(forest.value, axis=0, return_inverse=True)
+
+    arrays = {
+        'children': forest.children.astype(narrowest_uint(n_nodes - 1)),
+        'feature': forest.feature.astype(narrowest_uint(forest.n_features_in_ - 1)),
+        'threshold': float32_floor(forest.threshold),
+        'missing_right': np.packbits(forest.missing_right),
+        'value_index': value_index.reshape(-1).astype(narrowest_uint(len(value_table) - 1)),
+        'value_table': value_table,
+        'roots': forest.roots.astype(narrowest_uint(n_nodes - 1)),
+        'classes': np.asarray(forest.classes_)
+    }
+    meta = {'max_depth': int(forest.max_depth), 'n_features': int(forest.n_features_in_)}
+    return arrays, meta
+
+def save_compiled_models(user_forest, booking_forest, generation_dir):
+    """
+    Write both packed forests to the compiled file of a new generation
+
+    Layout: magic, uint32 format version, uint32 header length, a JSON header
+    with each array's dtype, shape and offset, then the arrays, each aligned to
+    8 bytes.
+    """
+    header = {'models': {}}
+    blobs = []
+    offset = 0
+    for name, forest in (('user', user_forest), ('booking', booking_forest)):
+        arrays, meta = compile_forest(forest)
+        meta['arrays'] = {}
+        for array_name in COMPILED_ARRAYS:
+            array = np.ascontiguousarray(arrays[array_name])
+            meta['arrays'][array_name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            padding = -array.nbytes % COMPILED_ALIGNMENT
+            blobs.append(array.tobytes() + bytes(padding))
+            offset += array.nbytes + padding
+        header['models'][name] = meta
+
+    header_bytes = json.dumps(header).encode()
+    header_bytes += b' ' * (-(len(COMPILED_MAGIC) + 8 + len(header_bytes)) % COMPILED_ALIGNMENT)
+
+    with open(os.path.join(generation_dir, COMPILED_MODELS_FILE), 'wb') as f:
+        f.write(COMPILED_MAGIC)
+        f.write(np.array([COMPILED_FORMAT_VERSION, len(header_bytes)], dtype='<u4').tobytes())
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+
+def has_compiled_models(models_dir=MODELS_DIR):
+    path = serving_dir(models_dir)
+    return path is not None and os.path.exists(os.path.join(path, COMPILED_MODELS_FILE))
+
+def load_compiled_models(models_dir=MODELS_DIR):
+    """
+    Load both packed forests from the compiled file; like the flat store, they take raw features
+
+    Node and feature indices are widened back to intp, the missing-value bits
+    unpacked and the per-node class probabilities gathered from the value
+    table; thresholds stay float32.
+
+    Returns:
+        tuple: (user_forest, booking_forest)
+    """
+    path = os.path.join(require_serving_dir(models_dir), COMPILED_MODELS_FILE)
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if data[:len(COMPILED_MAGIC)] != COMPILED_MAGIC:
+        raise ValueError(f"{path} is not a compiled model file")
+    format_version, header_length = np.frombuffer(data, dtype='<u4', count=2, offset=len(COMPILED_MAGIC)).tolist()
+    if format_version != COMPILED_FORMAT_VERSION:
+        raise ValueError(f"Unsupported compiled model format: {format_version}")
+
+    header_start = len(COMPILED_MAGIC) + 8
+    header = json.loads(data[header_start:header_start + header_length])
+    data_start = header_start + header_length
+
+    forests = []
+    for name in ('user', 'booking'):
+        meta = header['models'][name]
+        arrays = {}
+        for array_name, spec in meta['arrays'].items():
+            count = int(np.prod(spec['shape']))
+            arrays[array_name] = np.frombuffer(data, dtype=spec['dtype'], count=count,
+                                               offset=data_start + spec['offset']).reshape(spec['shape'])
+
+        n_nodes = len(arrays['feature'])
+        missing_right = np.unpackbits(arrays['missing_right'], count=n_nodes).astype(bool)
+        forests.append(FlatForest(arrays['children'].astype(np.intp), arrays['feature'].astype(np.intp),
+                                  arrays['threshold'], missing_right, arrays['value_table'][arrays['value_index']],
+                                  roots=arrays['roots'].astype(np.intp),
+                                  max_depth=meta['max_depth'],
+                                  classes=arrays['classes'],
+                                  n_features=meta['n_features']))
+
+    return tuple(forests)
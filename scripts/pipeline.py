@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+
+from features import (encode_user_records, encode_booking_records, encode_booking_frame, encode_booking_columns,
+                      scale_features)
+from model_store import MODELS_DIR, model_version, load_scalers
+
+# Model versions whose pipelines stay loaded at once (a reload briefly needs two)
+PIPELINE_CACHE_VERSIONS = 4
+
+class FeaturePipeline:
+    """
+    Everything between a raw record and a model input, for one model version
+
+    Encoding is the shared vectorized code in features.py; scaling uses the
+    version's fitted scalers, which are None for the fused artifact (its
+    forests take raw features). The single-record methods are the batch
+    ones applied to a batch of one, so both always produce identical rows.
+    """
+
+    def __init__(self, user_scaler=None, booking_scaler=None, version=None):
+        self.scalers = {'user': user_scaler, 'booking': booking_scaler}
+        self.version = version
+
+    def scale(self, kind, X):
+        """Scale an encoded 'user' or 'booking' matrix in place"""
+        return scale_features(X, self.scalers[kind])
+
+    def users(self, records):
+        """Model inputs for a list of /predict_user records"""
+        return self.scale('user', encode_user_records(records))
+
+    def bookings(self, records):
+        """Model inputs for a list of /predict_booking records"""
+        return self.scale('booking', encode_booking_records(records))
+
+    def booking_frame(self, df):
+        """Model inputs for a DataFrame of bookings with the BOOKING_FEATURES columns"""
+        return self.scale('booking', encode_booking_frame(df))
+
+    def booking_columns(self, columns):
+        """Model inputs for pre-encoded booking columns (see columnar.py)"""
+        return self.scale('booking', encode_booking_columns(columns))
+
+    def user(self, record):
+        """Model input row for one user record, shape (1, n_features)"""
+        return self.users([record])
+
+    def booking(self, record):
+        """Model input row for one booking record, shape (1, n_features)"""
+        return self.bookings([record])
+
+pipelines = OrderedDict()
+pipelines_lock = threading.Lock()
+
+def load_pipeline(models_dir=MODELS_DIR, legacy=False):
+    """
+    The FeaturePipeline of the models currently in models_dir
+
+    Scalers are deserialized once per model version (see model_store.model_version),
+    not once per call; retraining the models yields a new version and a new pipeline.
+
+    Args:
+        models_dir (str): Models directory
+        legacy (bool): Scale for the four legacy pickles even when the fused
+            artifact (which takes raw features) is live
+
+    Returns:
+        FeaturePipeline: Pipeline for the current version
+    """
+    key = (models_dir, model_version(models_dir), legacy)
+    with pipelines_lock:
+        pipeline = pipelines.get(key)
+        if pipeline is not None:
+            pipelines.move_to_end(key)
+            return pipeline
+
+    pipeline = FeaturePipeline(*load_scalers(models_dir, legacy), version=key[1])
+    with pipelines_lock:
+        pipelines[key] = pipeline
+        while len(pipelines) > PIPELINE_CACHE_VERSIONS:
+            pipelines.popitem(last=False)
+    return pipeline
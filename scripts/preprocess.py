@@ -1,74 +1,33 @@
-import pandas as pd
-import numpy as np
-import json
-import os
-from sklearn.preprocessing import StandardScaler
-import joblib
+from model_store import MODELS_DIR
+from pipeline import load_pipeline
 
-def preprocess_user_data(user_data):
+def preprocess_user_data(user_data, models_dir=MODELS_DIR):
     """
     Preprocess user data for fraud detection
     
     Args:
         user_data (dict): User data with booking statistics
+        models_dir (str): Directory of the models the input is for
         
     Returns:
-        dict: Preprocessed user data ready for model input
+        np.ndarray: One-row scaled input for the legacy user model pickle
     """
-    # Convert payment method to numeric
-    payment_method_map = {'credit_card': 1, 'debit_card': 2, 'paypal': 3}
-    
-    # Extract features
-    features = {
-        'total_tickets': user_data['total_tickets'],
-        'booking_count': user_data['booking_count'],
-        'distinct_payment_methods': user_data['distinct_payment_methods'],
-        'distinct_ip_addresses': user_data['distinct_ip_addresses']
-    }
-    
-    # Load scaler
-    scaler = joblib.load('models/user_scaler.pkl')
-    
-    # Scale features
-    features_df = pd.DataFrame([features])
-    scaled_features = scaler.transform(features_df)
-    
-    return scaled_features
+    # Encoding and scalers come from the shared pipeline, loaded once per model version;
+    # the row is always scaled for the legacy pickles, even when the fused models are live
+    return load_pipeline(models_dir, legacy=True).user(user_data)
 
-def preprocess_booking_data(booking_data):
+def preprocess_booking_data(booking_data, models_dir=MODELS_DIR):
     """
     Preprocess booking data for fraud detection
     
     Args:
         booking_data (dict): Booking data with user statistics
+        models_dir (str): Directory of the models the input is for
         
     Returns:
-        dict: Preprocessed booking data ready for model input
+        np.ndarray: One-row scaled input for the legacy booking model pickle
     """
-    # Convert payment method to numeric
-    payment_method_map = {'credit_card': 1, 'debit_card': 2, 'paypal': 3}
-    payment_method = payment_method_map.get(booking_data['payment_method'], 0)
-    
-    # Extract IP address feature (last octet)
-    ip_last_octet = int(booking_data['ip_address'].split('.')[-1])
-    
-    # Extract features
-    features = {
-        'num_tickets': booking_data['num_tickets'],
-        'payment_method': payment_method,
-        'ip_address': ip_last_octet,
-        'user_booking_count': booking_data['user_booking_count'],
-        'user_avg_tickets': booking_data['user_avg_tickets']
-    }
-    
-    # Load scaler
-    scaler = joblib.load('models/booking_scaler.pkl')
-    
-    # Scale features
-    features_df = pd.DataFrame([features])
-    scaled_features = scaler.transform(features_df)
-    
-    return scaled_features
+    return load_pipeline(models_dir, legacy=True).booking(booking_data)
 
 def main():
     """
@@ -0,0 +1,189 @@
+import os
+import sys
+import time
+import argparse
+import multiprocessing as mp
+from collections import deque
+import numpy as np
+import pandas as pd
+
+from pipeline import FeaturePipeline
+from columnar import TABLE_SUFFIX, has_fresh_table, read_table, read_meta, table_path, decode_column
+import model_store
+
+DEFAULT_CHUNK_SIZE = 100000
+
+# Columns read from a bookings.csv-shaped file; everything else is skipped by the parser
+INPUT_COLUMNS = ['booking_id', 'user_id', 'num_tickets', 'payment_method', 'ip_address']
+AGGREGATE_COLUMNS = ['user_booking_count', 'user_avg_tickets']
+
+# Booking model and feature pipeline of the current process, set by load_scoring_model
+scoring_model = None
+
+def load_scoring_model(models_dir):
+    global scoring_model
+    _, user_scaler, booking_model, booking_scaler = model_store.load_models(models_dir)
+    scoring_model = (booking_model, FeaturePipeline(user_scaler, booking_scaler))
+
+def user_aggregates(path, chunk_size):
+    """
+    First pass: per-user booking count and average tickets over the whole file
+
+    These are the user_booking_count and user_avg_tickets features the
+    training data was built with. Memory grows with the number of users,
+    not the number of bookings.
+
+    Returns:
+        pd.DataFrame: Indexed by user_id, with the two aggregate columns
+    """
+    totals = None
+    for chunk in pd.read_csv(path, usecols=['user_id', 'num_tickets'], chunksize=chunk_size):
+        part = chunk.groupby('user_id')['num_tickets'].agg(['count', 'sum'])
+        totals = part if totals is None else totals.add(part, fill_value=0)
+
+    return pd.DataFrame({
+        'user_booking_count': totals['count'],
+        'user_avg_tickets': totals['sum'] / totals['count']
+    })
+
+def score_chunk(chunk, encoded=False):
+    """
+    Encode and score one chunk of bookings with the loaded booking model
+
+    Chunks read from a column table carry payment method codes and packed
+    IPs already (encoded=True); chunks read from a CSV carry the strings.
+    """
+    booking_model, pipeline = scoring_model
+    X = pipeline.booking_columns(chunk) if encoded else pipeline.booking_frame(chunk)
+    probabilities = booking_model.predict_proba(X)
+
+    return pd.DataFrame({
+        'booking_id': chunk['booking_id'].to_numpy(),
+        'fraud_probability': probabilities[:, list(booking_model.classes_).index(1)],
+        'is_fraudulent': booking_model.classes_.take(probabilities.argmax(axis=1))
+    })
+
+def read_chunks(path, chunk_size, aggregates):
+    """Stream the bookings with their per-user aggregates attached"""
+    columns = INPUT_COLUMNS if aggregates is not None else INPUT_COLUMNS + AGGREGATE_COLUMNS
+    for chunk in pd.read_csv(path, usecols=lambda c: c in columns, chunksize=chunk_size):
+        if aggregates is not None:
+            user_stats = aggregates.reindex(chunk['user_id'])
+            for column in AGGREGATE_COLUMNS:
+                chunk[column] = user_stats[column].to_numpy()
+        yield chunk
+
+def read_table_chunks(path, chunk_size):
+    """
+    Slice a bookings column table (see columnar.py) into chunks of encoded columns
+
+    Only the scoring columns are mapped. Without the aggregate columns, they
+    are computed from the whole user_id and num_tickets columns up front.
+    """
+    available = read_meta(path)['columns']
+    has_aggregates = set(AGGREGATE_COLUMNS).issubset(available)
+    needed = [name for name in INPUT_COLUMNS if name != 'user_id']
+    columns = read_table(path, needed + (AGGREGATE_COLUMNS if has_aggregates else ['user_id']))
+
+    if not has_aggregates:
+        print(f"Computing per-user aggregates from {path}...")
+        users, unique_users = pd.factorize(columns.pop('user_id'))
+        counts = np.bincount(users, minlength=len(unique_users))
+        tickets = np.bincount(users, weights=columns['num_tickets'], minlength=len(unique_users))
+        columns['user_booking_count'] = counts[users]
+        columns['user_avg_tickets'] = (tickets / counts)[users]
+
+    for start in range(0, len(columns['booking_id']), chunk_size):
+        chunk = pd.DataFrame({name: np.asarray(values[start:start + chunk_size])
+                              for name, values in columns.items() if name != 'booking_id'})
+        chunk['booking_id'] = decode_column(columns['booking_id'][start:start + chunk_size], 'string')
+        yield chunk
+
+def score_file(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, models_dir=model_store.MODELS_DIR):
+    """
+    Score every booking in a CSV file and write the results incrementally
+
+    Files that already carry user_booking_count and user_avg_tickets (like
+    booking_training_data.csv) are scored in one pass; raw bookings.csv files
+    get a first pass that computes them. A CSV with an up-to-date column
+    table (or the table directory itself) is read from the memory-mapped
+    table instead of being parsed. With workers > 1 chunks are scored
+    in a process pool, with at most two chunks per worker in flight so memory
+    stays bounded, and results are written in input order.
+
+    Returns:
+        dict: Rows scored, rows flagged and elapsed seconds
+    """
+    start = time.perf_counter()
+    input_path = input_path.rstrip('/')
+    encoded = input_path.endswith(TABLE_SUFFIX) or has_fresh_table(input_path)
+    if encoded:
+        path = input_path if input_path.endswith(TABLE_SUFFIX) else table_path(input_path)
+        print(f"Reading the column table {path}")
+        chunks = read_table_chunks(path, chunk_size)
+    else:
+        header = pd.read_csv(input_path, nrows=0).columns
+        aggregates = None
+        if not set(AGGREGATE_COLUMNS).issubset(header):
+            print(f"Computing per-user aggregates from {input_path}...")
+            aggregates = user_aggregates(input_path, chunk_size)
+        chunks = read_chunks(input_path, chunk_size, aggregates)
+
+    pool = None
+    if workers > 1:
+        pool = mp.Pool(workers, initializer=load_scoring_model, initargs=(models_dir,))
+    else:
+        load_scoring_model(models_dir)
+
+    rows = 0
+    flagged = 0
+    pending = deque()
+    tmp_path = f'{output_path}.tmp'
+
+    def write(result, f):
+        nonlocal rows, flagged
+        result.to_csv(f, header=rows == 0, index=False)
+        rows += len(result)
+        flagged += int(result['is_fraudulent'].sum())
+        elapsed = time.perf_counter() - start
+        print(f"{rows:,} rows scored ({rows / elapsed:,.0f} rows/s)", flush=True)
+
+    try:
+        with open(tmp_path, 'w', newline='') as f:
+            for chunk in chunks:
+                if pool is None:
+                    write(score_chunk(chunk, encoded), f)
+                    continue
+                pending.append(pool.apply_async(score_chunk, (chunk, encoded)))
+                if len(pending) >= 2 * workers:
+                    write(pending.popleft().get(), f)
+            while pending:
+                write(pending.popleft().get(), f)
+        os.replace(tmp_path, output_path)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {'rows': rows, 'flagged': flagged, 'seconds': time.perf_counter() - start}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Re-score historical bookings with the current booking model')
+    parser.add_argument('input', nargs='?', default='data/bookings.csv',
+                        help='bookings.csv-shaped file (or booking training data with the aggregates included), '
+                             'or its .cols column table')
+    parser.add_argument('--output', default='data/booking_scores.csv')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows read and scored at a time')
+    parser.add_argument('--workers', type=int, default=1, help='processes scoring chunks in parallel')
+    parser.add_argument('--models-dir', default=model_store.MODELS_DIR)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Input file not found: {args.input}")
+        sys.exit(1)
+
+    summary = score_file(args.input, args.output, args.chunk_size, args.workers, args.models_dir)
+    print(f"\nScored {summary['rows']:,} bookings in {summary['seconds']:.2f}s "
+          f"({summary['rows'] / max(summary['seconds'], 1e-9):,.0f} rows/s), "
+          f"{summary['flagged']:,} flagged. Results written to {args.output}")
@@ -7,6 +7,7 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
+from features import BOOKING_FEATURES, encode_booking_frame
 
 # Create directories if they don't exist
 os.makedirs('models', exist_ok=True)
@@ -27,14 +28,10 @@ user_features = ['total_tickets', 'booking_count', 'distinct_payment_methods', '
 user_X = user_df[user_features]
 user_y = user_df['is_fraudulent']
 
-# Preprocess booking data
-# Convert payment_method to numeric
-booking_df['payment_method'] = booking_df['payment_method'].map({'credit_card': 1, 'debit_card': 2, 'paypal': 3})
-# Extract last octet from IP address as a simple feature
-booking_df['ip_address'] = booking_df['ip_address'].apply(lambda x: int(x.split('.')[-1]))
-
-booking_features = ['num_tickets', 'payment_method', 'ip_address', 'user_booking_count', 'user_avg_tickets']
-booking_X = booking_df[booking_features]
+# Preprocess booking data with the same encoding the API and scripts use
+# (payment method codes, last IP octet)
+booking_features = BOOKING_FEATURES
+booking_X = pd.DataFrame(encode_booking_frame(booking_df), columns=booking_features)
 booking_y = booking_df['is_fraudulent']
 
 # Split data
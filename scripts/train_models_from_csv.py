@@ -1,97 +1,457 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
+import copy
+import json
+import time
+import argparse
 import joblib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
+from features import USER_FEATURES, BOOKING_FEATURES, encode_booking_frame, encode_booking_columns, scale_features
+from columnar import has_fresh_table, read_table
+from forest import FlatForest
+from model_store import (FUSED_MODELS_FILE, new_generation, activate_generation, require_serving_dir, save_fused_models,
+                         save_flat_models, save_compiled_models, load_compiled_models)
+from velocity import VELOCITY_FEATURES
 
-def train_models():
+def raw_split_thresholds(threshold, mean, scale):
+    """
+    Map scaled split thresholds to raw-feature thresholds that split identically
+
+    Trees compare float32 inputs, so t * scale + mean alone can land one float32
+    step off the true boundary. Starting from that estimate, step to the largest
+    float32 raw value r whose scaled value float32((r - mean) / scale) still goes left.
+    """
+    def goes_left(raw):
+        return ((raw.astype(np.float64) - mean) / scale).astype(np.float32) <= threshold
+
+    raw = (threshold * scale + mean).astype(np.float32)
+    for _ in range(64):
+        too_high = ~goes_left(raw)
+        if not too_high.any():
+            break
+        raw[too_high] = np.nextafter(raw[too_high], np.float32(-np.inf))
+    for _ in range(64):
+        step_up = np.nextafter(raw, np.float32(np.inf))
+        still_left = goes_left(step_up)
+        if not still_left.any():
+            break
+        raw[still_left] = step_up[still_left]
+
+    return raw.astype(np.float64)
+
+def fold_scaler_into_forest(model, scaler):
+    """
+    Rewrite a forest's split thresholds from scaled into raw-feature space
+
+    A split x_scaled <= t on feature f becomes x <= t * scale_f + mean_f (snapped
+    to the exact float32 boundary), so the returned copy of the model takes
+    unscaled features directly.
+
+    Args:
+        model (RandomForestClassifier): Forest fitted on scaler-transformed features
+        scaler (StandardScaler): The scaler used during training
+
+    Returns:
+        RandomForestClassifier: Fused copy of the model
+    """
+    fused = copy.deepcopy(model)
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(scaler.n_features_in_)
+    scale = scaler.scale_ if scaler.with_std else np.ones(scaler.n_features_in_)
+
+    for estimator in fused.estimators_:
+        tree = estimator.tree_
+        split_nodes = tree.feature >= 0
+        features = tree.feature[split_nodes]
+        # tree_.threshold is a view of the node array, so this writes through
+        threshold = tree.threshold
+        threshold[split_nodes] = raw_split_thresholds(threshold[split_nodes], mean[features], scale[features])
+
+    return fused
+
+def save_serving_models(user_model, user_scaler, booking_model, booking_scaler, models_dir='models'):
+    """
+    Write the fused artifact and the packed forests (memory-mappable and compiled) derived from it
+
+    All three go into a new serving generation, which becomes live in one step
+    once it is complete.
+    """
+    fused_user_model = fold_scaler_into_forest(user_model, user_scaler)
+    fused_booking_model = fold_scaler_into_forest(booking_model, booking_scaler)
+    user_forest = FlatForest.from_sklearn(fused_user_model)
+    booking_forest = FlatForest.from_sklearn(fused_booking_model)
+
+    generation, generation_dir = new_generation(models_dir)
+    save_fused_models(fused_user_model, fused_booking_model, generation_dir)
+    save_flat_models(user_forest, booking_forest, generation_dir)
+    save_compiled_models(user_forest, booking_forest, generation_dir)
+    activate_generation(generation, models_dir)
+
+def export_fused_models(models_dir='models'):
+    """Build the fused, packed and compiled serving artifacts from the four saved pickles"""
+    user_model = joblib.load(os.path.join(models_dir, 'user_fraud_model.pkl'))
+    user_scaler = joblib.load(os.path.join(models_dir, 'user_scaler.pkl'))
+    booking_model = joblib.load(os.path.join(models_dir, 'booking_fraud_model.pkl'))
+    booking_scaler = joblib.load(os.path.join(models_dir, 'booking_scaler.pkl'))
+
+    save_serving_models(user_model, user_scaler, booking_model, booking_scaler, models_dir)
+
+def verify_fused_models(models_dir='models'):
+    """
+    Check the fused artifact and the compiled file against the scaler+model pipeline on the training CSVs
+
+    Returns:
+        bool: True if every prediction and probability is identical
+    """
+    fused = joblib.load(os.path.join(require_serving_dir(models_dir), FUSED_MODELS_FILE))
+    compiled_user, compiled_booking = load_compiled_models(models_dir)
+    checks = [
+        ('user', 'data/user_training_data.csv', USER_FEATURES, fused['user_model'], compiled_user),
+        ('booking', 'data/booking_training_data.csv', BOOKING_FEATURES, fused['booking_model'], compiled_booking)
+    ]
+
+    all_equal = True
+    for name, csv_path, features, fused_model, compiled_forest in checks:
+        model = joblib.load(os.path.join(models_dir, f'{name}_fraud_model.pkl'))
+        scaler = joblib.load(os.path.join(models_dir, f'{name}_scaler.pkl'))
+
+        X, _, _ = load_training_matrices(name, csv_path, features)
+
+        expected = model.predict_proba(scaler.transform(pd.DataFrame(X, columns=features)))
+        for artifact, actual in (('fused', fused_model.predict_proba(X)), ('compiled', compiled_forest.predict_proba(X))):
+            mismatches = int((expected.argmax(axis=1) != actual.argmax(axis=1)).sum())
+            max_diff = float(np.abs(expected - actual).max())
+
+            print(f"{name} model ({artifact}): {len(X)} rows, {mismatches} prediction mismatches, "
+                  f"max probability difference {max_diff}")
+            all_equal = all_equal and mismatches == 0 and max_diff == 0.0
+
+    return all_equal
+
+# Rows each model was last trained on, so --add-trees knows which ones are new
+TRAINING_STATE_FILE = 'training_state.json'
+
+TRAINING_SETS = [
+    ('user', 'data/user_training_data.csv', USER_FEATURES),
+    ('booking', 'data/booking_training_data.csv', BOOKING_FEATURES)
+]
+
+class StageTimer:
+    """Collect wall-clock time per training stage"""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def report(self):
+        print("\nWall-clock time per stage:")
+        for name, seconds in self.timings.items():
+            print(f"  {name:<22} {seconds:9.2f} s")
+        print(f"  {'total':<22} {sum(self.timings.values()):9.2f} s")
+
+def encode_training_frame(name, df):
+    """Encode a training CSV's rows into (X, y) for the named model"""
+    if name == 'user':
+        X = df[USER_FEATURES].to_numpy(dtype=np.float64)
+    else:
+        X = encode_booking_frame(df)
+    return X, df['is_fraudulent'].to_numpy(dtype=np.int64)
+
+def load_training_matrices(name, csv_path, features, use_tables=True):
+    """
+    Load a model's encoded training matrices from the CSV's column table
+
+    The table (see columnar.py) is built the first time and rebuilt whenever
+    the CSV changes; otherwise the needed columns are memory-mapped, already
+    encoded, so reruns skip CSV parsing and encoding.
+
+    Returns:
+        tuple: (X, y, whether an up-to-date table already existed)
+    """
+    if not use_tables:
+        X, y = encode_training_frame(name, pd.read_csv(csv_path, float_precision='round_trip'))
+        return X, y, False
+
+    cached = has_fresh_table(csv_path)
+    columns = read_table(csv_path, features + ['is_fraudulent'])
+    if name == 'user':
+        X = np.column_stack([columns[feature] for feature in features]).astype(np.float64)
+    else:
+        X = encode_booking_columns(columns)
+    return X, columns['is_fraudulent'].astype(np.int64), cached
+
+def fit_concurrently(fits):
+    """Run (model, X, y) fits in parallel threads; the tree building releases the GIL"""
+    with ThreadPoolExecutor(max_workers=len(fits)) as executor:
+        futures = [executor.submit(model.fit, X, y) for model, X, y in fits]
+        for future in futures:
+            future.result()
+
+def evaluate_model(title, model, X_test, y_test):
+    y_pred = model.predict(X_test)
+    print(f"\n{title} Evaluation:")
+    print(classification_report(y_test, y_pred))
+    print("Confusion Matrix:")
+    print(confusion_matrix(y_test, y_pred))
+
+def save_training_state(state, models_dir='models'):
+    with open(os.path.join(models_dir, TRAINING_STATE_FILE), 'w') as f:
+        json.dump(state, f, indent=2)
+
+def load_training_state(models_dir='models'):
+    path = os.path.join(models_dir, TRAINING_STATE_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; run a full training before adding trees")
+    with open(path) as f:
+        return json.load(f)
+
+def save_models(models, scalers, models_dir='models'):
+    """Save the models and scalers as pickles, then the fused and packed serving artifacts"""
+    print("\nSaving models and scalers...")
+    for name in ('user', 'booking'):
+        joblib.dump(models[name], os.path.join(models_dir, f'{name}_fraud_model.pkl'))
+        joblib.dump(scalers[name], os.path.join(models_dir, f'{name}_scaler.pkl'))
+
+    # Fold the scalers into the forests so serving needs a single pass
+    save_serving_models(models['user'], scalers['user'], models['booking'], scalers['booking'], models_dir)
+
+def train_models(n_jobs=-1, use_tables=True):
+    """
+    Train both fraud models from scratch, concurrently
+
+    Args:
+        n_jobs (int): Threads each forest builds its trees with (-1 = all cores)
+        use_tables (bool): Read (and build) the CSVs' column tables instead of parsing them
+
+    Returns:
+        dict: Wall-clock seconds per stage
+    """
     # Create directories if they don't exist
     os.makedirs('models', exist_ok=True)
-    
-    print("Loading training data from CSV files...")
-    
-    # Load training data
-    user_df = pd.read_csv('data/user_training_data.csv')
-    booking_df = pd.read_csv('data/booking_training_data.csv')
-    
-    # Preprocess user data
-    user_features = ['total_tickets', 'booking_count', 'distinct_payment_methods', 'distinct_ip_addresses']
-    user_X = user_df[user_features]
-    user_y = user_df['is_fraudulent']
-    
-    # Preprocess booking data
-    # Convert payment_method to numeric
-    booking_df['payment_method'] = booking_df['payment_method'].map({'credit_card': 1, 'debit_card': 2, 'paypal': 3})
-    # Extract last octet from IP address as a simple feature
-    booking_df['ip_address'] = booking_df['ip_address'].apply(lambda x: int(x.split('.')[-1]))
-    
-    booking_features = ['num_tickets', 'payment_method', 'ip_address', 'user_booking_count', 'user_avg_tickets']
-    booking_X = booking_df[booking_features]
-    booking_y = booking_df['is_fraudulent']
-    
+    timer = StageTimer()
+
+    print("Loading training data...")
+
+    # Memory-map the encoded columns, building the tables from the CSVs if needed
+    data = {}
+    with timer.stage('load and encode'):
+        for name, csv_path, features in TRAINING_SETS:
+            X, y, cached = load_training_matrices(name, csv_path, features, use_tables)
+            print(f"- {name}: {len(X)} rows {'from the column table' if cached else f'parsed from {csv_path}'}")
+            data[name] = (X, y)
+
     print("Splitting data into training and test sets...")
-    
-    # Split data
-    user_X_train, user_X_test, user_y_train, user_y_test = train_test_split(user_X, user_y, test_size=0.2, random_state=42)
-    booking_X_train, booking_X_test, booking_y_train, booking_y_test = train_test_split(booking_X, booking_y, test_size=0.2, random_state=42)
-    
     print("Scaling features...")
-    
-    # Scale features
-    user_scaler = StandardScaler()
-    user_X_train_scaled = user_scaler.fit_transform(user_X_train)
-    user_X_test_scaled = user_scaler.transform(user_X_test)
-    
-    booking_scaler = StandardScaler()
-    booking_X_train_scaled = booking_scaler.fit_transform(booking_X_train)
-    booking_X_test_scaled = booking_scaler.transform(booking_X_test)
-    
-    # Train user fraud model
-    print("Training user fraud detection model...")
-    user_model = RandomForestClassifier(n_estimators=100, random_state=42)
-    user_model.fit(user_X_train_scaled, user_y_train)
-    
-    # Evaluate user model
-    user_y_pred = user_model.predict(user_X_test_scaled)
-    print("\nUser Fraud Detection Model Evaluation:")
-    print(classification_report(user_y_test, user_y_pred))
-    print("Confusion Matrix:")
-    print(confusion_matrix(user_y_test, user_y_pred))
-    
-    # Train booking fraud model
-    print("\nTraining booking fraud detection model...")
-    booking_model = RandomForestClassifier(n_estimators=100, random_state=42)
-    booking_model.fit(booking_X_train_scaled, booking_y_train)
-    
-    # Evaluate booking model
-    booking_y_pred = booking_model.predict(booking_X_test_scaled)
-    print("\nBooking Fraud Detection Model Evaluation:")
-    print(classification_report(booking_y_test, booking_y_pred))
-    print("Confusion Matrix:")
-    print(confusion_matrix(booking_y_test, booking_y_pred))
-    
-    # Save models and scalers
-    print("\nSaving models and scalers...")
-    joblib.dump(user_model, 'models/user_fraud_model.pkl')
-    joblib.dump(user_scaler, 'models/user_scaler.pkl')
-    joblib.dump(booking_model, 'models/booking_fraud_model.pkl')
-    joblib.dump(booking_scaler, 'models/booking_scaler.pkl')
-    
+
+    splits = {}
+    scalers = {}
+    with timer.stage('split and scale'):
+        for name, _, features in TRAINING_SETS:
+            X, y = data[name]
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+            # Fitted on a DataFrame so the saved scaler keeps its feature names
+            scaler = StandardScaler()
+            X_train_scaled = scaler.fit_transform(pd.DataFrame(X_train, columns=features))
+            X_test_scaled = scale_features(np.array(X_test, dtype=np.float64), scaler)
+
+            scalers[name] = scaler
+            splits[name] = (X_train_scaled, X_test_scaled, y_train, y_test)
+
+    # Train both models at once; each also spreads its trees over n_jobs threads
+    print("Training user and booking fraud detection models...")
+    models = {name: RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+              for name, _, _ in TRAINING_SETS}
+    with timer.stage('train'):
+        fit_concurrently([(models[name], splits[name][0], splits[name][2]) for name in models])
+
+    with timer.stage('evaluate'):
+        evaluate_model("User Fraud Detection Model", models['user'], splits['user'][1], splits['user'][3])
+        evaluate_model("Booking Fraud Detection Model", models['booking'], splits['booking'][1], splits['booking'][3])
+
+    with timer.stage('save'):
+        save_models(models, scalers, 'models')
+        save_training_state({f'{name}_rows': len(data[name][0]) for name in models})
+
     print("\nModels and scalers saved to the 'models' directory.")
-    
+
     # Feature importance
     print("\nUser Model Feature Importance:")
-    for feature, importance in zip(user_features, user_model.feature_importances_):
+    for feature, importance in zip(USER_FEATURES, models['user'].feature_importances_):
         print(f"{feature}: {importance:.4f}")
-    
+
     print("\nBooking Model Feature Importance:")
-    for feature, importance in zip(booking_features, booking_model.feature_importances_):
+    for feature, importance in zip(BOOKING_FEATURES, models['booking'].feature_importances_):
         print(f"{feature}: {importance:.4f}")
-    
+
+    timer.report()
     print("\nTraining complete!")
+    return timer.timings
+
+def add_trees(n_trees, n_jobs=-1, use_tables=True):
+    """
+    Warm-start both forests with extra trees fitted on rows added since the last training
+
+    Rows past the count recorded in TRAINING_STATE_FILE are new. The existing
+    trees and scalers are kept as they are; the new rows are split 80/20,
+    stratified by class, the new trees are grown on the training part and the
+    whole forest is evaluated on the rest. A model with no new rows is left
+    unchanged; new rows too few to give both parts every class are refused.
+
+    Args:
+        n_trees (int): Trees to add to each forest
+        n_jobs (int): Threads each forest builds its trees with (-1 = all cores)
+        use_tables (bool): Read (and build) the CSVs' column tables instead of parsing them
+
+    Returns:
+        dict: Wall-clock seconds per stage
+    """
+    timer = StageTimer()
+    state = load_training_state()
+
+    models = {}
+    scalers = {}
+    fits = {}
+    with timer.stage('load and encode'):
+        for name, csv_path, features in TRAINING_SETS:
+            models[name] = joblib.load(os.path.join('models', f'{name}_fraud_model.pkl'))
+            scalers[name] = joblib.load(os.path.join('models', f'{name}_scaler.pkl'))
+            X, y, cached = load_training_matrices(name, csv_path, features, use_tables)
+
+            trained_rows = state[f'{name}_rows']
+            if len(X) < trained_rows:
+                raise ValueError(f"{csv_path} has {len(X)} rows but the {name} model was trained on "
+                                 f"{trained_rows}; retrain from scratch")
+            new_X = np.array(X[trained_rows:], dtype=np.float64)
+            new_y = np.asarray(y[trained_rows:])
+            print(f"- {name}: {len(new_X)} new rows {'from the column table' if cached else f'parsed from {csv_path}'}")
+            if not len(new_X):
+                continue
+            # New trees must vote over the same classes as the existing ones, so the stratified
+            # split has to leave every class in the training part (and one in the test part)
+            classes, counts = np.unique(new_y, return_counts=True)
+            test_rows = int(np.ceil(0.2 * len(new_y)))
+            if (not np.array_equal(classes, models[name].classes_) or counts.min() < 2
+                    or min(test_rows, len(new_y) - test_rows) < len(classes)):
+                raise ValueError(f"The new {name} rows are too few to split with every class the model predicts "
+                                 f"on both sides (class counts: {dict(zip(classes.tolist(), counts.tolist()))}); "
+                                 f"add more rows or retrain from scratch")
+            fits[name] = (scale_features(new_X, scalers[name]), new_y, len(X))
+
+    if not fits:
+        print("No new rows since the last training; nothing to add.")
+        return timer.timings
+
+    splits = {}
+    with timer.stage('split and scale'):
+        for name, (X_scaled, y, _) in fits.items():
+            splits[name] = train_test_split(X_scaled, y, test_size=0.2, random_state=42, stratify=y)
+            if not np.array_equal(np.unique(splits[name][2]), models[name].classes_):
+                raise ValueError(f"The training part of the new {name} rows lacks a class; retrain from scratch")
+
+    print(f"Adding {n_trees} trees to the {' and '.join(fits)} model{'s' if len(fits) > 1 else ''}...")
+    for name in fits:
+        models[name].set_params(warm_start=True, n_jobs=n_jobs,
+                                n_estimators=len(models[name].estimators_) + n_trees)
+    with timer.stage('train'):
+        fit_concurrently([(models[name], splits[name][0], splits[name][2]) for name in fits])
+    for name in fits:
+        models[name].set_params(warm_start=False)
+
+    with timer.stage('evaluate'):
+        for name in fits:
+            evaluate_model(f"{name.capitalize()} Fraud Detection Model (new rows)",
+                           models[name], splits[name][1], splits[name][3])
+
+    with timer.stage('save'):
+        save_models(models, scalers, 'models')
+        state.update({f'{name}_rows': total_rows for name, (_, _, total_rows) in fits.items()})
+        save_training_state(state)
+
+    timer.report()
+    print("\nTrees added!")
+    return timer.timings
+
+def compare_velocity_features(n_jobs=-1, use_tables=True):
+    """
+    Train the booking model with and without the velocity features and compare them
+
+    Both forests are fitted on the same 80/20 split of booking_training_data.csv,
+    the second with VELOCITY_FEATURES appended to BOOKING_FEATURES. Nothing is
+    saved: the serving models keep their inputs.
+
+    Returns:
+        dict: Test accuracy per feature set ('baseline', 'velocity')
+    """
+    csv_path = 'data/booking_training_data.csv'
+    X, y, _ = load_training_matrices('booking', csv_path, BOOKING_FEATURES, use_tables)
+    if use_tables:
+        columns = read_table(csv_path, VELOCITY_FEATURES)
+    else:
+        columns = pd.read_csv(csv_path, usecols=VELOCITY_FEATURES)
+    velocity = np.column_stack([np.asarray(columns[feature], dtype=np.float64) for feature in VELOCITY_FEATURES])
+
+    feature_sets = {
+        'baseline': (BOOKING_FEATURES, np.array(X, dtype=np.float64)),
+        'velocity': (BOOKING_FEATURES + VELOCITY_FEATURES, np.column_stack([X, velocity]))
+    }
+    accuracy = {}
+    for name, (features, X_set) in feature_sets.items():
+        X_train, X_test, y_train, y_test = train_test_split(X_set, y, test_size=0.2, random_state=42)
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(pd.DataFrame(X_train, columns=features))
+        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+        model.fit(X_train_scaled, y_train)
+
+        X_test_scaled = scale_features(X_test, scaler)
+        evaluate_model(f"Booking Fraud Detection Model ({name} features)", model, X_test_scaled, y_test)
+        accuracy[name] = float((model.predict(X_test_scaled) == y_test).mean())
+        print("Feature importance:")
+        for feature, importance in zip(features, model.feature_importances_):
+            print(f"{feature}: {importance:.4f}")
+
+    print(f"\nTest accuracy: baseline {accuracy['baseline']:.4f}, with velocity features {accuracy['velocity']:.4f}")
+    return accuracy
 
 if __name__ == "__main__":
-    train_models()
+    parser = argparse.ArgumentParser(description='Train the fraud detection models from the CSV training data')
+    parser.add_argument('--export-only', action='store_true',
+                        help='skip training and rebuild the fused, packed and compiled artifacts from the saved pickles')
+    parser.add_argument('--verify', action='store_true',
+                        help='check the fused artifact and the compiled file against the scaler+model pipeline '
+                             'on the training data')
+    parser.add_argument('--add-trees', type=int, metavar='N',
+                        help='warm-start: add N trees per model, fitted only on rows added since the last training')
+    parser.add_argument('--n-jobs', type=int, default=-1,
+                        help='threads each forest is built with (default: all cores)')
+    parser.add_argument('--no-tables', action='store_true',
+                        help='parse the CSVs instead of reading their column tables (see columnar.py)')
+    parser.add_argument('--velocity', action='store_true',
+                        help='compare the booking model with and without the velocity features, saving nothing')
+    args = parser.parse_args()
+
+    if args.velocity:
+        compare_velocity_features(args.n_jobs, not args.no_tables)
+    elif args.export_only:
+        export_fused_models()
+        print("Fused, packed and compiled models saved to the 'models' directory.")
+    elif args.add_trees:
+        add_trees(args.add_trees, args.n_jobs, not args.no_tables)
+    else:
+        train_models(args.n_jobs, not args.no_tables)
+
+    if args.verify and not verify_fused_models():
+        sys.exit(1)
@@ -0,0 +1,206 @@
+import bisect
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+# Sliding windows, in seconds, counted per user and per IP address
+WINDOWS = {'1m': 60, '1h': 3600, '24h': 86400}
+
+VELOCITY_FEATURES = ([f'user_bookings_{name}' for name in WINDOWS] +
+                     [f'ip_bookings_{name}' for name in WINDOWS])
+
+# Events kept per key: counts saturate here, which bounds a key's memory during a burst
+MAX_EVENTS_PER_KEY = 1024
+
+# Keys idle for longer than the largest window are dropped after this many events (or
+# one per key, if there are more keys), so sweeping is O(1) amortized per event
+PRUNE_INTERVAL = 4096
+
+def parse_booking_time(value):
+    """
+    Seconds since the epoch for a booking_time value
+
+    Accepts epoch seconds, ISO 8601 strings (naive ones are UTC, as in
+    data/bookings.csv) and None, which means now.
+    """
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+class KeyWindows:
+    """
+    One key's recent event times, sorted, with the start of each window
+
+    Events at or before newest - window lie left of that window's start
+    index, so a window's count is len(times) - start. Events older than the
+    largest window are dropped from the front once they make up half the list.
+    """
+
+    __slots__ = ('times', 'starts')
+
+    def __init__(self, n_windows):
+        self.times = []
+        self.starts = [0] * n_windows
+
+class VelocityTracker:
+    """
+    Per-key booking counts over sliding time windows, updated one event at a time
+
+    Adding an event in time order is O(1) amortized: it is appended and each
+    window's start only moves forward. A late event is inserted in place
+    (O(log n) plus the shift); one older than the largest window is ignored.
+    Each key keeps at most max_events times, and keys with nothing in the
+    largest window are pruned, so memory stays bounded.
+    """
+
+    def __init__(self, windows=WINDOWS, max_events=MAX_EVENTS_PER_KEY):
+        # Shortest first, so the largest window's start is always starts[-1], the smallest
+        self.windows = sorted(windows.values())
+        self.largest = self.windows[-1]
+        self.max_events = max_events
+        self.keys = {}
+        self.newest = float('-inf')
+        self.events_since_prune = 0
+
+    def add(self, key, timestamp):
+        """Record one event for key at timestamp (seconds)"""
+        entry = self.keys.get(key)
+        if entry is None:
+            entry = self.keys[key] = KeyWindows(len(self.windows))
+        times, starts = entry.times, entry.starts
+
+        if not times or timestamp >= times[-1]:
+            times.append(timestamp)
+            for i, window in enumerate(self.windows):
+                start = starts[i]
+                while times[start] <= timestamp - window:
+                    start += 1
+                starts[i] = start
+        else:
+            newest = times[-1]
+            if timestamp <= newest - self.largest:
+                return
+            position = bisect.bisect_right(times, timestamp)
+            times.insert(position, timestamp)
+            for i, window in enumerate(self.windows):
+                # Outside this window (or older than what a saturated window keeps): it lands left of the start
+                if position < starts[i] or timestamp <= newest - window:
+                    starts[i] += 1
+
+        # Saturate at max_events: the oldest times drop out of every window
+        excess = len(times) - starts[-1] - self.max_events
+        if excess > 0:
+            floor = starts[-1] + excess
+            for i in range(len(starts)):
+                starts[i] = max(starts[i], floor)
+
+        # Forget what no window can count any more
+        dropped = starts[-1]
+        if dropped > 32 and dropped * 2 > len(times):
+            del times[:dropped]
+            for i in range(len(starts)):
+                starts[i] -= dropped
+
+        self.newest = max(self.newest, timestamp)
+        self.events_since_prune += 1
+        if self.events_since_prune >= max(PRUNE_INTERVAL, len(self.keys)):
+            self.prune()
+
+    def counts(self, key, timestamp):
+        """
+        Events recorded for key in each window ending at timestamp
+
+        Only events within the largest window of the key's newest one are
+        remembered, so a window ending further back than that counts none.
+
+        Returns:
+            list: One count per window: events in (timestamp - window, timestamp]
+        """
+        entry = self.keys.get(key)
+        if entry is None:
+            return [0] * len(self.windows)
+        times, starts = entry.times, entry.starts
+        lo = starts[-1]
+        end = bisect.bisect_right(times, timestamp, lo)
+        return [end - bisect.bisect_right(times, timestamp - window, lo, end) for window in self.windows]
+
+    def prune(self):
+        """Drop keys whose newest event is older than the largest window"""
+        cutoff = self.newest - self.largest
+        self.keys = {key: entry for key, entry in self.keys.items() if entry.times and entry.times[-1] > cutoff}
+        self.events_since_prune = 0
+
+    def state(self):
+        """Each key's times still inside the largest window, for snapshots"""
+        return {key: entry.times[entry.starts[-1]:] for key, entry in self.keys.items()}
+
+    def load_state(self, state):
+        """Replace the tracker's contents by replaying the times of a state() dict"""
+        self.keys = {}
+        self.newest = float('-inf')
+        self.events_since_prune = 0
+        for key, times in state.items():
+            for timestamp in times:
+                self.add(key, timestamp)
+
+def window_counts(keys, times, window, max_events=MAX_EVENTS_PER_KEY):
+    """
+    Vectorized VelocityTracker counts for events replayed in time order
+
+    Row i gets the number of events with the same key in (times[i] - window,
+    times[i]] that come no later than i in time order (ties keep their row
+    order), itself included, capped at max_events: exactly what adding the
+    events to a VelocityTracker one by one and reading counts() after each
+    add yields.
+
+    Args:
+        keys (np.ndarray): Integer key codes
+        times (np.ndarray): int64 event times in seconds
+        window (int): Window length in seconds
+        max_events (int): Count cap
+
+    Returns:
+        np.ndarray: int64 counts, in row order
+    """
+    # Key, then time, then row: one sorted run per key in replay order
+    order = np.lexsort((np.arange(len(times)), times, keys))
+    sorted_keys = keys[order].astype(np.int64)
+    sorted_times = times[order].astype(np.int64)
+
+    # Keys and times packed into one increasing int64 so a single searchsorted stays within each key
+    offset = sorted_times - sorted_times.min() + window if len(times) else sorted_times
+    span = int(offset.max()) + 1 if len(times) else 1
+    packed = sorted_keys * span + offset
+    first_in_window = np.searchsorted(packed, packed - window, side='right')
+
+    counts = np.empty(len(times), dtype=np.int64)
+    counts[order] = np.minimum(np.arange(len(times)) - first_in_window + 1, max_events)
+    return counts
+
+def velocity_columns(user_ids, ip_addresses, booking_times, max_events=MAX_EVENTS_PER_KEY):
+    """
+    VELOCITY_FEATURES for a table of bookings, as the feature store would have served them
+
+    Args:
+        user_ids (array-like): User of each booking
+        ip_addresses (array-like): IP address (or packed uint32) of each booking
+        booking_times (array-like): Booking times (datetime64, or strings pd.to_datetime parses)
+
+    Returns:
+        dict: Feature name -> int64 array, in row order
+    """
+    times = pd.to_datetime(np.asarray(booking_times), format='ISO8601').to_numpy().astype('datetime64[s]').astype(np.int64)
+    user_codes = pd.factorize(np.asarray(user_ids))[0]
+    ip_codes = pd.factorize(np.asarray(ip_addresses))[0]
+
+    columns = {}
+    for prefix, codes in (('user', user_codes), ('ip', ip_codes)):
+        for name, window in WINDOWS.items():
+            columns[f'{prefix}_bookings_{name}'] = window_counts(codes, times, window, max_events)
+    return columns
@@ -0,0 +1,147 @@
+import numpy as np
+
+from features import BOOKING_FEATURES, encode_payment_methods, ip_last_octets, encode_booking_records
+
+# Perturbations tried when the caller does not pass a grid
+DEFAULT_GRID = {
+    'num_tickets': list(range(1, 26)),
+    'payment_method': ['credit_card', 'debit_card', 'paypal'],
+    'user_booking_count': [0, 1, 2, 3, 5, 10, 20]
+}
+
+# Largest grid scored in one request
+MAX_SCENARIOS = 100000
+
+# Features whose values are labels rather than quantities; changing them has no "distance"
+CATEGORICAL_FEATURES = {'payment_method', 'ip_address'}
+
+def encode_values(feature, values):
+    """Encode one feature's grid values the way the booking model sees them"""
+    if feature == 'payment_method':
+        return encode_payment_methods(values)
+    if feature == 'ip_address':
+        return ip_last_octets(values)
+    return np.asarray(values, dtype=np.float64)
+
+def grid_axes(booking_data, grid):
+    """
+    Build one axis per perturbed feature: the original value first, then the new ones
+
+    Returns:
+        list of tuple: (feature, raw values, encoded values)
+    """
+    axes = []
+    for feature, values in grid.items():
+        if feature not in BOOKING_FEATURES:
+            raise ValueError(f'Unknown feature in grid: {feature}. Valid features are {BOOKING_FEATURES}')
+        original = booking_data[feature]
+        values = [original] + [v for v in dict.fromkeys(values) if v != original]
+        axes.append((feature, values, encode_values(feature, values)))
+    return axes
+
+def count_scenarios(grid):
+    """Upper bound on the rows simulate() scores for a grid (original values may add one per axis)"""
+    count = 1
+    for values in grid.values():
+        count *= len(values) + 1
+    return count
+
+def simulate(booking_data, grid, model, pipeline=None):
+    """
+    Score a booking under every combination of the grid's feature values
+
+    All scenarios are encoded into one matrix and scored with a single
+    predict_proba call. Row 0 is the unchanged booking.
+
+    Args:
+        booking_data (dict): Booking as sent to /predict_booking
+        grid (dict): Feature name -> list of values to try
+        model: Forest with predict_proba and classes_ (sklearn or FlatForest)
+        pipeline (FeaturePipeline or None): Pipeline of the model's version, None for raw features
+
+    Returns:
+        dict: axes, per-row choice indices into each axis, predictions and fraud probabilities
+    """
+    axes = grid_axes(booking_data, grid)
+    n_scenarios = int(np.prod([len(values) for _, values, _ in axes]))
+    if n_scenarios > MAX_SCENARIOS:
+        raise ValueError(f'Grid has {n_scenarios} scenarios, the limit is {MAX_SCENARIOS}')
+
+    # Every combination of axis positions; position 0 keeps the original value
+    choices = np.indices([len(values) for _, values, _ in axes]).reshape(len(axes), -1).T
+
+    X = np.repeat(encode_booking_records([booking_data]), n_scenarios, axis=0)
+    for axis, (feature, _, encoded) in enumerate(axes):
+        X[:, BOOKING_FEATURES.index(feature)] = encoded[choices[:, axis]]
+
+    probabilities = model.predict_proba(X if pipeline is None else pipeline.scale('booking', X))
+    return {
+        'axes': axes,
+        'choices': choices,
+        'predictions': model.classes_.take(probabilities.argmax(axis=1)),
+        'probabilities': probabilities[:, list(model.classes_).index(1)]
+    }
+
+def find_scenario(simulation, changes):
+    """Row index of the scenario with exactly these feature changes (others unchanged)"""
+    target = np.zeros(len(simulation['axes']), dtype=np.int64)
+    for axis, (feature, values, _) in enumerate(simulation['axes']):
+        if feature in changes:
+            target[axis] = values.index(changes[feature])
+    return int(np.flatnonzero((simulation['choices'] == target).all(axis=1))[0])
+
+def describe_scenario(simulation, row):
+    """JSON-ready summary of one scenario"""
+    changes = {}
+    for axis, (feature, values, _) in enumerate(simulation['axes']):
+        choice = simulation['choices'][row, axis]
+        if choice:
+            changes[feature] = values[choice]
+    prediction = simulation['predictions'][row]
+    return {
+        'changes': changes,
+        'prediction': 'fraud' if prediction == 1 else 'legitimate',
+        'probability': float(simulation['probabilities'][row])
+    }
+
+def flips_by_cost(simulation):
+    """
+    Rows whose decision differs from the original booking's, smallest change first
+
+    Changes are ranked by how many features they touch, then by how far the
+    numeric features move, each relative to the range of values tried.
+    """
+    choices = simulation['choices']
+    flipped = np.flatnonzero(simulation['predictions'] != simulation['predictions'][0])
+
+    distance = np.zeros(len(choices))
+    for axis, (feature, _, encoded) in enumerate(simulation['axes']):
+        if feature in CATEGORICAL_FEATURES:
+            continue
+        span = encoded.max() - encoded.min()
+        if span > 0:
+            distance += np.abs(encoded[choices[:, axis]] - encoded[0]) / span
+
+    n_changed = (choices[flipped] != 0).sum(axis=1)
+    return flipped[np.lexsort((distance[flipped], n_changed))]
+
+def counterfactuals(booking_data, model, pipeline=None, grid=None, top=5):
+    """
+    Find the smallest changes to a booking that flip the model's decision
+
+    Returns:
+        dict: Original decision, scenario count, the minimal flip (or None) and
+            up to `top` flips in order of increasing change
+    """
+    simulation = simulate(booking_data, DEFAULT_GRID if grid is None else grid, model, pipeline)
+    flips = flips_by_cost(simulation)
+    original = describe_scenario(simulation, 0)
+
+    return {
+        'original_prediction': original['prediction'],
+        'probability': original['probability'],
+        'scenarios_scored': len(simulation['predictions']),
+        'flipping_scenarios': len(flips),
+        'minimal_flip': describe_scenario(simulation, flips[0]) if len(flips) else None,
+        'flips': [describe_scenario(simulation, row) for row in flips[:top]]
+    }
@@ -0,0 +1,31 @@
+import os
+import sys
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'scripts'))
+import model_store
+from model_store import MODELS_DIR, FUSED_MODELS_FILE, require_serving_dir
+from train_models_from_csv import TRAINING_SETS, load_training_matrices
+
+@pytest.fixture(scope='module')
+def serving_models():
+    """Fused sklearn forests and compiled packed forests of the live serving generation, per model name"""
+    fused = joblib.load(os.path.join(require_serving_dir(MODELS_DIR), FUSED_MODELS_FILE))
+    compiled_user, compiled_booking = model_store.load_compiled_models(MODELS_DIR)
+    return {'user': (fused['user_model'], compiled_user), 'booking': (fused['booking_model'], compiled_booking)}
+
+@pytest.mark.parametrize('name, csv_path, features', TRAINING_SETS, ids=[name for name, _, _ in TRAINING_SETS])
+def test_fused_and_compiled_match_scaler_and_forest(serving_models, name, csv_path, features):
+    """The scaler-folded artifacts give exactly the probabilities of scaler.transform + the legacy forest"""
+    model = joblib.load(os.path.join(MODELS_DIR, f'{name}_fraud_model.pkl'))
+    scaler = joblib.load(os.path.join(MODELS_DIR, f'{name}_scaler.pkl'))
+    X, _, _ = load_training_matrices(name, os.path.join(ROOT_DIR, csv_path), features, use_tables=False)
+
+    expected = model.predict_proba(scaler.transform(pd.DataFrame(X, columns=features)))
+    fused_model, compiled_forest = serving_models[name]
+    np.testing.assert_array_equal(fused_model.predict_proba(X), expected)
+    np.testing.assert_array_equal(compiled_forest.predict_proba(X), expected)